@@ -0,0 +1,142 @@
+#common_ai 公共接口，按需加载（PEP 562）
+#`from common_ai import ModelRouter` 只导入 model_router 及其依赖；
+#aiohttp、numpy、pyarrow、zstandard、各模型提供方等较重的依赖在真正用到对应模块时才加载
+#子模块仍然可以直接导入，如 `from common_ai.fake_models import FakeChatModel`
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+# 公开名称 -> 所在子模块
+_EXPORTS = {
+    # 模型与提供方
+    "LazyChatModel": "providers",
+    "load_provider": "providers",
+    "ModelRouter": "model_router",
+    "FakeChatModel": "fake_models",
+    "FakeEmbeddings": "fake_models",
+    "heavy_tail_latency": "fake_models",
+    "FakeLLMServer": "fake_server",
+    "ScriptedResponder": "fake_server",
+    "Cassette": "cassette",
+    "CassetteChatModel": "cassette",
+    "CassetteEmbeddings": "cassette",
+    "CassetteMissError": "cassette",
+    # 配置
+    "AISettings": "settings",
+    "ModelProfile": "settings",
+    "SettingsWatcher": "settings",
+    "get_settings": "settings",
+    "reload_settings": "settings",
+    "watch_settings": "settings",
+    # 检索
+    "BM25Index": "bm25",
+    "EmbeddingCache": "embedding_service",
+    "EmbeddingService": "embedding_service",
+    "get_embedding_service": "embedding_service",
+    "DocumentIngestor": "ingestion",
+    "HybridRetriever": "retrieval",
+    "IVFIndex": "retrieval",
+    "PolicySnippets": "rag",
+    "Reranker": "retrieval",
+    "Retriever": "retrieval",
+    "VectorStore": "retrieval",
+    "dashscope_embeddings": "retrieval",
+    "embed_batches": "retrieval",
+    "reciprocal_rank_fusion": "retrieval",
+    # 可靠性
+    "CircuitBreaker": "circuit_breaker",
+    "CircuitOpenError": "circuit_breaker",
+    "ModelUnavailableError": "circuit_breaker",
+    "get_breaker": "circuit_breaker",
+    "reset_breakers": "circuit_breaker",
+    "HedgedRunnable": "hedging",
+    "LatencyTracker": "hedging",
+    # Runnable 与链条优化
+    "AdaptiveParallel": "adaptive_parallel",
+    "ChainOptimizer": "chain_optimizer",
+    "optimize_chain": "chain_optimizer",
+    "FastChain": "fast_path",
+    "MemoizedLambda": "memo",
+    "RequestScoped": "memo",
+    "request_scope": "memo",
+    "RunnableProcessLambda": "process_lambda",
+    "RunnableProjection": "projection",
+    "RunnableVectorized": "vectorized",
+    "vectorized": "vectorized",
+    "ChainWorkerPool": "worker_pool",
+    "SharedRateLimiter": "worker_pool",
+    "WorkerError": "worker_pool",
+    # 流式输出与监控
+    "CoalescingStream": "streaming",
+    "AsyncCoalescingStream": "streaming",
+    "stream_sse": "streaming",
+    "stream_websocket": "streaming",
+    "StreamLatencyCallback": "stream_metrics",
+    # 本地分析与数据
+    "LocalPreClassifier": "local_classifier",
+    "ParquetLogSink": "distill_log",
+    "load_distillation_records": "distill_log",
+    "generate_feedback": "synthetic_data",
+    "generate_knowledge_base": "synthetic_data",
+    "load_script": "script_loader",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    # 缓存到模块字典，之后的访问不再经过 __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
+
+
+if TYPE_CHECKING:
+    from common_ai.adaptive_parallel import AdaptiveParallel
+    from common_ai.cassette import Cassette, CassetteChatModel, CassetteEmbeddings, CassetteMissError
+    from common_ai.chain_optimizer import ChainOptimizer, optimize_chain
+    from common_ai.circuit_breaker import (
+        CircuitBreaker,
+        CircuitOpenError,
+        ModelUnavailableError,
+        get_breaker,
+        reset_breakers,
+    )
+    from common_ai.bm25 import BM25Index
+    from common_ai.distill_log import ParquetLogSink, load_distillation_records
+    from common_ai.embedding_service import EmbeddingCache, EmbeddingService, get_embedding_service
+    from common_ai.fake_models import FakeChatModel, FakeEmbeddings, heavy_tail_latency
+    from common_ai.fake_server import FakeLLMServer, ScriptedResponder
+    from common_ai.fast_path import FastChain
+    from common_ai.hedging import HedgedRunnable, LatencyTracker
+    from common_ai.ingestion import DocumentIngestor
+    from common_ai.local_classifier import LocalPreClassifier
+    from common_ai.memo import MemoizedLambda, RequestScoped, request_scope
+    from common_ai.model_router import ModelRouter
+    from common_ai.process_lambda import RunnableProcessLambda
+    from common_ai.projection import RunnableProjection
+    from common_ai.providers import LazyChatModel, load_provider
+    from common_ai.rag import PolicySnippets
+    from common_ai.retrieval import (
+        HybridRetriever,
+        IVFIndex,
+        Reranker,
+        Retriever,
+        VectorStore,
+        dashscope_embeddings,
+        embed_batches,
+        reciprocal_rank_fusion,
+    )
+    from common_ai.script_loader import load_script
+    from common_ai.settings import AISettings, ModelProfile, SettingsWatcher, get_settings, reload_settings, watch_settings
+    from common_ai.stream_metrics import StreamLatencyCallback
+    from common_ai.streaming import AsyncCoalescingStream, CoalescingStream, stream_sse, stream_websocket
+    from common_ai.synthetic_data import generate_feedback, generate_knowledge_base
+    from common_ai.vectorized import RunnableVectorized, vectorized
+    from common_ai.worker_pool import ChainWorkerPool, SharedRateLimiter, WorkerError
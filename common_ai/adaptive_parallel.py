@@ -0,0 +1,119 @@
+#自适应并行：只有耗时的分支才放到线程池，廉价分支直接在当前线程执行
+#RunnableParallel 每次 invoke 都会创建线程池并把每个分支提交过去，
+#像 add_one、calculate_sum 这样纳秒级的函数，线程调度开销比函数本身大几个数量级
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from langchain_core.callbacks.manager import CallbackManager
+from langchain_core.runnables import RunnableConfig, RunnableParallel
+from langchain_core.runnables.config import ensure_config, get_executor_for_config, patch_config, set_config_context
+from pydantic import PrivateAttr
+
+
+class AdaptiveParallel(RunnableParallel):
+    """
+    自适应的 RunnableParallel，用法与 RunnableParallel 相同
+
+    执行策略:
+        1. 在 io_bound 中声明的分支（如模型调用）始终提交到线程池并行执行，包括计时阶段
+        2. 前 profile_calls 次调用其余分支在当前线程执行并计时
+        3. 之后最小耗时低于 cost_threshold 的分支在当前线程直接执行，超过阈值的提交到线程池
+        4. 所有分支都是廉价分支时，完全不创建线程池
+
+    用法:
+        chain = AdaptiveParallel(a=add_one, b=add_two, llm=prompt | model, io_bound={"llm"})
+    """
+
+    _cost_threshold: float = PrivateAttr(default=0.0005)
+    _profile_calls: int = PrivateAttr(default=3)
+    _io_bound: frozenset = PrivateAttr(default=frozenset())
+    _costs: Dict[str, float] = PrivateAttr(default_factory=dict)
+    _calls: int = PrivateAttr(default=0)
+    _offloaded: frozenset = PrivateAttr(default=frozenset())
+    _profiling: bool = PrivateAttr(default=True)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, steps__=None, *, cost_threshold: float = 0.0005, profile_calls: int = 3,
+                 io_bound: Iterable[str] = (), **kwargs):
+        """
+        :param steps__: 分支字典，与 RunnableParallel 相同
+        :param cost_threshold: 分支最小耗时超过多少秒才放到线程池
+        :param profile_calls: 前几次调用用于计时
+        :param io_bound: 始终放到线程池的分支名（I/O 密集，如模型调用）
+        :param kwargs: 分支，与 RunnableParallel 相同
+        """
+        super().__init__(steps__, **kwargs)
+        self._cost_threshold = cost_threshold
+        self._profile_calls = profile_calls
+        self._io_bound = frozenset(io_bound)
+        self._offloaded = self._io_bound
+        self._profiling = profile_calls > 0
+
+    @property
+    def offloaded_keys(self) -> frozenset:
+        """放到线程池执行的分支名，计时阶段只有 io_bound 中声明的分支"""
+        return self._offloaded
+
+    @property
+    def profiling(self) -> bool:
+        """是否还在计时阶段"""
+        return self._profiling
+
+    def _finish_profiling(self) -> None:
+        # 取最小耗时，排除首次调用时的初始化开销和偶发的调度抖动
+        slow = {key for key, cost in self._costs.items() if cost >= self._cost_threshold}
+        self._offloaded = frozenset(slow | self._io_bound)
+        self._profiling = False
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Dict[str, Any]:
+        config = ensure_config(config)
+        callback_manager = CallbackManager.configure(
+            inheritable_callbacks=config.get("callbacks"),
+            inheritable_tags=config.get("tags"),
+            inheritable_metadata=config.get("metadata"),
+        )
+        run_manager = callback_manager.on_chain_start(
+            None, input, name=config.get("run_name") or self.get_name(), run_id=config.pop("run_id", None),
+        )
+
+        def _invoke_step(step, key):
+            child_config = patch_config(config, callbacks=run_manager.get_child(f"map:key:{key}"))
+            with set_config_context(child_config) as context:
+                return context.run(step.invoke, input, child_config)
+
+        def _invoke_inline(key, step):
+            # 计时阶段给在当前线程执行的分支计时
+            if not profiling:
+                return _invoke_step(step, key)
+            start = time.perf_counter()
+            result = _invoke_step(step, key)
+            cost = time.perf_counter() - start
+            with self._lock:
+                self._costs[key] = min(cost, self._costs.get(key, cost))
+            return result
+
+        try:
+            steps = dict(self.steps__)
+            with self._lock:
+                offloaded, profiling = self._offloaded, self._profiling
+            if not offloaded.intersection(steps):
+                output = {key: _invoke_inline(key, step) for key, step in steps.items()}
+            else:
+                with get_executor_for_config(config) as executor:
+                    # 先提交慢分支，再在当前线程执行廉价分支，两者重叠执行
+                    futures = {key: executor.submit(_invoke_step, step, key)
+                               for key, step in steps.items() if key in offloaded}
+                    inline = {key: _invoke_inline(key, step)
+                              for key, step in steps.items() if key not in offloaded}
+                    output = {key: futures[key].result() if key in futures else inline[key] for key in steps}
+            if profiling:
+                with self._lock:
+                    self._calls += 1
+                    if self._calls >= self._profile_calls and self._profiling:
+                        self._finish_profiling()
+        except BaseException as e:
+            run_manager.on_chain_error(e)
+            raise
+        run_manager.on_chain_end(output)
+        return output
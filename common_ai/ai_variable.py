@@ -1,8 +1,12 @@
 #可用模型列表，以及获得访问模型的客户端
 #实际使用时可以根据自己的实际情况调整
+#每个模型的地址、超时、并发、限流配额等运行参数见 common_ai/settings.py，可以用配置文件调整并热更新
+import os
+
 # 通义常用变量
 ALI_TONGYI_API_KEY_OS_VAR_NAME = "DASHSCOPE_API_KEY"
-ALI_TONGYI_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+# 可以通过环境变量指向本地假模型服务（common_ai/fake_server.py）做离线压测
+ALI_TONGYI_URL = os.getenv("ALI_TONGYI_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
 ALI_TONGYI_MAX_MODEL = "qwen-max-latest"
 ALI_TONGYI="tongyi"
 ALI_TONGYI_DEEPSEEK_R1 = "deepseek-r1"
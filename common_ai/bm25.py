@@ -0,0 +1,376 @@
+#BM25 关键词检索：中文字符二元组 + 英文数字词的分词，倒排表用 varint 压缩的数组保存，打分用 NumPy 向量化
+#向量检索对订单号（ORD1234567890）、商品编号（SKU123456）这类精确标识几乎无能为力，关键词检索补上这一块，
+#两者的结果用 retrieval.reciprocal_rank_fusion 融合，见 retrieval.HybridRetriever
+#查询中的编号（含 6 位以上数字串的词）权重乘以 id_boost，精确命中编号的文档排在只命中"怎么""还没到"这类常见二元组的文档前面
+#
+#用法:
+#    index = BM25Index.build((doc["id"], doc["text"]) for doc in docs)     # 可以是生成器
+#    scores, rows = index.search("订单ORD1234567890还没发货", k=10)
+#    index.save("kb_bm25.npz"); index = BM25Index.load("kb_bm25.npz")
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+# 连续的英文字母数字，或连续的汉字（含扩展 A 区和兼容汉字）
+_TOKEN = re.compile(r"[a-z0-9]+|[㐀-䶿一-鿿豈-﫿]+")
+_DIGITS = re.compile(r"\d{6,}")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    中文按字符二元组切分（单个汉字保留为一元组），英文和数字按连续的字母数字切分并转成小写
+    - 全角字母数字先经 NFKC 转为半角，"ＯＲＤ１２３" 与 "ORD123" 相同
+    - 字母数字混合的编号另外产生其中 6 位以上的数字串，顾客只报数字（"订单1234567890"）也能匹配 ORD1234567890
+    """
+    tokens = []
+    for run in _TOKEN.findall(unicodedata.normalize("NFKC", text).lower()):
+        if run[0] < "㐀":
+            tokens.append(run)
+            if not run.isdigit() and not run.isalpha():
+                tokens.extend(_DIGITS.findall(run))
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def is_identifier(token: str) -> bool:
+    """订单号、商品编号这类精确标识：含 6 位以上的连续数字（"ord1234567890"、"sku524604"、只报数字的 "524604"）"""
+    return _DIGITS.search(token) is not None
+
+
+def varint_sizes(values: np.ndarray) -> np.ndarray:
+    """每个值 varint 编码后的字节数（1 到 5）"""
+    return 1 + sum((values >= 1 << (7 * i)).astype(np.int64) for i in range(1, 5))
+
+
+def varint_encode(values: np.ndarray) -> np.ndarray:
+    """无符号整数数组编码为 LEB128 varint 字节串（每字节低 7 位存数据，最高位表示后面还有字节），整体向量化"""
+    values = np.asarray(values, dtype=np.uint32)
+    sizes = varint_sizes(values)
+    starts = np.cumsum(sizes) - sizes
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+    for i in range(5):
+        mask = sizes > i
+        if not mask.any():
+            break
+        byte = (values[mask] >> np.uint32(7 * i)) & np.uint32(0x7F)
+        more = (sizes[mask] > i + 1).astype(np.uint32) << np.uint32(7)
+        out[starts[mask] + i] = byte | more
+    return out
+
+
+def varint_decode(data: np.ndarray) -> np.ndarray:
+    """varint_encode 的逆运算"""
+    data = np.asarray(data, dtype=np.uint8)
+    last = (data & 0x80) == 0
+    if last.all():
+        # 全部是单字节（值都小于 128），常见于高频词的文档间隔
+        return data.astype(np.uint32)
+    ends = np.flatnonzero(last)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    value_index = np.cumsum(last) - last
+    shifts = ((np.arange(len(data)) - starts[value_index]) * 7).astype(np.uint32)
+    return np.add.reduceat((data & 0x7F).astype(np.uint32) << shifts, starts)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    if len(scores) > k:
+        index = np.argpartition(-scores, k - 1)[:k]
+    else:
+        index = np.arange(len(scores))
+    return index[np.argsort(-scores[index], kind="stable")]
+
+
+def _merge(docs: np.ndarray, scores: np.ndarray, new_docs: np.ndarray,
+           new_scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """合并两组按文档号排序的 (文档号, 分数)，同一文档的分数相加"""
+    if not len(docs):
+        return new_docs, new_scores
+    docs = np.concatenate([docs, new_docs])
+    scores = np.concatenate([scores, new_scores])
+    # 两段各自有序，稳定排序（timsort）按归并处理，接近线性
+    order = np.argsort(docs, kind="stable")
+    docs, scores = docs[order], scores[order]
+    starts = np.flatnonzero(np.concatenate([[True], docs[1:] != docs[:-1]]))
+    return docs[starts], np.add.reduceat(scores, starts)
+
+
+class BM25Index:
+    """
+    BM25 倒排索引，构建后只读
+
+    存储（均为 NumPy 数组，可以直接 save/load）:
+        postings: 所有词的文档号间隔，varint 编码后首尾相接（uint8）
+        tfs: 对应的词频（uint8，超过 255 按 255 计）
+        offsets / byte_offsets: 第 t 个词在 tfs / postings 中的起止位置
+        doc_len: 每个文档的词数
+        max_impact: 每个词在所有文档上最大的词频项 tf * (k1 + 1) / (tf + norm)，乘以 idf 即该词分数的上界
+    词表是 词 -> 编号 的字典，ids 是文档 id 列表，行号即文档号
+
+    检索时按分数上界从大到小处理查询词（MaxScore）：剩下的词上界之和已经不超过当前第 k 名的分数时，
+    只包含这些词的文档不可能进入前 k，剩下的词只给已有的候选补分（在倒排表中二分查找），不再把整个倒排表累加一遍。
+    查询全由高频词组成、剪不掉多少时，改为在稠密数组上按文档号累加。
+    "订单"、"问题" 这类高频词的倒排表很长，解码并算好词频项后缓存在内存中
+
+    参数说明:
+        k1: 词频饱和参数
+        b: 文档长度归一化的强度
+        cache_postings: 解码后缓存的倒排表总长度上限（每项 8 字节，默认约 64MB）
+        cache_min_df: 文档数达到多少的词才缓存
+        id_boost: 查询中编号（is_identifier）的权重倍数。编号的 idf 虽高，但只有一个词，
+            常见二元组多了仍可能压过它（3 万条语料中约两成订单号询问排第一的是别的订单）；乘以倍数后命中编号的文档排在前面
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, cache_postings: int = 8_000_000, cache_min_df: int = 4096,
+                 id_boost: float = 5.0):
+        self.k1 = k1
+        self.b = b
+        self.id_boost = id_boost
+        self.cache_postings = cache_postings
+        self.cache_min_df = cache_min_df
+        self.vocab: Dict[str, int] = {}
+        self.ids: List[str] = []
+        self.doc_len = np.zeros(0, dtype=np.int32)
+        self.postings = np.zeros(0, dtype=np.uint8)
+        self.tfs = np.zeros(0, dtype=np.uint8)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.byte_offsets = np.zeros(1, dtype=np.int64)
+        self.max_impact = np.zeros(0, dtype=np.float32)
+        self._norm: Optional[np.ndarray] = None
+        self._cache: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._cached = 0
+        self._cache_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ------------------------------------------------------------------
+    # 构建
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, str]], block_docs: int = 100_000, **kwargs) -> "BM25Index":
+        """
+        从 (id, 文本) 构建索引，documents 可以是生成器
+        按 block_docs 个文档一块：块内把 (词, 文档) 对排序、计数得到词频，只保留紧凑的数组；
+        最后按每个词的文档数算出位置，把各块的倒排表依次填进去（块的文档号递增，填完即有序），不需要全局排序
+        """
+        index = cls(**kwargs)
+        vocab = index.vocab
+        blocks: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        lengths = array("i")
+        terms, block_lengths = array("i"), array("i")
+
+        def flush():
+            if not block_lengths:
+                return
+            start = len(lengths) - len(block_lengths)
+            docs = np.repeat(np.arange(start, len(lengths), dtype=np.int64), np.frombuffer(block_lengths, np.int32))
+            keys, counts = np.unique((np.frombuffer(terms, np.int32).astype(np.int64) << 32) | docs,
+                                     return_counts=True)
+            blocks.append(((keys >> 32).astype(np.int32), (keys & 0xFFFFFFFF).astype(np.int32),
+                           np.minimum(counts, 255).astype(np.uint8)))
+            del terms[:], block_lengths[:]
+
+        for id, text in documents:
+            tokens = tokenize(text)
+            terms.extend([vocab.setdefault(token, len(vocab)) for token in tokens])
+            block_lengths.append(len(tokens))
+            lengths.append(len(tokens))
+            index.ids.append(id)
+            if len(block_lengths) >= block_docs:
+                flush()
+        flush()
+
+        n_terms = len(vocab)
+        df = np.zeros(n_terms, dtype=np.int64)
+        for block_terms, _, _ in blocks:
+            df += np.bincount(block_terms, minlength=n_terms)
+        offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+        docs = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.uint8)
+        cursor = offsets[:-1].copy()
+        while blocks:
+            block_terms, block_docs_, block_tfs = blocks.pop(0)
+            # 块内已按 (词, 文档) 排序：同一个词的第 j 个文档放在 cursor[词] + j
+            counts = np.bincount(block_terms, minlength=n_terms)
+            first = np.cumsum(counts) - counts
+            positions = cursor[block_terms] + np.arange(len(block_terms)) - first[block_terms]
+            docs[positions] = block_docs_
+            tfs[positions] = block_tfs
+            cursor += counts
+
+        # 每个词的第一个文档存文档号本身，之后存与前一个文档号的间隔
+        gaps = docs.astype(np.uint32)
+        gaps[1:] -= docs[:-1].astype(np.uint32)
+        heads = offsets[:-1][df > 0]
+        gaps[heads] = docs[heads]
+        index.postings = varint_encode(gaps)
+        # 每个词在 postings 中的起止位置：各文档间隔编码后字节数的前缀和
+        ends = np.zeros(len(gaps) + 1, dtype=np.int64)
+        np.cumsum(varint_sizes(gaps), out=ends[1:])
+        index.tfs = tfs
+        index.offsets = offsets
+        index.byte_offsets = ends[offsets]
+        index.doc_len = np.frombuffer(lengths, dtype=np.int32).copy()
+        if len(docs):
+            # 每个词都至少出现在一个文档中，offsets[:-1] 都是有效的起点
+            impact = index._impact(docs, tfs, index.k1 + 1)
+            index.max_impact = np.maximum.reduceat(impact, offsets[:-1]).astype(np.float32)
+        return index
+
+    # ------------------------------------------------------------------
+    # 存取
+    # ------------------------------------------------------------------
+
+    def save(self, path: Union[str, Path]) -> None:
+        # 词表和文档 id 都不含换行，拼成一个字符串保存，比逐个保存的对象数组小得多
+        vocab = "\n".join(sorted(self.vocab, key=self.vocab.get)).encode("utf-8")
+        np.savez(path, postings=self.postings, tfs=self.tfs, offsets=self.offsets, byte_offsets=self.byte_offsets,
+                 doc_len=self.doc_len, max_impact=self.max_impact, vocab=np.frombuffer(vocab, dtype=np.uint8),
+                 ids=np.frombuffer("\n".join(self.ids).encode("utf-8"), dtype=np.uint8),
+                 params=np.array([self.k1, self.b, self.id_boost]))
+
+    @classmethod
+    def load(cls, path: Union[str, Path], **kwargs) -> "BM25Index":
+        data = np.load(path)
+        params = dict(zip(("k1", "b", "id_boost"), data["params"].tolist()))  # 旧文件没有 id_boost
+        index = cls(**{**params, **kwargs})
+        for name in ("postings", "tfs", "offsets", "byte_offsets", "doc_len", "max_impact"):
+            setattr(index, name, data[name])
+        vocab = data["vocab"].tobytes().decode("utf-8")
+        index.vocab = {term: i for i, term in enumerate(vocab.split("\n"))} if vocab else {}
+        ids = data["ids"].tobytes().decode("utf-8")
+        index.ids = ids.split("\n") if ids else []
+        return index
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+
+    @property
+    def norm(self) -> np.ndarray:
+        """每个文档的 k1 * (1 - b + b * 文档长度 / 平均长度)，与查询无关，算一次即可"""
+        if self._norm is None:
+            lengths = self.doc_len.astype(np.float32)
+            self._norm = self.k1 * (1 - self.b + self.b * lengths / max(float(lengths.mean()), 1.0))
+        return self._norm
+
+    def _impact(self, docs: np.ndarray, tfs: np.ndarray, weight: float = 1.0) -> np.ndarray:
+        """词频项 weight * tf / (tf + norm)，weight 取 k1 + 1 时即 BM25 中与 idf 相乘的部分"""
+        tfs = tfs.astype(np.float32)
+        return weight * tfs / (tfs + self.norm[docs])
+
+    def posting(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        """第 term 个词的 (文档号, 词频)，文档号升序"""
+        start, end = self.offsets[term], self.offsets[term + 1]
+        data = self.postings[self.byte_offsets[term]:self.byte_offsets[term + 1]]
+        return np.cumsum(varint_decode(data), dtype=np.int32), self.tfs[start:end]
+
+    def _term(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        """第 term 个词的 (文档号, 词频项 tf * (k1 + 1) / (tf + norm))，文档数多的词解码后缓存"""
+        cacheable = self.offsets[term + 1] - self.offsets[term] >= self.cache_min_df
+        if cacheable:
+            with self._cache_lock:
+                cached = self._cache.get(term)
+                if cached is not None:
+                    self._cache.move_to_end(term)
+                    return cached
+        docs, tfs = self.posting(term)
+        cached = docs, self._impact(docs, tfs, self.k1 + 1)
+        if cacheable and len(docs) <= self.cache_postings:
+            with self._cache_lock:
+                self._cache[term] = cached
+                self._cached += len(docs)
+                while self._cached > self.cache_postings:
+                    self._cached -= len(self._cache.popitem(last=False)[1][0])
+        return cached
+
+    def idf(self, term: int) -> float:
+        df = self.offsets[term + 1] - self.offsets[term]
+        return float(np.log(1 + (len(self.ids) - df + 0.5) / (df + 0.5)))
+
+    def query_terms(self, query: str) -> Dict[int, float]:
+        """查询中命中词表的词 -> 权重（出现次数 * idf，编号再乘以 id_boost）"""
+        counts = Counter(token for token in tokenize(query) if token in self.vocab)
+        return {self.vocab[token]: count * self.idf(self.vocab[token]) * (self.id_boost if is_identifier(token) else 1.0)
+                for token, count in counts.items()}
+
+    def identifier_matches(self, query: str, rows: np.ndarray) -> np.ndarray:
+        """rows 中哪些文档包含查询里的编号（is_identifier 的词），返回布尔数组；查询没有编号时全为 False"""
+        rows = np.asarray(rows, dtype=np.int64)
+        matched = np.zeros(len(rows), dtype=bool)
+        for token in set(tokenize(query)):
+            if is_identifier(token) and token in self.vocab:
+                matched |= np.isin(rows, self.posting(self.vocab[token])[0])
+        return matched
+
+    def search(self, query: str, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 检索
+        :return: (分数, 行号)，按分数降序，最多 k 个；没有任何词命中时为空数组
+        """
+        terms = self.query_terms(query)
+        if not terms or not self.ids:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        # (权重, 词)，单个文档从这个词得到的分数不超过 权重 * max_impact
+        plan = sorted(((weight, term) for term, weight in terms.items()),
+                      key=lambda item: -item[0] * self.max_impact[item[1]])
+        bounds = [weight * self.max_impact[term] for weight, term in plan]
+        rest = np.append(np.cumsum(bounds[::-1])[::-1], 0.0)  # rest[i]: 第 i 个及之后的词的上界之和
+        df = [int(self.offsets[term + 1] - self.offsets[term]) for _, term in plan]
+
+        docs = np.zeros(0, dtype=np.int32)
+        scores = np.zeros(0, dtype=np.float32)
+        dense: Optional[np.ndarray] = None  # 候选太多时改为按文档号累加的稠密数组，比合并有序数组快
+        threshold = 0.0  # 第 k 名分数的下界：任意 k 个文档的部分得分都不超过它们的最终得分
+        for i, (weight, term) in enumerate(plan):
+            if threshold > rest[i]:
+                # 剩下的词上界之和不超过第 k 名：没出现过的文档进不了前 k，已有的候选中也只有
+                # 部分得分 + 剩余上界超过第 k 名的才需要补分
+                candidates = np.flatnonzero((dense if dense is not None else scores) > threshold - rest[i])
+                if len(candidates) * 8 < sum(df[i:]):
+                    # 候选远少于剩余的倒排表：在倒排表中二分查找候选，不再累加整个倒排表
+                    if dense is not None:
+                        docs, scores = candidates.astype(np.int32), dense[candidates]
+                        dense = None
+                    else:
+                        docs, scores = docs[candidates], scores[candidates]
+                    for weight, term in plan[i:]:
+                        term_docs, impact = self._term(term)
+                        position = np.minimum(np.searchsorted(term_docs, docs), len(term_docs) - 1)
+                        hit = term_docs[position] == docs
+                        scores[hit] += weight * impact[position[hit]]
+                    break
+            term_docs, impact = self._term(term)
+            if dense is None and len(docs) + len(term_docs) > len(self.ids) // 32:
+                dense = np.zeros(len(self.ids), dtype=np.float32)
+                dense[docs] = scores
+            if dense is not None:
+                # 同一个词的文档号不重复，可以直接按下标累加
+                dense[term_docs] += weight * impact
+            else:
+                docs, scores = _merge(docs, scores, term_docs, weight * impact)
+            # 部分得分不超过已处理的词的上界之和，它不超过剩余上界时不可能剪枝，不必估计第 k 名
+            if rest[0] - rest[i + 1] > rest[i + 1]:
+                # 任意一部分文档中的第 k 名都是下界：稠密数组只在本次累加的文档中等间隔取最多 65536 个估计
+                touched = dense[term_docs[::len(term_docs) // 65536 + 1]] if dense is not None else scores
+                if len(touched) >= k:
+                    threshold = max(threshold, float(np.partition(touched, len(touched) - k)[len(touched) - k]))
+        if dense is not None:
+            top = _top_k(dense, k)
+            top = top[dense[top] > 0]
+            return dense[top], top.astype(np.int64)
+        top = _top_k(scores, k)
+        return scores[top], docs[top].astype(np.int64)
@@ -0,0 +1,311 @@
+#录制/回放层：把聊天模型和向量模型的 请求→响应 录制到 zstd 压缩的 cassette 文件，之后不访问网络即可重复执行
+#- 请求规范化后取哈希作为索引键，回放时 O(1) 查找，回放 10 万次调用也很快
+#- 流式调用记录每个 chunk 相对开始时间的偏移，回放时可以按原始节奏、加速或不等待
+#- 找不到匹配的请求时按策略处理：直接报错，或调用真实模型（录制模式下同时录入）
+#
+#用法:
+#    cassette = Cassette("feedback.cassette.zst")
+#    model = CassetteChatModel(inner=ChatTongyi(model_name="qwen-max"), cassette=cassette, mode="record")
+#    ...
+#    cassette.save()
+#
+#    # 回放：不访问网络，找不到匹配的请求时报错；没有 inner 和 model_id 时不按模型名匹配
+#    model = CassetteChatModel(cassette=Cassette("feedback.cassette.zst"), mode="replay")
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import zstandard
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# 参与匹配的请求字段，match_on 可以只选其中一部分（例如忽略 temperature）
+REQUEST_FIELDS = ("kind", "model", "messages", "params", "tools", "stop", "text")
+
+
+class CassetteMissError(LookupError):
+    """回放模式下找不到匹配的录制请求"""
+
+
+def request_key(request: Dict[str, Any], match_on: Sequence[str] = REQUEST_FIELDS) -> str:
+    """规范化后的请求取 blake2b 哈希作为索引键"""
+    selected = {field: request.get(field) for field in match_on}
+    canonical = json.dumps(selected, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class Cassette:
+    """
+    cassette 文件：每行一条 JSON 记录，整体 zstd 压缩
+
+    记录格式: {"key", "request", "response", "latency"} 或流式的 {"key", "request", "chunks": [[偏移秒, chunk]]}
+    同一个请求录制多次时按录制顺序依次回放，回放完后重复最后一条
+    request 中保存了模型名；另外按不含模型名的键建一份索引，回放时不知道模型名也能查找（lookup 的 any_model）
+    """
+
+    def __init__(self, path: str, match_on: Sequence[str] = REQUEST_FIELDS):
+        self.path = path
+        self.match_on = tuple(match_on)
+        self._index: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._any_model: Dict[str, List[Dict[str, Any]]] = defaultdict(list)  # 不含模型名的键 -> 记录
+        self._cursor: Dict[str, int] = defaultdict(int)
+        self._new: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._index.values())
+
+    def load(self) -> None:
+        with open(self.path, "rb") as f, zstandard.ZstdDecompressor().stream_reader(f) as reader:
+            data = reader.read()
+        for line in data.splitlines():
+            if line:
+                self._add(json.loads(line))
+
+    def _add(self, entry: Dict[str, Any]) -> None:
+        self._index[entry["key"]].append(entry)
+        self._any_model[self.key(entry.get("request") or {}, any_model=True)].append(entry)
+
+    def save(self) -> None:
+        """把本次新录制的记录与已有记录一起写回文件"""
+        with self._lock:
+            if not self._new:
+                return
+            lines = [json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+                     for entries in self._index.values() for entry in entries]
+            self._new.clear()
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zstandard.ZstdCompressor(level=10).compress(data))
+        os.replace(tmp_path, self.path)
+
+    def key(self, request: Dict[str, Any], any_model: bool = False) -> str:
+        """any_model=True 时模型名不参与匹配"""
+        match_on = tuple(field for field in self.match_on if field != "model") if any_model else self.match_on
+        return request_key(request, match_on)
+
+    def lookup(self, key: str, any_model: bool = False) -> Optional[Dict[str, Any]]:
+        """any_model=True 时 key 需要由 key(request, any_model=True) 得到，同一个请求录制了多个模型时按录制顺序回放"""
+        with self._lock:
+            entries = (self._any_model if any_model else self._index).get(key)
+            if not entries:
+                self.misses += 1
+                return None
+            cursor = ("*", key) if any_model else key
+            position = self._cursor[cursor]
+            self._cursor[cursor] = position + 1
+            self.hits += 1
+            return entries[min(position, len(entries) - 1)]
+
+    def record(self, key: str, entry: Dict[str, Any]) -> None:
+        entry = {"key": key, **entry}
+        with self._lock:
+            self._add(entry)
+            self._new.append(entry)
+
+    def __enter__(self) -> "Cassette":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.save()
+
+
+def _wait(offset: float, started: float, speed: Optional[float]) -> None:
+    """按 speed 倍速等到 offset 时刻，speed 为 None 时不等待"""
+    if speed:
+        remaining = offset / speed - (time.perf_counter() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    带录制/回放的聊天模型
+
+    参数说明:
+        inner: 真实模型（任意接受消息列表、返回消息的 Runnable，如 ChatOpenAI、LazyChatModel），
+            replay 模式且 on_missing="error" 时可以不传
+        cassette: cassette 文件
+        mode: "record" 总是调用真实模型并录制；"replay" 只回放；"auto" 有录制就回放，没有就调用并录制
+        on_missing: 回放时找不到匹配请求的处理方式，"error" 抛出 CassetteMissError，"passthrough" 调用真实模型
+        speed: 回放节奏，None 不等待，1.0 按原始耗时，10.0 表示加速 10 倍
+        model_id: 参与匹配的模型标识，默认取 inner 的模型名；两者都没有时不按模型名匹配
+    """
+
+    inner: Optional[Runnable] = None
+    cassette: Any
+    mode: str = "auto"
+    on_missing: str = "error"
+    speed: Optional[float] = None
+    model_id: Optional[str] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette-chat-model"
+
+    def _model_id(self) -> Optional[str]:
+        if self.model_id:
+            return self.model_id
+        # LazyChatModel 没有创建模型时也能从参数中读到模型名
+        model = getattr(self.inner, "model_name", None) or getattr(self.inner, "model", None)
+        return model if isinstance(model, str) else None
+
+    def _lookup(self, request: Dict[str, Any]):
+        """返回 (索引键, 匹配的记录)；不知道模型名时按不含模型名的键查找"""
+        any_model = request["model"] is None
+        key = self.cassette.key(request, any_model=any_model)
+        return key, None if self.mode == "record" else self.cassette.lookup(key, any_model=any_model)
+
+    def _request(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any]) -> Dict:
+        params = {key: value for key, value in kwargs.items() if key != "tools"}
+        return {
+            "kind": "chat",
+            "model": self._model_id(),
+            "messages": [message_to_dict(message) for message in messages],
+            "params": params or None,
+            "tools": kwargs.get("tools"),
+            "stop": stop,
+        }
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        """工具转换成 OpenAI 格式后作为调用参数，既参与匹配，也原样传给真实模型"""
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _should_call_inner(self, entry: Optional[Dict[str, Any]], key: str) -> bool:
+        if self.mode == "record":
+            return True
+        if entry is not None:
+            return False
+        if self.mode == "replay" and self.on_missing == "error":
+            raise CassetteMissError(f"cassette {self.cassette.path} 中没有匹配的请求 (key={key})")
+        if self.inner is None:
+            raise CassetteMissError(f"没有匹配的请求且没有配置真实模型 (key={key})")
+        return True
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        request = self._request(messages, stop, kwargs)
+        key, entry = self._lookup(request)
+        if self._should_call_inner(entry, key):
+            start = time.perf_counter()
+            message = self.inner.invoke(messages, stop=stop, **kwargs)
+            if self.mode != "replay":
+                self.cassette.record(self.cassette.key(request), {
+                    "request": request, "response": message_to_dict(message), "latency": time.perf_counter() - start})
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        if "chunks" in entry:
+            # 录制的是流式调用，合并成完整消息
+            chunks = messages_from_dict([chunk for _, chunk in entry["chunks"]])
+            message = chunks[0]
+            for chunk in chunks[1:]:
+                message = message + chunk
+            _wait(entry["chunks"][-1][0] if entry["chunks"] else 0.0, time.perf_counter(), self.speed)
+        else:
+            message = messages_from_dict([entry["response"]])[0]
+            _wait(entry.get("latency", 0.0), time.perf_counter(), self.speed)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _inner_stream(self, messages: List[BaseMessage], stop: Optional[List[str]],
+                      kwargs: Dict[str, Any]) -> Iterator[ChatGenerationChunk]:
+        """真实模型不支持流式时 stream 只返回一个完整消息，转换成 chunk"""
+        for message in self.inner.stream(messages, stop=stop, **kwargs):
+            if not isinstance(message, AIMessageChunk):
+                message = AIMessageChunk(**message.model_dump(exclude={"type"}))
+            yield ChatGenerationChunk(message=message)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        request = self._request(messages, stop, kwargs)
+        key, entry = self._lookup(request)
+        if self._should_call_inner(entry, key):
+            start = time.perf_counter()
+            recorded = []
+            for chunk in self._inner_stream(messages, stop, kwargs):
+                recorded.append([time.perf_counter() - start, message_to_dict(chunk.message)])
+                if run_manager is not None:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+            if self.mode != "replay":
+                self.cassette.record(self.cassette.key(request), {"request": request, "chunks": recorded})
+            return
+
+        started = time.perf_counter()
+        if "chunks" in entry:
+            timeline = [(offset, messages_from_dict([chunk])[0]) for offset, chunk in entry["chunks"]]
+        else:
+            # 录制的是非流式调用，作为一个 chunk 回放
+            message = messages_from_dict([entry["response"]])[0]
+            timeline = [(entry.get("latency", 0.0), AIMessageChunk(**message.model_dump(exclude={"type"})))]
+        for offset, message in timeline:
+            _wait(offset, started, self.speed)
+            chunk = ChatGenerationChunk(message=message)
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class CassetteEmbeddings(Embeddings):
+    """
+    带录制/回放的向量模型，按单条文本录制，批次组成不同也能命中
+    参数含义与 CassetteChatModel 相同
+    """
+
+    def __init__(self, cassette: Cassette, inner: Optional[Embeddings] = None, mode: str = "auto",
+                 on_missing: str = "error", model_id: Optional[str] = None):
+        self.cassette = cassette
+        self.inner = inner
+        self.mode = mode
+        self.on_missing = on_missing
+        self.model_id = model_id or getattr(inner, "model", None) or "unknown"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cassette.key({"kind": "embedding", "model": self.model_id, "text": text}) for text in texts]
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        missing = []
+        for i, key in enumerate(keys):
+            entry = None if self.mode == "record" else self.cassette.lookup(key)
+            if entry is None:
+                missing.append(i)
+            else:
+                vectors[i] = entry["response"]
+        if missing:
+            if (self.mode == "replay" and self.on_missing == "error") or self.inner is None:
+                raise CassetteMissError(f"cassette {self.cassette.path} 中缺少 {len(missing)} 条文本的向量")
+            # 缺失的文本合并成一次批量请求
+            computed = self.inner.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+                if self.mode != "replay":
+                    self.cassette.record(keys[i], {"request": {"kind": "embedding", "model": self.model_id,
+                                                               "text": texts[i]},
+                                                   "response": vector})
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,205 @@
+#链的静态优化：遍历组合好的 Runnable 图，返回结果相同、但节点更少的 Runnable
+#- 删除不做任何事的 RunnablePassthrough
+#- 相邻的纯函数节点（RunnableLambda、itemgetter）合并成一个函数
+#- 分支全部是纯函数的 RunnableParallel / assign 合并成一个函数
+#- 可选（hoist_constants=True）：函数体只是字面量的分支（如 lambda _: {"model": "qwen-plus"}）在优化时取值一次，之后直接复用结果
+#前提：RunnableLambda 中的函数是纯函数（相同输入得到相同输出）；优化后开启追踪时看到的 run 会变少
+#优化过程不调用任何用户函数：lambda _: time.time() 这类不使用输入、但每次结果不同或有副作用的分支不会被提前计算
+#注意：常量分支的结果每次调用都返回同一个对象，下游不要原地修改
+import dis
+import inspect
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.runnables import Runnable, RunnableLambda, RunnableParallel, RunnablePassthrough, RunnableSequence
+from langchain_core.runnables.passthrough import RunnableAssign
+from langchain_core.runnables.utils import accepts_config, accepts_run_manager
+
+_MISSING = object()
+
+
+def _identity(x):
+    return x
+
+
+def is_identity(step: Runnable) -> bool:
+    """不带函数、不做 assign 的 RunnablePassthrough"""
+    return type(step) is RunnablePassthrough and step.func is None and step.afunc is None
+
+
+def _fusible_func(step: Runnable) -> Optional[Callable]:
+    """可以合并的节点返回其函数，否则返回 None"""
+    if is_identity(step):
+        return _identity
+    if type(step) is not RunnableLambda or not hasattr(step, "func"):
+        return None
+    func = step.func
+    if inspect.isgeneratorfunction(func) or accepts_config(func) or accepts_run_manager(func):
+        return None
+    return func
+
+
+# 只由这些指令组成的函数体是一个字面量：只加载常量、构造容器，不读取变量、不调用任何函数
+_LITERAL_OPCODES = frozenset({
+    "RESUME", "NOP", "CACHE", "LOAD_CONST", "RETURN_CONST", "RETURN_VALUE",
+    "BUILD_TUPLE", "BUILD_LIST", "BUILD_SET", "BUILD_MAP", "BUILD_CONST_KEY_MAP",
+    "LIST_EXTEND", "SET_UPDATE", "DICT_UPDATE",
+})
+
+
+def _is_literal(func: Callable) -> bool:
+    """函数只有一个参数，函数体只是返回一个字面量（如 lambda _: {"model": "qwen-plus"}）"""
+    code = getattr(func, "__code__", None)
+    if code is None or code.co_argcount != 1 or code.co_kwonlyargcount or code.co_freevars:
+        return False
+    if code.co_flags & (inspect.CO_VARARGS | inspect.CO_VARKEYWORDS | inspect.CO_GENERATOR | inspect.CO_COROUTINE):
+        return False
+    return all(instruction.opname in _LITERAL_OPCODES for instruction in dis.get_instructions(code))
+
+
+def _constant_value(func: Callable) -> Any:
+    if not _is_literal(func):
+        return _MISSING
+    # 函数体只构造字面量，调用它不会执行其他代码，也没有副作用
+    return func(None)
+
+
+def _step_name(step: Runnable) -> str:
+    return step.get_name() if isinstance(step, Runnable) else getattr(step, "__name__", repr(step))
+
+
+def fuse_functions(funcs: List[Callable]) -> Callable:
+    """把 f1, f2, ... 合并成 x -> fn(...f2(f1(x)))，保留 RunnableLambda 返回 Runnable 时继续执行的行为"""
+    funcs = [func for func in funcs if func is not _identity]
+    if not funcs:
+        return _identity
+    if len(funcs) == 1:
+        return funcs[0]
+
+    def fused(x):
+        for func in funcs:
+            output = func(x)
+            x = output.invoke(x) if isinstance(output, Runnable) else output
+        return x
+
+    return fused
+
+
+def _fuse_parallel(funcs: Dict[str, Callable], constants: Dict[str, Any], order: List[str]) -> Callable:
+    def fused(x):
+        return {key: constants[key] if key in constants else funcs[key](x) for key in order}
+
+    return fused
+
+
+class ChainOptimizer:
+    """
+    链优化器
+
+    用法:
+        fast_chain = optimize_chain(chain)
+        # 或者查看做了哪些改动
+        optimizer = ChainOptimizer()
+        fast_chain = optimizer.optimize(chain)
+        print(optimizer.changes)
+    """
+
+    def __init__(self, hoist_constants: bool = False):
+        """
+        :param hoist_constants: 是否把函数体只是字面量的分支在优化时取值一次（结果每次返回同一个对象）
+        """
+        self.hoist_constants = hoist_constants
+        self.changes: List[str] = []
+
+    def optimize(self, runnable: Runnable) -> Runnable:
+        if isinstance(runnable, RunnableSequence):
+            return self._optimize_sequence(runnable)
+        if isinstance(runnable, RunnableAssign):
+            return self._optimize_assign(runnable)
+        if type(runnable) is RunnableParallel:
+            return self._optimize_parallel(runnable)
+        return runnable
+
+    def _optimize_sequence(self, sequence: RunnableSequence) -> Runnable:
+        steps: List[Runnable] = []
+        pending: List[Runnable] = []
+
+        def flush():
+            if len(pending) == 1:
+                steps.append(pending[0])
+            elif pending:
+                names = " | ".join(_step_name(step) for step in pending)
+                self.changes.append(f"合并 {len(pending)} 个节点: {names}")
+                steps.append(RunnableLambda(fuse_functions([_fusible_func(step) for step in pending]), name=names))
+            pending.clear()
+
+        for step in sequence.steps:
+            step = self.optimize(step)
+            if isinstance(step, RunnableSequence):
+                children = step.steps
+            else:
+                children = [step]
+            for child in children:
+                if is_identity(child):
+                    self.changes.append("删除 RunnablePassthrough")
+                    continue
+                if _fusible_func(child) is not None:
+                    pending.append(child)
+                else:
+                    flush()
+                    steps.append(child)
+        flush()
+        if not steps:
+            return RunnablePassthrough()
+        if len(steps) == 1:
+            return steps[0]
+        return RunnableSequence(*steps, name=sequence.name)
+
+    def _optimize_branches(self, parallel: RunnableParallel):
+        """返回 (优化后的分支, 分支函数, 常量分支)，分支函数只包含可以合并的分支"""
+        branches = {key: self.optimize(step) for key, step in parallel.steps__.items()}
+        funcs: Dict[str, Callable] = {}
+        constants: Dict[str, Any] = {}
+        for key, step in branches.items():
+            func = _fusible_func(step)
+            if func is None:
+                continue
+            funcs[key] = func
+            if self.hoist_constants:
+                value = _constant_value(func)
+                if value is not _MISSING:
+                    constants[key] = value
+                    self.changes.append(f"常量分支 {key!r} 提前计算")
+        return branches, funcs, constants
+
+    def _optimize_parallel(self, parallel: RunnableParallel) -> Runnable:
+        branches, funcs, constants = self._optimize_branches(parallel)
+        order = list(branches)
+        if len(funcs) == len(branches):
+            self.changes.append(f"合并并行分支: {', '.join(order)}")
+            return RunnableLambda(_fuse_parallel(funcs, constants, order), name=parallel.get_name())
+        if constants:
+            # 只把非常量分支交给 RunnableParallel，常量按原顺序合并进结果
+            rest = RunnableParallel({key: step for key, step in branches.items() if key not in constants})
+            merge = _fuse_parallel({key: (lambda d, k=key: d[k]) for key in order if key not in constants},
+                                   constants, order)
+            return rest | RunnableLambda(merge, name="merge_constants")
+        return RunnableParallel(branches)
+
+    def _optimize_assign(self, assign: RunnableAssign) -> Runnable:
+        branches, funcs, constants = self._optimize_branches(assign.mapper)
+        if len(funcs) != len(branches):
+            return RunnableAssign(RunnableParallel(branches))
+        mapper = _fuse_parallel(funcs, constants, list(branches))
+        self.changes.append(f"合并 assign: {', '.join(branches)}")
+
+        def fused_assign(x):
+            if not isinstance(x, dict):
+                raise ValueError("The input to RunnablePassthrough.assign() must be a dict.")
+            return {**x, **mapper(x)}
+
+        return RunnableLambda(fused_assign, name=assign.get_name())
+
+
+def optimize_chain(runnable: Runnable, hoist_constants: bool = False) -> Runnable:
+    """返回与 runnable 结果相同、节点更少的 Runnable"""
+    return ChainOptimizer(hoist_constants=hoist_constants).optimize(runnable)
@@ -0,0 +1,171 @@
+#熔断器：上游模型服务故障时快速失败，避免每个请求都重试、等待
+#状态: CLOSED(正常) -> OPEN(熔断，直接失败) -> HALF_OPEN(放少量探测请求) -> CLOSED/OPEN
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+
+class ModelUnavailableError(RuntimeError):
+    """模型服务不可用（重试耗尽或熔断中）"""
+
+
+class CircuitOpenError(ModelUnavailableError):
+    """熔断器处于打开状态，调用被直接拒绝"""
+
+
+class CircuitBreaker:
+    """
+    基于滚动时间窗口错误率的熔断器
+
+    规则:
+        - CLOSED: 统计最近 window_seconds 秒内的调用结果，调用数达到 min_calls
+          且失败率达到 failure_threshold 时打开熔断
+        - OPEN: 所有调用直接抛出 CircuitOpenError，recovery_timeout 秒后进入 HALF_OPEN
+        - HALF_OPEN: 最多放行 half_open_max_calls 个探测请求，全部成功则关闭，任一失败则重新打开
+    """
+
+    def __init__(self, name: str, failure_threshold: float = 0.5, min_calls: int = 5,
+                 window_seconds: float = 30.0, recovery_timeout: float = 10.0,
+                 half_open_max_calls: int = 1, clock: Callable[[], float] = time.monotonic):
+        """
+        :param name: 熔断器名称，一般是模型名
+        :param failure_threshold: 打开熔断的失败率阈值
+        :param min_calls: 窗口内最少调用数，调用太少时不判断
+        :param window_seconds: 滚动窗口长度(秒)
+        :param recovery_timeout: 打开后多久进入半开状态(秒)
+        :param half_open_max_calls: 半开状态允许的探测请求数
+        :param clock: 时钟函数，测试时可以替换
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._state = CLOSED
+        self._events = deque()  # (时间戳, 是否成功)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    def _refresh_state(self) -> None:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+            self._half_open_successes = 0
+
+    def _trim(self, now: float) -> None:
+        while self._events and now - self._events[0][0] > self.window_seconds:
+            _, ok = self._events.popleft()
+            if not ok:
+                self._failures -= 1
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._events.clear()
+        self._failures = 0
+
+    def allow_request(self) -> bool:
+        """判断当前是否允许发起调用，半开状态下会占用一个探测名额"""
+        with self._lock:
+            self._refresh_state()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def release(self) -> None:
+        """调用被取消、没有结果时归还 allow_request 占用的探测名额，否则半开状态会一直等不到探测结果"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._half_open_successes += 1
+                if self._half_open_successes >= self.half_open_max_calls:
+                    self._state = CLOSED
+                    self._events.clear()
+                    self._failures = 0
+                return
+            now = self._clock()
+            self._events.append((now, True))
+            self._trim(now)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+            if self._state == OPEN:
+                return
+            now = self._clock()
+            self._events.append((now, False))
+            self._failures += 1
+            self._trim(now)
+            calls = len(self._events)
+            if calls >= self.min_calls and self._failures / calls >= self.failure_threshold:
+                self._open()
+
+    def call(self, func: Callable, *args, **kwargs):
+        """
+        通过熔断器执行调用
+        :raises CircuitOpenError: 熔断打开时直接抛出，不会调用 func
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"模型 {self.name} 熔断中，请求被拒绝")
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # KeyboardInterrupt、取消等没有给出调用结果，归还半开状态的探测名额，否则熔断器会一直停在半开状态
+            self.release()
+            raise
+        self.record_success()
+        return result
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """
+    按模型名获取熔断器，同一个模型在进程内共享一个熔断器
+    :param name: 模型名
+    :param kwargs: 首次创建时传给 CircuitBreaker 的参数
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **kwargs)
+        return breaker
+
+
+def reset_breakers(name: Optional[str] = None) -> None:
+    """清除熔断器，name 为空时清除全部"""
+    with _breakers_lock:
+        if name is None:
+            _breakers.clear()
+        else:
+            _breakers.pop(name, None)
@@ -0,0 +1,179 @@
+#蒸馏数据记录：把大模型的分析结果异步写入按日期、任务分区的 Parquet 文件(zstd 压缩)
+#用于离线训练本地模型（如本地预分类器）
+#请求路径上只做一次入队操作，队列满时直接丢弃，不会阻塞请求
+#后台线程不会因为单条坏记录或一次写盘失败而退出：无法序列化的值转成列表/字符串，写失败的批次计入 errors 后继续
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+_STOP = object()
+
+
+@lru_cache(maxsize=None)
+def _schema():
+    # pyarrow 导入约 150ms，放到第一次写出时（后台线程中）再加载，不拖慢使用方的启动
+    import pyarrow as pa
+
+    return pa.schema([
+        ("ts", pa.timestamp("ms")),
+        ("feedback", pa.string()),
+        ("output", pa.string()),
+    ])
+
+
+class ParquetLogSink:
+    """
+    异步 Parquet 日志写入器
+
+    - log() 只把记录放入有界队列，队列满时丢弃并计数（背压策略：丢弃而不是阻塞）
+    - 后台线程按 batch_size 条或 flush_interval 秒批量写出
+    - 输出目录结构: root/dt=YYYY-MM-DD/task=<任务名>/part-<时间戳>-<随机串>.parquet
+      (dt、task 只存在于分区目录名中，按 hive 分区读取即可还原)
+    - 写出出错时后台线程继续运行：set 等无法 JSON 序列化的值转成列表或字符串，仍无法序列化的记录(如循环引用)丢弃；
+      写文件失败的批次整批丢弃。两种情况都计入 errors（失败次数）和 failed（丢失的记录数），last_error 为最近一次错误
+    """
+
+    def __init__(self, root: str, batch_size: int = 5000, flush_interval: float = 5.0,
+                 max_queue: int = 100000, compression: str = "zstd"):
+        """
+        :param root: 输出根目录
+        :param batch_size: 累积多少条记录写一次文件
+        :param flush_interval: 最长多少秒写一次文件
+        :param max_queue: 队列容量，超过时丢弃新记录
+        :param compression: Parquet 压缩算法
+        """
+        self.root = root
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.logged = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="distill-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, task: str, feedback: str, output: dict) -> bool:
+        """
+        记录一条分析结果，不阻塞
+        :param task: 任务名，如 sentiment / categories / urgency
+        :param feedback: 客户反馈原文
+        :param output: 大模型解析后的结果字典
+        :return: 是否成功入队
+        """
+        try:
+            self._queue.put_nowait((time.time(), task, feedback, output))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.logged += 1
+        return True
+
+    def _run(self) -> None:
+        buffer = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._flush(buffer)
+                return
+            if item is not None:
+                buffer.append(item)
+            if len(buffer) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(buffer)
+                buffer = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _error(self, error: BaseException, records: int) -> None:
+        self.errors += 1
+        self.failed += records
+        self.last_error = f"{type(error).__name__}: {error}"
+
+    def _flush(self, buffer: List[tuple]) -> None:
+        # 兜底：任何异常都不能让后台线程退出，否则 log() 会一直入队却再也没有人写出
+        try:
+            self._write(buffer)
+        except Exception as e:
+            self._error(e, 0)
+
+    def _encode(self, output) -> Optional[str]:
+        try:
+            return json.dumps(output, ensure_ascii=False)
+        except (TypeError, ValueError):
+            pass
+        try:
+            return json.dumps(output, ensure_ascii=False,
+                              default=lambda value: list(value) if isinstance(value, (set, frozenset)) else str(value))
+        except (TypeError, ValueError) as e:
+            self._error(e, 1)
+            return None
+
+    def _write(self, buffer: List[tuple]) -> None:
+        if not buffer:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        partitions: Dict[tuple, List[tuple]] = defaultdict(list)
+        for ts, task, feedback, output in buffer:
+            encoded = self._encode(output)
+            if encoded is not None:
+                row = (ts, str(feedback), encoded)
+                partitions[(time.strftime("%Y-%m-%d", time.localtime(ts)), task)].append(row)
+        for (dt, task), rows in partitions.items():
+            try:
+                directory = os.path.join(self.root, f"dt={dt}", f"task={task}")
+                os.makedirs(directory, exist_ok=True)
+                table = pa.table({
+                    "ts": pa.array([int(row[0] * 1000) for row in rows], pa.timestamp("ms")),
+                    "feedback": [row[1] for row in rows],
+                    "output": [row[2] for row in rows],
+                }, schema=_schema())
+                name = f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet"
+                pq.write_table(table, os.path.join(directory, name), compression=self.compression)
+            except Exception as e:
+                self._error(e, len(rows))
+                continue
+            self.written += len(rows)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """写出剩余记录并停止后台线程"""
+        if not self._thread.is_alive():
+            return
+        # 队列满时也要保证停止信号能送达
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {"logged": self.logged, "dropped": self.dropped, "written": self.written,
+                "failed": self.failed, "errors": self.errors, "last_error": self.last_error,
+                "queued": self._queue.qsize()}
+
+
+def load_distillation_records(root: str) -> List[dict]:
+    """
+    读取记录目录，按反馈原文合并各任务的结果，得到训练用记录
+    :return: [{"feedback", "sentiment", "confidence", "categories", "urgency", ...}]，只包含同时有情感和分类结果的反馈
+    """
+    import pyarrow.dataset as ds
+
+    table = ds.dataset(root, format="parquet", partitioning="hive").to_table(columns=["feedback", "output"])
+    merged: Dict[str, dict] = defaultdict(dict)
+    for feedback, output in zip(table.column("feedback").to_pylist(), table.column("output").to_pylist()):
+        merged[feedback].update(json.loads(output))
+    return [{"feedback": feedback, **fields} for feedback, fields in merged.items()
+            if "sentiment" in fields and "categories" in fields]
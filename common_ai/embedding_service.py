@@ -0,0 +1,262 @@
+#共享的向量化服务：把各处并发的向量化请求攒成批一次调用，相同文本只向量化一次，结果缓存到磁盘
+#检索、写入、分类等所有用到向量模型的地方共用同一个服务对象，重复的工单模板、FAQ 示例不再反复请求接口
+#
+#用法:
+#    embeddings = get_embedding_service(cache_path="embedding_cache.sqlite3")   # 按模型名在进程内共享
+#    retriever = Retriever(embeddings=embeddings, store=store)                  # 就是一个 Embeddings
+#    vector = embeddings.embed_query("退款多久到账")                               # 多个线程同时调用会合并成一批
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from common_ai.ai_variable import ALI_TONGYI_EMBEDDING_MODEL
+
+# text-embedding-v3 的兼容接口每次最多 10 条文本
+DEFAULT_BATCH_SIZE = 10
+# SQLite 单条语句的参数个数有上限，批量查询时分段
+_SQL_CHUNK = 500
+
+
+class EmbeddingCache:
+    """
+    磁盘上的向量缓存：SQLite 表 embeddings(key INTEGER PRIMARY KEY, vector BLOB)
+
+    - key 是文本的 xxhash64（以 namespace 作种子，不同模型、维度的向量不会混用），vector 是 float16 的原始字节
+    - path 为 ":memory:" 时只在内存中
+    - 多线程共用一个连接，读写都加锁；写入按批在一个事务中完成
+    """
+
+    def __init__(self, path: Union[str, Path] = ":memory:", namespace: str = ""):
+        import xxhash
+
+        self.path = str(path)
+        self.namespace = namespace
+        self._seed = xxhash.xxh64_intdigest(namespace.encode("utf-8"))
+        self._hash = xxhash.xxh64_intdigest
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key INTEGER PRIMARY KEY, vector BLOB NOT NULL)")
+        self._lock = threading.Lock()
+
+    def key(self, text: str) -> int:
+        # SQLite 的整数是有符号 64 位
+        h = self._hash(text.encode("utf-8"), seed=self._seed)
+        return h - (1 << 64) if h >= 1 << 63 else h
+
+    def get_many(self, keys: Sequence[int]) -> Dict[int, np.ndarray]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQL_CHUNK):
+                chunk = keys[start:start + _SQL_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float16)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[int, np.ndarray]]) -> None:
+        rows = [(key, np.asarray(vector, dtype=np.float16).tobytes()) for key, vector in items]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.execute("COMMIT")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingService(Embeddings):
+    """
+    包装一个向量模型，合并、去重、缓存并发的向量化请求
+
+    - 攒批：所有线程的请求进入同一个队列，凑满 max_batch_size 条，或最早的一条已等待 max_wait 秒，就发出一次调用。
+      max_concurrency 个调用都在进行时请求继续排队，负载越高批次越满
+    - 去重：同一次请求中、排队中和正在请求中的相同文本只向量化一次
+    - 缓存：结果以 float16 写入 cache，之后直接返回。新算出的向量也按 float16 取整后返回，
+      同一文本不论是否命中缓存得到的向量都相同
+    - 调用失败时，这一批中所有文本的请求都抛出该异常，失败的文本不写缓存
+
+    参数说明:
+        inner: 实际的向量模型，如 dashscope_embeddings()
+        cache: 向量缓存，为空时使用内存中的缓存，进程退出后失效
+        max_batch_size: 每次调用的最多文本数，不超过接口的上限
+        max_wait: 凑批的最长等待时间(秒)，单个请求因此最多多等这么久
+        max_concurrency: 同时进行的调用数
+    """
+
+    def __init__(self, inner: Embeddings, cache: Optional[EmbeddingCache] = None,
+                 max_batch_size: int = DEFAULT_BATCH_SIZE, max_wait: float = 0.005, max_concurrency: int = 4):
+        self.inner = inner
+        self.cache = cache if cache is not None else EmbeddingCache(namespace=self._namespace(inner))
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._pending: Deque[Tuple[int, str, Future, float]] = deque()  # (key, 文本, 结果, 入队时间)
+        self._inflight: Dict[int, Future] = {}  # 排队中和正在请求中的文本
+        self._slots = threading.Semaphore(max_concurrency)
+        self._dispatcher: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        self.requested = 0  # 请求的文本数
+        self.cache_hits = 0  # 命中缓存的文本数
+        self.shared = 0  # 与排队中、请求中或同一次请求中的相同文本合并的文本数
+        self.embedded = 0  # 实际发给模型的文本数
+        self.calls = 0  # 调用模型的次数
+
+    @staticmethod
+    def _namespace(inner: Embeddings) -> str:
+        model = getattr(inner, "model", None) or type(inner).__name__
+        return f"{model}:{getattr(inner, 'dimensions', None) or ''}"
+
+    # ------------------------------------------------------------------
+    # 请求
+    # ------------------------------------------------------------------
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        keys = [self.cache.key(text) for text in texts]
+        vectors = self.cache.get_many(list(dict.fromkeys(keys)))
+        waits: Dict[int, Future] = {}
+        hits = shared = 0
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingService 已关闭")
+            now = time.monotonic()
+            for key, text in zip(keys, texts):
+                if key in vectors:
+                    hits += 1
+                elif key in waits:
+                    shared += 1
+                elif key in self._inflight:
+                    waits[key] = self._inflight[key]
+                    shared += 1
+                else:
+                    waits[key] = self._inflight[key] = Future()
+                    self._pending.append((key, text, waits[key], now))
+            self.requested += len(texts)
+            self.cache_hits += hits
+            self.shared += shared
+            if self._pending:
+                self._start()
+                self._cond.notify()
+        for key, future in waits.items():
+            vectors[key] = future.result()
+        return np.stack([vectors[key] for key in keys]).astype(np.float32).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"requested": self.requested, "cache_hits": self.cache_hits, "shared": self.shared,
+                    "embedded": self.embedded, "calls": self.calls,
+                    "batch_size": self.embedded / self.calls if self.calls else 0.0}
+
+    # ------------------------------------------------------------------
+    # 攒批与调用
+    # ------------------------------------------------------------------
+
+    def _start(self) -> None:
+        if self._dispatcher is None:
+            self._pool = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="embedding")
+            self._dispatcher = threading.Thread(target=self._dispatch, name="embedding-batcher", daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self) -> None:
+        while True:
+            # 先等到有空闲的调用名额再攒批：名额都被占用时请求继续排队，下一批更满
+            self._slots.acquire()
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    self._slots.release()
+                    return
+                while len(self._pending) < self.max_batch_size and not self._closed:
+                    remaining = self._pending[0][3] + self.max_wait - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [self._pending.popleft() for _ in range(min(self.max_batch_size, len(self._pending)))]
+            self._pool.submit(self._call, batch)
+
+    def _call(self, batch: List[Tuple[int, str, Future, float]]) -> None:
+        try:
+            try:
+                vectors = np.asarray(self.inner.embed_documents([text for _, text, _, _ in batch]), dtype=np.float16)
+                if len(vectors) != len(batch):
+                    raise ValueError(f"向量模型返回 {len(vectors)} 个向量，请求了 {len(batch)} 条文本")
+                self.cache.put_many((key, vector) for (key, _, _, _), vector in zip(batch, vectors))
+            except BaseException as e:
+                with self._cond:
+                    self.calls += 1
+                    for key, _, future, _ in batch:
+                        self._inflight.pop(key, None)
+                        future.set_exception(e)
+                return
+            # 先写缓存再移出 _inflight：之后的请求总能在其中一处找到；
+            # 与此同时查缓存未命中、加锁时又已移出的请求会重复请求一次，结果相同
+            with self._cond:
+                self.calls += 1
+                self.embedded += len(batch)
+                for (key, _, future, _), vector in zip(batch, vectors):
+                    self._inflight.pop(key, None)
+                    future.set_result(vector)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        """处理完排队中的请求后关闭"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+            self._pool.shutdown(wait=True)
+        self.cache.close()
+
+    def __enter__(self) -> "EmbeddingService":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+_services: Dict[str, EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(model: str = ALI_TONGYI_EMBEDDING_MODEL, cache_path: Union[str, Path, None] = None,
+                          **kwargs: Any) -> EmbeddingService:
+    """
+    按模型名获取向量化服务，同一个模型在进程内共享一个服务，各处的请求才能合并到一起
+    :param model: 向量模型名，地址和密钥取自 common_ai.settings 中该模型的配置
+    :param cache_path: 首次创建时的缓存文件路径，为空时缓存只在内存中
+    :param kwargs: 首次创建时传给 EmbeddingService 的参数
+    """
+    with _services_lock:
+        service = _services.get(model)
+        if service is None:
+            from common_ai.retrieval import dashscope_embeddings
+
+            inner = dashscope_embeddings(model)
+            cache = EmbeddingCache(cache_path or ":memory:", namespace=EmbeddingService._namespace(inner))
+            service = _services[model] = EmbeddingService(inner, cache, **kwargs)
+        return service
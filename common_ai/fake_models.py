@@ -0,0 +1,198 @@
+#本地假模型，用于离线演示、压测和基准测试
+#不访问网络，延迟和回复内容都可以配置
+import asyncio
+import random
+import time
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+def heavy_tail_latency(base: float = 0.02, tail_prob: float = 0.02, tail_scale: float = 10.0,
+                       rng: Optional[random.Random] = None) -> Callable[[], float]:
+    """
+    构造一个重尾延迟分布：大部分请求在 base 附近，少量请求落入慢副本
+    :param base: 正常请求的中位延迟(秒)
+    :param tail_prob: 命中慢副本的概率
+    :param tail_scale: 慢副本延迟相对 base 的放大倍数（再叠加帕累托抖动）
+    :param rng: 随机数生成器，传入固定种子可以复现
+    :return: 每次调用返回一个延迟样本(秒)
+    """
+    rng = rng or random.Random()
+
+    def sample() -> float:
+        latency = rng.lognormvariate(0, 0.25) * base
+        if rng.random() < tail_prob:
+            latency += base * tail_scale * rng.paretovariate(2.0)
+        return latency
+
+    return sample
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    可配置延迟的假聊天模型
+
+    参数说明:
+        responder: 根据消息列表生成回复的函数，默认回显最后一条消息；
+                   返回 AIMessage 时原样使用（可以带 tool_calls，用于智能体）
+        latency: 返回延迟(秒)的函数，默认无延迟，模拟首 token 前的等待
+        tokens_per_second: 生成速度，按回复的字符数近似 token 数计算生成耗时，默认不计
+        stream_chunk_chars: 流式输出时每个 chunk 的字符数，1 表示逐字输出；默认不切分，整条回复作为一个 chunk
+    """
+
+    responder: Optional[Callable[[List[BaseMessage]], Union[str, AIMessage]]] = None
+    latency: Optional[Callable[[], float]] = None
+    tokens_per_second: Optional[float] = None
+    stream_chunk_chars: Optional[int] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _reply(self, messages: List[BaseMessage]) -> AIMessage:
+        if self.responder is not None:
+            reply = self.responder(messages)
+        else:
+            reply = str(messages[-1].content) if messages else ""
+        return reply if isinstance(reply, AIMessage) else AIMessage(content=reply)
+
+    def _pieces(self, message: AIMessage) -> List[str]:
+        """流式输出时切分的 chunk；带工具调用或未开启流式切分时整条消息作为一个 chunk"""
+        content = str(message.content)
+        if not self.stream_chunk_chars or message.tool_calls or not content:
+            return []
+        size = self.stream_chunk_chars
+        return [content[i:i + size] for i in range(0, len(content), size)]
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.latency is not None:
+            time.sleep(self.latency())
+        message = self._reply(messages)
+        if self.tokens_per_second:
+            time.sleep(len(str(message.content)) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        if self.latency is not None:
+            time.sleep(self.latency())
+        message = self._reply(messages)
+        pieces = self._pieces(message)
+        if not pieces:
+            if self.tokens_per_second:
+                time.sleep(len(str(message.content)) / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=message.content, tool_calls=message.tool_calls))
+            return
+        for piece in pieces:
+            if self.tokens_per_second:
+                time.sleep(len(piece) / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        if self.latency is not None:
+            await asyncio.sleep(self.latency())
+        message = self._reply(messages)
+        pieces = self._pieces(message)
+        if not pieces:
+            if self.tokens_per_second:
+                await asyncio.sleep(len(str(message.content)) / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=message.content, tool_calls=message.tool_calls))
+            return
+        for piece in pieces:
+            if self.tokens_per_second:
+                await asyncio.sleep(len(piece) / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        """智能体会绑定工具；是否调用工具由 responder 决定，这里直接返回自身"""
+        return self
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    确定性的本地向量模型，作为 text-embedding-v3 的替身用于检索的离线演示和基准测试
+
+    文本的字符二元组按 crc32 哈希映射到 dimensions 维（feature hashing）后归一化：
+    相同文本得到相同向量，共享二元组越多的文本向量越接近，所以检索结果是有意义的
+
+    参数说明:
+        dimensions: 向量维度
+        latency: 每次调用前等待的秒数的函数，模拟远程接口的往返延迟
+    """
+
+    def __init__(self, dimensions: int = 256, latency: Optional[Callable[[], float]] = None):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.calls = 0
+        self.texts = 0
+        self._slots: Dict[str, Tuple[int, float]] = {}  # 二元组 -> (维度, 符号)，中文常用二元组有限，缓存后省去重复哈希
+
+    def _slot(self, gram: str) -> Tuple[int, float]:
+        h = zlib.crc32(gram.encode("utf-8"))
+        return h % self.dimensions, 1.0 if h >> 31 else -1.0
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        # 整批一起计算：所有二元组展开成 (行, 维度, 符号) 后用一次 bincount 累加
+        import numpy as np
+
+        slots = self._slots
+        cells, signs = [], []
+        for row, text in enumerate(texts):
+            offset = row * self.dimensions
+            for i in range(len(text) - 1 if len(text) > 1 else len(text)):
+                gram = text[i:i + 2]
+                slot = slots.get(gram)
+                if slot is None:
+                    slot = slots[gram] = self._slot(gram)
+                cells.append(offset + slot[0])
+                signs.append(slot[1])
+        matrix = np.bincount(cells, weights=signs, minlength=len(texts) * self.dimensions)
+        matrix = matrix.reshape(len(texts), self.dimensions)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return (matrix / np.where(norms == 0, 1, norms)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency is not None:
+            time.sleep(self.latency())
+        return self._embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency is not None:
+            await asyncio.sleep(self.latency())
+        return self._embed(texts)
@@ -0,0 +1,379 @@
+#本地 OpenAI 兼容假模型服务，用于离线压测
+#实现 /chat/completions（流式、非流式、工具调用）、/embeddings、/rerank 三类接口，
+#支持可配置的延迟分布、生成速度、错误和 429 注入、请求记录
+#路径同时挂在 /v1 和 /compatible-mode/v1 下，ChatOpenAI、OpenAI 客户端把 base_url 指向 server.base_url 即可
+#
+#用法:
+#    with FakeLLMServer(latency=heavy_tail_latency(0.05)) as server:
+#        model = ChatOpenAI(model="qwen-max", api_key="fake-key", base_url=server.base_url)
+#
+#    # pytest fixture
+#    @pytest.fixture
+#    def llm_server():
+#        with FakeLLMServer() as server:
+#            yield server
+#
+#    # 命令行启动
+#    python -m common_ai.fake_server --port 8000 --latency 0.05 --rate-limit-rate 0.01
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Union
+
+import numpy as np
+from aiohttp import web
+
+# responder 的返回值：回复文本，或 {"content": ..., "tool_calls": [{"name": ..., "arguments": {...}}]}
+Reply = Union[str, Dict[str, Any]]
+
+PREFIXES = ("/v1", "/compatible-mode/v1")
+
+
+@dataclass
+class RecordedRequest:
+    path: str
+    body: Dict[str, Any]
+    status: int
+    started: float
+    duration: float = 0.0
+    stream: bool = False
+
+
+def default_responder(body: Dict[str, Any]) -> Reply:
+    """
+    规则回复：
+    - 请求带 tools、且最后一条消息不是工具结果时，调用第一个工具
+    - 否则回显最后一条用户消息
+    """
+    messages = body.get("messages") or []
+    last = messages[-1] if messages else {}
+    tools = body.get("tools") or []
+    if tools and last.get("role") != "tool":
+        return {"content": "", "tool_calls": [{"name": tools[0]["function"]["name"], "arguments": {}}]}
+    if last.get("role") == "tool":
+        return f"根据工具结果：{last.get('content', '')}"
+    content = last.get("content", "")
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return f"收到：{content}"
+
+
+class ScriptedResponder:
+    """按顺序返回预先写好的回复，用完后循环"""
+
+    def __init__(self, replies: List[Reply]):
+        self.replies = list(replies)
+        self._index = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, body: Dict[str, Any]) -> Reply:
+        with self._lock:
+            reply = self.replies[self._index % len(self.replies)]
+            self._index += 1
+        return reply
+
+
+def fake_embedding(text: str, dimensions: int = 256) -> List[float]:
+    """由文本哈希生成的确定性单位向量，相同文本得到相同向量"""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    return vector.tolist()
+
+
+def fake_relevance(query: str, document: str) -> float:
+    """字符二元组的 Jaccard 相似度，作为确定性的相关性分数"""
+    grams = lambda text: {text[i:i + 2] for i in range(max(1, len(text) - 1))}
+    a, b = grams(query), grams(document)
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+class FakeLLMServer:
+    """
+    OpenAI 兼容的假模型服务
+
+    参数说明:
+        responder: 根据请求体生成回复，默认 default_responder
+        latency: 返回首 token 前延迟(秒)的函数，默认无延迟，可以用 fake_models.heavy_tail_latency
+        tokens_per_second: 生成速度，按字符数近似 token 数；流式时逐 token 推送
+        error_rate: 返回 500 的概率
+        rate_limit_rate: 返回 429 的概率（带 Retry-After 头）
+        record_limit: 最多保留多少条请求记录
+        seed: 错误注入使用的随机种子
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, responder: Optional[Callable[[Dict], Reply]] = None,
+                 latency: Optional[Callable[[], float]] = None, tokens_per_second: Optional[float] = None,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, record_limit: int = 100000,
+                 seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.responder = responder or default_responder
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests: Deque[RecordedRequest] = deque(maxlen=record_limit)
+        self._rng = random.Random(seed)
+        self._forced_errors: Deque[int] = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        for prefix in PREFIXES:
+            app.router.add_post(f"{prefix}/chat/completions", self._chat)
+            app.router.add_post(f"{prefix}/embeddings", self._embeddings)
+            app.router.add_post(f"{prefix}/rerank", self._rerank)
+        # DashScope 原生的文本排序接口
+        app.router.add_post("/api/v1/services/rerank/text-rerank/text-rerank", self._rerank)
+        return app
+
+    async def start_async(self) -> None:
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port, backlog=4096)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop_async(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start(self) -> "FakeLLMServer":
+        """在后台线程的事件循环中启动服务，返回时已经可以接受请求"""
+
+        error: List[BaseException] = []
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._loop.run_until_complete(self.start_async())
+            except BaseException as e:
+                # 例如端口被占用：记下异常交给 start() 抛出，释放已经创建的资源
+                error.append(e)
+                self._loop.run_until_complete(self.stop_async())
+                self._loop.close()
+                return
+            finally:
+                # 无论成功与否都要通知 start()，否则启动失败时 start() 会一直等待
+                self._ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop_async())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, name="fake-llm-server", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if error:
+            self._thread.join()
+            self._loop = self._thread = None
+            self._ready.clear()
+            raise error[0]
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = self._thread = None
+            self._ready.clear()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # 故障注入与记录
+    # ------------------------------------------------------------------
+
+    def fail_next(self, count: int = 1, status: int = 500) -> None:
+        """接下来的 count 个请求返回指定状态码"""
+        self._forced_errors.extend([status] * count)
+
+    def stats(self) -> Dict[str, Any]:
+        records = list(self.requests)
+        by_status: Dict[int, int] = {}
+        for record in records:
+            by_status[record.status] = by_status.get(record.status, 0) + 1
+        return {"requests": len(records), "by_status": by_status}
+
+    def _injected_error(self, record: RecordedRequest) -> Optional[web.Response]:
+        status = self._forced_errors.popleft() if self._forced_errors else None
+        if status is None:
+            roll = self._rng.random()
+            if roll < self.rate_limit_rate:
+                status = 429
+            elif roll < self.rate_limit_rate + self.error_rate:
+                status = 500
+        if status is None:
+            return None
+        record.status = status
+        record.duration = time.time() - record.started
+        headers = {"Retry-After": "1"} if status == 429 else None
+        message = "Rate limit exceeded" if status == 429 else "Injected upstream error"
+        return web.json_response({"error": {"message": message, "type": "fake_error", "code": status}},
+                                 status=status, headers=headers)
+
+    async def _begin(self, request: web.Request):
+        body = await request.json()
+        record = RecordedRequest(path=request.path, body=body, status=200, started=time.time(),
+                                 stream=bool(body.get("stream")))
+        self.requests.append(record)
+        return body, record
+
+    async def _wait_first_token(self) -> None:
+        if self.latency is not None:
+            await asyncio.sleep(self.latency())
+
+    # ------------------------------------------------------------------
+    # 接口
+    # ------------------------------------------------------------------
+
+    async def _chat(self, request: web.Request) -> web.StreamResponse:
+        body, record = await self._begin(request)
+        await self._wait_first_token()
+        error = self._injected_error(record)
+        if error is not None:
+            return error
+
+        reply = self.responder(body)
+        if isinstance(reply, str):
+            reply = {"content": reply}
+        content = reply.get("content") or ""
+        tool_calls = [
+            {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+             "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments", {}), ensure_ascii=False)}}
+            for call in reply.get("tool_calls", [])
+        ]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model") or "fake-model"
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        usage = {"prompt_tokens": sum(len(str(m.get("content", ""))) for m in body.get("messages") or []),
+                 "completion_tokens": len(content)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if body.get("stream"):
+            response = await self._stream_chat(request, completion_id, model, content, tool_calls, finish_reason,
+                                               usage if (body.get("stream_options") or {}).get("include_usage") else None)
+        else:
+            if self.tokens_per_second and content:
+                await asyncio.sleep(len(content) / self.tokens_per_second)
+            message: Dict[str, Any] = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            response = web.json_response({
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+        record.duration = time.time() - record.started
+        return response
+
+    async def _stream_chat(self, request, completion_id, model, content, tool_calls, finish_reason, usage):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(delta: Dict[str, Any], reason: Optional[str] = None, chunk_usage=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": reason}]}
+            if chunk_usage is not None:
+                chunk["choices"] = []
+                chunk["usage"] = chunk_usage
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        await send({"role": "assistant", "content": ""})
+        interval = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        for token in content:
+            if interval:
+                await asyncio.sleep(interval)
+            await send({"content": token})
+        for index, call in enumerate(tool_calls):
+            await send({"tool_calls": [{"index": index, **call}]})
+        await send({}, finish_reason)
+        if usage is not None:
+            await send({}, chunk_usage=usage)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def _embeddings(self, request: web.Request) -> web.Response:
+        body, record = await self._begin(request)
+        await self._wait_first_token()
+        error = self._injected_error(record)
+        if error is not None:
+            return error
+        inputs = body.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dimensions = int(body.get("dimensions") or 256)
+        data = [{"object": "embedding", "index": i, "embedding": fake_embedding(str(text), dimensions)}
+                for i, text in enumerate(inputs)]
+        tokens = sum(len(str(text)) for text in inputs)
+        record.duration = time.time() - record.started
+        return web.json_response({"object": "list", "data": data, "model": body.get("model") or "fake-embedding",
+                                  "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    async def _rerank(self, request: web.Request) -> web.Response:
+        body, record = await self._begin(request)
+        await self._wait_first_token()
+        error = self._injected_error(record)
+        if error is not None:
+            return error
+        # 兼容两种请求格式：{"query", "documents", "top_n"} 和 DashScope 的 {"input": {...}, "parameters": {...}}
+        payload = body.get("input", body)
+        parameters = body.get("parameters", body)
+        query, documents = payload.get("query", ""), payload.get("documents", [])
+        top_n = parameters.get("top_n") or len(documents)
+        scored = sorted(((fake_relevance(query, doc if isinstance(doc, str) else doc.get("text", "")), i)
+                         for i, doc in enumerate(documents)), reverse=True)[:top_n]
+        results = [{"index": i, "relevance_score": score} for score, i in scored]
+        record.duration = time.time() - record.started
+        if "input" in body:
+            return web.json_response({"output": {"results": results}, "request_id": uuid.uuid4().hex})
+        return web.json_response({"results": results, "model": body.get("model") or "fake-rerank"})
+
+
+def main():
+    from common_ai.fake_models import heavy_tail_latency
+
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地假模型服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="中位延迟(秒)，按重尾分布抖动")
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.host, args.port,
+                           latency=heavy_tail_latency(args.latency) if args.latency > 0 else None,
+                           tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+                           rate_limit_rate=args.rate_limit_rate)
+    print(f"假模型服务已启动: {server.base_url}")
+    web.run_app(server.build_app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#快速模式：没有任何回调、追踪在监听时，跳过 run 管理器、config 合并和 run_id 生成，直接执行每个节点的核心逻辑
+#适用于 prompt | model | out 这类顺序链；检测到回调（config 中传入、从外层链继承、LangSmith 追踪、debug/verbose、
+#collect_runs 等上下文钩子）时退回原来的 invoke，行为与原链完全一致
+from typing import Any, Callable, List, Optional
+
+from langchain_core.globals import get_debug, get_llm_cache, get_verbose
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import BaseOutputParser
+from langchain_core.outputs import ChatGeneration, Generation
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda, RunnablePassthrough, RunnableSequence
+from langchain_core.runnables.config import ensure_config
+from langchain_core.runnables.utils import accepts_config, accepts_run_manager
+from langchain_core.tracers.context import _configure_hooks, _tracing_v2_is_enabled
+from langchain_core.utils.env import env_var_is_set
+
+
+def callbacks_active(config: Optional[RunnableConfig] = None) -> bool:
+    """
+    是否有回调或追踪在监听，与 CallbackManager.configure 的判断条件相同，但不创建任何对象
+    config 需要先经过 ensure_config 合并外层链通过上下文变量传下来的 config，否则嵌套在带回调的链中时会漏掉回调
+    """
+    if config and config.get("callbacks"):
+        return True
+    if get_debug() or get_verbose() or _tracing_v2_is_enabled():
+        return True
+    if env_var_is_set("LANGCHAIN_TRACING") or env_var_is_set("LANGCHAIN_HANDLER"):
+        return True
+    for var, _, handler_class, env_var in _configure_hooks:
+        if var.get() is not None:
+            return True
+        if handler_class is not None and env_var is not None and env_var_is_set(env_var):
+            return True
+    return False
+
+
+def _prompt_step(prompt: BasePromptTemplate) -> Callable[[Any], Any]:
+    def run(x):
+        if isinstance(x, dict):
+            return prompt.format_prompt(**x)
+        return prompt.invoke(x)
+
+    return run
+
+
+def _chat_model_step(model: BaseChatModel) -> Optional[Callable[[Any], Any]]:
+    # 模型自带回调、缓存、限流时，这些逻辑都在 invoke 中，不能跳过
+    if model.callbacks or model.verbose or model.cache or model.rate_limiter is not None:
+        return None
+
+    def run(x):
+        if model.cache is None and get_llm_cache() is not None:
+            # 运行时才设置的全局缓存
+            return model.invoke(x)
+        messages = model._convert_input(x).to_messages()
+        result = model._generate(messages)
+        return result.generations[0].message
+
+    return run
+
+
+def _parser_step(parser: BaseOutputParser) -> Callable[[Any], Any]:
+    def run(x):
+        if isinstance(x, BaseMessage):
+            return parser.parse_result([ChatGeneration(message=x)])
+        return parser.parse_result([Generation(text=x)])
+
+    return run
+
+
+def _lambda_step(step: RunnableLambda) -> Optional[Callable[[Any], Any]]:
+    func = getattr(step, "func", None)
+    if func is None or accepts_config(func) or accepts_run_manager(func):
+        return None
+
+    def run(x):
+        output = func(x)
+        return output.invoke(x) if isinstance(output, Runnable) else output
+
+    return run
+
+
+def compile_step(step: Runnable) -> Callable[[Any], Any]:
+    """把一个节点编译成只包含核心逻辑的函数，无法编译的节点退回调用其 invoke"""
+    run = None
+    if type(step) is RunnablePassthrough and step.func is None and step.afunc is None:
+        return lambda x: x
+    if isinstance(step, BasePromptTemplate):
+        run = _prompt_step(step)
+    elif isinstance(step, BaseChatModel):
+        run = _chat_model_step(step)
+    elif isinstance(step, BaseOutputParser):
+        run = _parser_step(step)
+    elif type(step) is RunnableLambda:
+        run = _lambda_step(step)
+    return run or step.invoke
+
+
+class FastChain(Runnable):
+    """
+    顺序链的快速模式
+
+    用法:
+        chain = FastChain(prompt | model | out)
+        chain.invoke({"topic": "人工智能"})    # 没有回调时走快速路径
+        chain.invoke({"topic": "人工智能"}, config={"callbacks": [handler]})    # 有回调时与原链相同
+
+    注意: 快速路径不产生 run，不触发 on_chain_start 等任何回调
+    """
+
+    def __init__(self, bound: Runnable, name: Optional[str] = None):
+        self.bound = bound
+        self.name = name or bound.get_name()
+        steps = bound.steps if isinstance(bound, RunnableSequence) else [bound]
+        self.fast_steps: List[Callable[[Any], Any]] = [compile_step(step) for step in steps]
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        # 在外层链中运行时，外层的回调保存在上下文变量中而不是 config 参数里，ensure_config 会把它合并进来
+        config = ensure_config(config)
+        # configurable 需要由 RunnableConfigurableFields 等节点在 invoke 中解析，也退回原链
+        if kwargs or callbacks_active(config) or config.get("configurable"):
+            return self.bound.invoke(input, config, **kwargs)
+        for step in self.fast_steps:
+            input = step(input)
+        return input
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        # 快速路径中的模型调用是同步的，异步场景仍使用原链
+        return await self.bound.ainvoke(input, config, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        return self.bound.stream(input, config, **kwargs)
@@ -0,0 +1,164 @@
+#对冲请求(Hedged Request)：降低模型调用的尾延迟
+#主请求超过观测到的 p95 延迟仍未返回时，再发一个相同的请求，谁先成功用谁
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+# 所有对冲包装器共享的线程池，避免每个请求都创建线程
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="hedge")
+
+
+class LatencyTracker:
+    """
+    在线延迟分位数统计
+    保存最近 window 个成功请求的耗时，按需计算分位数（每 refresh_every 个样本重新排序一次）
+    """
+
+    def __init__(self, window: int = 1000, quantile: float = 0.95, initial: float = 1.0,
+                 min_samples: int = 20, refresh_every: int = 20):
+        """
+        :param window: 滑动窗口大小
+        :param quantile: 目标分位数，默认 p95
+        :param initial: 样本不足时使用的初始阈值(秒)
+        :param min_samples: 开始使用统计值前至少需要的样本数
+        :param refresh_every: 每新增多少个样本重新计算一次分位数
+        """
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.refresh_every = refresh_every
+        self._samples = deque(maxlen=window)
+        self._value = initial
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+            self._pending += 1
+            if self._pending >= self.refresh_every and len(self._samples) >= self.min_samples:
+                ordered = sorted(self._samples)
+                self._value = ordered[min(len(ordered) - 1, int(len(ordered) * self.quantile))]
+                self._pending = 0
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class HedgedRunnable(Runnable):
+    """
+    对冲请求包装器，可以包装任意 Runnable（通常是聊天模型）
+
+    执行流程:
+        1. 先发主请求
+        2. 等待 p95 延迟，主请求仍未返回且对冲预算允许时发出副本请求
+        3. 取第一个成功的结果，取消另一个（线程中已开始的同步调用只能放弃结果，异步调用会被真正取消）
+
+    对冲预算:
+        发出的对冲请求数不超过 总请求数 * max_hedge_ratio + burst，防止上游变慢时流量翻倍
+    """
+
+    def __init__(self, bound: Runnable, max_hedge_ratio: float = 0.05, burst: int = 5,
+                 tracker: Optional[LatencyTracker] = None):
+        """
+        :param bound: 被包装的模型或链
+        :param max_hedge_ratio: 对冲请求占总请求的最大比例
+        :param burst: 允许的突发对冲数量
+        :param tracker: 延迟统计器，默认按 p95 统计
+        """
+        self.bound = bound
+        self.max_hedge_ratio = max_hedge_ratio
+        self.burst = burst
+        self.tracker = tracker or LatencyTracker()
+        self.total_requests = 0
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def _start_request(self) -> None:
+        with self._lock:
+            self.total_requests += 1
+
+    def _try_acquire_hedge(self) -> bool:
+        with self._lock:
+            if self.hedged_requests < self.total_requests * self.max_hedge_ratio + self.burst:
+                self.hedged_requests += 1
+                return True
+            return False
+
+    def _timed_call(self, input: Any, config: Optional[RunnableConfig], **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        result = self.bound.invoke(input, config, **kwargs)
+        self.tracker.record(time.perf_counter() - start)
+        return result
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        self._start_request()
+        primary = _executor.submit(self._timed_call, input, config, **kwargs)
+        done, _ = wait([primary], timeout=self.tracker.value)
+        if done or not self._try_acquire_hedge():
+            return primary.result()
+
+        hedge = _executor.submit(self._timed_call, input, config, **kwargs)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _atimed_call(self, input: Any, config: Optional[RunnableConfig], **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        result = await self.bound.ainvoke(input, config, **kwargs)
+        self.tracker.record(time.perf_counter() - start)
+        return result
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        self._start_request()
+        primary = asyncio.ensure_future(self._atimed_call(input, config, **kwargs))
+        done, _ = await asyncio.wait([primary], timeout=self.tracker.value)
+        if done or not self._try_acquire_hedge():
+            return await primary
+
+        hedge = asyncio.ensure_future(self._atimed_call(input, config, **kwargs))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        """返回对冲统计：总请求数、对冲数、对冲比例、对冲胜出数和当前阈值"""
+        with self._lock:
+            ratio = self.hedged_requests / self.total_requests if self.total_requests else 0.0
+            return {
+                "total_requests": self.total_requests,
+                "hedged_requests": self.hedged_requests,
+                "hedge_ratio": ratio,
+                "hedge_wins": self.hedge_wins,
+                "hedge_delay": self.tracker.value,
+            }
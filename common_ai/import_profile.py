@@ -0,0 +1,124 @@
+#启动耗时分析：基于 python -X importtime，统计导入一个模块或示例脚本时各个依赖的导入耗时
+#在子进程中执行，结果不受当前进程已导入模块的影响
+#
+#用法:
+#    python -m common_ai.import_profile phase1_basic/05_project_demo/01_project_demo1.py
+#    python -m common_ai.import_profile common_ai.model_router --top 20
+#    python -m common_ai.import_profile phase1_basic/05_project_demo/01_project_demo1.py --why langsmith.run_trees
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from common_ai.script_loader import REPO_ROOT
+
+
+@dataclass
+class ImportRecord:
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int  # 0 表示由目标代码直接导入
+
+
+def _target_code(target: str) -> str:
+    """目标是 .py 路径时用 load_script 加载（示例脚本文件名以数字开头，不能直接 import），否则按模块名导入"""
+    if target.endswith(".py"):
+        return f"from common_ai.script_loader import load_script; load_script({target!r})"
+    return f"import {target}"
+
+
+def _run(target: str, extra: str = "", importtime: bool = False) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", _target_code(target) + extra]
+    return subprocess.run(command, cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def parse_importtime(output: str) -> List[ImportRecord]:
+    records = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2 - 1
+        records.append(ImportRecord(name.strip(), int(self_us), int(cumulative_us), depth))
+    return records
+
+
+def profile_imports(target: str, runs: int = 3) -> List[ImportRecord]:
+    """运行 runs 次取总耗时最短的一次，减少磁盘缓存和调度带来的波动"""
+    best: Optional[List[ImportRecord]] = None
+    for _ in range(runs):
+        records = parse_importtime(_run(target, importtime=True).stderr)
+        if best is None or total_us(records) < total_us(best):
+            best = records
+    return best or []
+
+
+def total_us(records: List[ImportRecord]) -> int:
+    return sum(record.cumulative_us for record in records if record.depth == 0)
+
+
+def by_package(records: List[ImportRecord]) -> Dict[str, int]:
+    """按顶层包汇总自身耗时(微秒)"""
+    totals: Dict[str, int] = defaultdict(int)
+    for record in records:
+        totals[record.name.split(".")[0]] += record.self_us
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+def import_chain(records: List[ImportRecord], module: str) -> List[ImportRecord]:
+    """module 是被谁导入的：importtime 先输出子模块再输出父模块，向后查找深度更小的记录即为导入链"""
+    for index, record in enumerate(records):
+        if record.name == module:
+            chain = [record]
+            for parent in records[index + 1:]:
+                if parent.depth < chain[-1].depth:
+                    chain.append(parent)
+            return chain
+    return []
+
+
+def loaded_modules(target: str) -> List[str]:
+    """导入目标后子进程中 sys.modules 的全部模块名"""
+    result = _run(target, extra="; import json, sys; print('\\n' + json.dumps(sorted(sys.modules)))")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def report(target: str, top: int = 15, runs: int = 3, why: Optional[str] = None) -> None:
+    records = profile_imports(target, runs)
+    total = total_us(records)
+    print(f"{target}: 导入耗时 {total / 1000:.0f}ms，{len(records)} 个模块")
+    print(f"\n按顶层包汇总（自身耗时）:")
+    for package, self_us in list(by_package(records).items())[:top]:
+        print(f"  {package:<32} {self_us / 1000:7.1f}ms  {self_us / total:6.1%}")
+    print(f"\n直接导入的模块（含依赖的累计耗时）:")
+    for record in sorted((r for r in records if r.depth <= 1), key=lambda r: -r.cumulative_us)[:top]:
+        print(f"  {'  ' * record.depth}{record.name:<{60 - 2 * record.depth}} {record.cumulative_us / 1000:7.1f}ms")
+    if why:
+        chain = import_chain(records, why)
+        print(f"\n{why} 的导入链:" if chain else f"\n没有导入 {why}")
+        for record in reversed(chain):
+            print(f"  {'  ' * record.depth}{record.name}  {record.cumulative_us / 1000:.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="统计导入模块或示例脚本时各依赖的耗时")
+    parser.add_argument("target", help="模块名（如 common_ai.model_router）或仓库中的 .py 路径")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3, help="运行次数，取最快的一次")
+    parser.add_argument("--why", help="输出指定模块的导入链")
+    args = parser.parse_args()
+    report(args.target, args.top, args.runs, args.why)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+#增量写入：切分文档，按片段内容的 xxhash 去重，只向量化新增的片段，删除已移除片段的向量
+#文件按生成器逐个读取、切分、向量化，内存占用与语料大小无关
+#
+#用法:
+#    store = VectorStore("kb_index", dim=1024)
+#    retriever = Retriever(embeddings=dashscope_embeddings(), store=store)
+#    ingestor = DocumentIngestor(retriever, "docs/")
+#    stats = ingestor.ingest()          # 第一次全量写入，之后只处理新增、修改、删除的文件
+import json
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from common_ai.retrieval import Retriever, text_id
+
+# 中文优先按段落、换行、句末标点切分
+CHINESE_SEPARATORS = ["\n\n", "\n", "。", "！", "？", "；", "，", " ", ""]
+MANIFEST_NAME = "ingest_manifest.json"
+
+
+@dataclass
+class IngestStats:
+    files: int = 0  # 扫描到的文件
+    unchanged: int = 0  # 大小和修改时间都没变、没有读取的文件
+    changed: int = 0  # 新增或修改的文件
+    removed: int = 0  # 已删除的文件
+    chunks: int = 0  # 新增或修改的文件切出的片段
+    embedded: int = 0  # 向量化并写入的片段
+    reused: int = 0  # 已有向量、跳过向量化的片段
+    deleted: int = 0  # 删除的向量
+    seconds: float = 0.0
+
+
+def read_blocks(path: Union[str, Path], block_chars: int = 1 << 20, encoding: str = "utf-8") -> Iterator[str]:
+    """
+    按段落边界分块读取文本文件：累计到 block_chars 个字符后在下一个空行处断开，大文件不需要整个读入内存
+    断点只取决于断点之前的内容，文件后部的修改不会改变前面的分块
+    """
+    block: List[str] = []
+    size = 0
+    with open(path, encoding=encoding, errors="replace") as f:
+        for line in f:
+            if size >= block_chars and not line.strip():
+                yield "".join(block)
+                block, size = [], 0
+            block.append(line)
+            size += len(line)
+    if block:
+        yield "".join(block)
+
+
+def default_splitter(chunk_size: int = 500, chunk_overlap: int = 50):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                          separators=CHINESE_SEPARATORS, keep_separator="end")
+
+
+class DocumentIngestor:
+    """
+    把目录下的文本文件增量写入 Retriever 的向量存储
+
+    - 片段 id 是片段内容的 xxhash：内容相同的片段只向量化一次，包括不同文件中重复的片段
+    - 清单（manifest）记录每个文件的大小、修改时间和片段 id；两者都没变的文件不读取。
+      默认保存在向量存储目录下的 ingest_manifest.json，存储在内存中时清单也只在内存中
+    - 修改或删除文件后，不再被任何文件引用的片段在本次写入结束时从向量存储中删除；
+      同一次写入中从一个文件移到另一个文件的片段不会被删除后重新向量化
+    - 向量化失败时清单不更新，已经写入的片段下次直接复用
+    - 共享的片段元数据中的 source 是第一次写入它的文件
+
+    参数说明:
+        retriever: 提供向量模型、向量存储、批大小和并发数
+        root: 语料目录，清单中的文件名是相对 root 的路径
+        patterns: 匹配文件的 glob 模式
+        splitter: langchain-text-splitters 的切分器，默认按中文标点递归切分，500 字一段、重叠 50 字
+        block_chars: 大文件按段落分块读取、逐块切分时每块的最少字符数
+    """
+
+    def __init__(self, retriever: Retriever, root: Union[str, Path],
+                 patterns: Sequence[str] = ("**/*.txt", "**/*.md"), splitter: Any = None,
+                 manifest_path: Union[str, Path, None] = None, encoding: str = "utf-8", block_chars: int = 1 << 20):
+        self.retriever = retriever
+        self.root = Path(root)
+        self.patterns = patterns
+        self.splitter = splitter or default_splitter()
+        self.encoding = encoding
+        self.block_chars = block_chars
+        store_path = retriever.store.path
+        self.manifest_path = Path(manifest_path) if manifest_path else \
+            (store_path / MANIFEST_NAME if store_path is not None else None)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.refs: Counter = Counter()  # 片段 id -> 引用它的次数
+        self._load_manifest()
+
+    # ------------------------------------------------------------------
+    # 清单
+    # ------------------------------------------------------------------
+
+    @property
+    def _splitter_key(self) -> str:
+        splitter = self.splitter
+        return f"{type(splitter).__name__}:{getattr(splitter, '_chunk_size', '')}:{getattr(splitter, '_chunk_overlap', '')}"
+
+    def _load_manifest(self) -> None:
+        if self.manifest_path is None or not self.manifest_path.exists():
+            return
+        manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        self.files = manifest["files"]
+        if manifest.get("splitter") != self._splitter_key:
+            # 切分参数变了：所有文件都要重新切分，边界没变的片段仍然复用已有向量
+            for entry in self.files.values():
+                entry["size"] = entry["mtime_ns"] = None
+        for entry in self.files.values():
+            self.refs.update(entry["chunks"])
+
+    def save_manifest(self) -> None:
+        if self.manifest_path is None:
+            return
+        tmp = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        tmp.write_text(json.dumps({"splitter": self._splitter_key, "files": self.files}, ensure_ascii=False),
+                       encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    def _replace(self, name: str, entry: Optional[Dict[str, Any]], orphans: Set[str]) -> None:
+        """更新一个文件的清单项（entry 为空表示删除文件），引用数降到 0 的片段记入 orphans"""
+        old = self.files.pop(name, None)
+        if entry is not None:
+            # 先加新引用再减旧引用，文件内没变的片段引用数不会降到 0
+            self.refs.update(entry["chunks"])
+            self.files[name] = entry
+        for id in (old or {}).get("chunks", ()):
+            self.refs[id] -= 1
+            if self.refs[id] <= 0:
+                del self.refs[id]
+                orphans.add(id)
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def _walk(self) -> List[Path]:
+        paths = {path for pattern in self.patterns for path in self.root.glob(pattern) if path.is_file()}
+        return sorted(paths)
+
+    def split(self, path: Union[str, Path]) -> Iterator[str]:
+        """逐块读取并切分一个文件"""
+        for block in read_blocks(path, self.block_chars, self.encoding):
+            yield from self.splitter.split_text(block)
+
+    def ingest(self, delete_missing: bool = True, rescan: bool = False) -> IngestStats:
+        """
+        扫描 root，写入新增和修改的文件
+        :param delete_missing: 删除已经不存在的文件的片段
+        :param rescan: 忽略大小和修改时间，重新读取切分所有文件（仍然只向量化新的片段），
+                       用于修改后大小和修改时间都没变的文件
+        """
+        stats = IngestStats()
+        start = time.perf_counter()
+        store = self.retriever.store
+        seen: Set[str] = set()
+        queued: Set[str] = set()
+        updates: List[Tuple[str, Dict[str, Any]]] = []
+
+        def records() -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+            for path in self._walk():
+                name = path.relative_to(self.root).as_posix()
+                seen.add(name)
+                stats.files += 1
+                stat = path.stat()
+                old = self.files.get(name)
+                if not rescan and old and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+                    stats.unchanged += 1
+                    continue
+                stats.changed += 1
+                chunks = []
+                for chunk in self.split(path):
+                    id = text_id(chunk)
+                    chunks.append(id)
+                    if id in store or id in queued:
+                        stats.reused += 1
+                        continue
+                    queued.add(id)
+                    yield id, chunk, {"source": name}
+                stats.chunks += len(chunks)
+                updates.append((name, {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "chunks": chunks}))
+
+        stats.embedded = self.retriever.add_records(records())
+
+        # 全部片段写入成功后才更新清单；删除推迟到最后，移到其他文件中的片段不会被误删
+        orphans: Set[str] = set()
+        for name, entry in updates:
+            self._replace(name, entry, orphans)
+        if delete_missing:
+            for name in [name for name in self.files if name not in seen]:
+                self._replace(name, None, orphans)
+                stats.removed += 1
+        stats.deleted = store.delete(id for id in orphans if id not in self.refs)
+        store.flush()
+        self.save_manifest()
+        stats.seconds = time.perf_counter() - start
+        return stats
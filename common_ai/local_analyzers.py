@@ -0,0 +1,100 @@
+#基于规则的本地分析器，输出格式与客户反馈处理系统中大模型分析器一致
+#用于模型服务不可用时的降级，也可以作为大模型调用前的快速预判
+import re
+
+ORDER_ID_PATTERN = re.compile(r'ORD\d{10}')
+
+# 情感关键词表
+# 积极词只用完整短语："快""棒""赞"这类单字会命中快递、尽快、快点等，把催促和投诉判成积极
+NEGATIVE_WORDS = ("慢", "差", "坏", "破损", "失望", "投诉", "垃圾", "退款", "骗", "不满", "生气",
+                  "太久", "没收到", "还没", "故障", "问题", "怎么回事", "为什么")
+POSITIVE_WORDS = ("好评", "满意", "喜欢", "感谢", "谢谢", "不错", "很好", "很棒", "真棒", "太棒了",
+                  "很快", "速度快", "发货快", "物流快", "到货快", "推荐", "点赞", "赞一个")
+
+# 问题分类关键词表，顺序即优先级
+CATEGORY_LEXICON = {
+    "物流问题": ("物流", "快递", "配送", "发货", "送货", "运输", "没收到", "延迟"),
+    "产品质量": ("质量", "瑕疵", "坏了", "故障", "破损", "做工", "假货", "不能用"),
+    "客户服务": ("客服", "态度", "回复", "响应", "不理", "服务"),
+    "支付问题": ("支付", "扣款", "付款", "重复扣", "多扣", "余额", "账单"),
+    "退货退款": ("退货", "退款", "退钱", "换货", "退回"),
+}
+
+# 紧急程度关键词
+HIGH_URGENCY_WORDS = ("紧急", "立刻", "马上", "投诉", "12315", "曝光", "律师")
+MEDIUM_URGENCY_WORDS = ("为什么", "太久", "失望", "生气", "不满", "怎么回事", "还没")
+
+SLA_HOURS = {"HIGH": 2, "MEDIUM": 12, "LOW": 24}
+
+
+def _compile(words):
+    return re.compile("|".join(re.escape(word) for word in words))
+
+
+# 积极、消极词放在同一个正则里从左到右匹配，"不满意"先命中"不满"，不会再把其中的"满意"算作积极
+_SENTIMENT_RE = _compile(sorted(NEGATIVE_WORDS + POSITIVE_WORDS, key=len, reverse=True))
+_POSITIVE_SET = frozenset(POSITIVE_WORDS)
+_HIGH_RE = _compile(HIGH_URGENCY_WORDS)
+_MEDIUM_RE = _compile(MEDIUM_URGENCY_WORDS)
+_CATEGORY_RES = {name: _compile(words) for name, words in CATEGORY_LEXICON.items()}
+
+
+def local_order_id(user_input: str) -> dict:
+    """正则提取订单ID，格式与 extract_order_id 一致"""
+    match = ORDER_ID_PATTERN.search(user_input)
+    return {"order_id": match.group(0) if match else "NOT_FOUND"}
+
+
+def local_sentiment(user_input: str) -> dict:
+    """
+    关键词情感分析，格式与 analyze_sentiment 一致
+    置信度按命中关键词的差值粗略估计，最高 0.9
+    """
+    matches = _SENTIMENT_RE.findall(user_input)
+    negative = [word for word in matches if word not in _POSITIVE_SET]
+    positive = [word for word in matches if word in _POSITIVE_SET]
+    if len(negative) > len(positive):
+        sentiment = "NEGATIVE"
+    elif len(positive) > len(negative):
+        sentiment = "POSITIVE"
+    else:
+        sentiment = "NEUTRAL"
+    confidence = min(0.9, 0.5 + 0.1 * abs(len(negative) - len(positive)))
+    key_phrases = list(dict.fromkeys(negative + positive))[:3]
+    return {"sentiment": sentiment, "confidence": confidence, "key_phrases": key_phrases}
+
+
+def local_categories(user_input: str) -> dict:
+    """关键词问题分类，按命中次数取最相关的1-2个分类，格式与 classify_issue 一致"""
+    hits = []
+    for name, pattern in _CATEGORY_RES.items():
+        count = len(pattern.findall(user_input))
+        if count:
+            hits.append((count, name))
+    hits.sort(key=lambda item: -item[0])
+    categories = [name for _, name in hits[:2]] or ["其他"]
+    return {"categories": categories}
+
+
+def local_priority(user_input: str) -> dict:
+    """关键词紧急程度评估，格式与 assess_priority 一致"""
+    if _HIGH_RE.search(user_input):
+        urgency, reason = "HIGH", "包含紧急或投诉相关表述"
+    elif _MEDIUM_RE.search(user_input):
+        urgency, reason = "MEDIUM", "表达不满但无立即行动要求"
+    else:
+        urgency, reason = "LOW", "一般反馈"
+    return {"urgency": urgency, "sla_hours": SLA_HOURS[urgency], "reason": f"[规则评估] {reason}"}
+
+
+def local_reply(data: dict) -> str:
+    """模板回复，用于降级模式下代替 generate_reply"""
+    categories = "、".join(data["categories"]) if isinstance(data["categories"], list) else data["categories"]
+    if data["sentiment"] == "NEGATIVE":
+        opening = "非常抱歉给您带来不好的体验。"
+    elif data["sentiment"] == "POSITIVE":
+        opening = "感谢您的认可与支持！"
+    else:
+        opening = "感谢您的反馈。"
+    return (f"{opening}您的订单 {data['order_id']} 反馈的{categories}已登记，"
+            f"我们会在{data['sla_hours']}小时内跟进处理并联系您。请问还有其他问题吗？")
@@ -0,0 +1,218 @@
+#本地预分类器：关键词词表 + 哈希特征 + NumPy 逻辑回归
+#高置信度的工单直接在本地给出情感和分类结果，只有不确定的工单才调用大模型
+import zlib
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from common_ai.local_analyzers import CATEGORY_LEXICON, NEGATIVE_WORDS, POSITIVE_WORDS
+
+SENTIMENT_LABELS = ["POSITIVE", "NEUTRAL", "NEGATIVE"]
+CATEGORY_LABELS = list(CATEGORY_LEXICON) + ["其他"]
+
+# 词表命中作为额外的强特征
+_LEXICON = [(word, "LEX:POS") for word in POSITIVE_WORDS] + [(word, "LEX:NEG") for word in NEGATIVE_WORDS]
+_LEXICON += [(word, f"LEX:{name}") for name, words in CATEGORY_LEXICON.items() for word in words]
+
+
+class HashingFeaturizer:
+    """
+    哈希特征：字符一元、二元组 + 词表命中，映射到固定维度
+    使用 crc32 保证跨进程稳定（Python 内置 hash 每个进程不同）
+    """
+
+    def __init__(self, n_features: int = 2 ** 12):
+        self.n_features = n_features
+        self._cache = {}
+
+    def _index(self, token: str) -> int:
+        index = self._cache.get(token)
+        if index is None:
+            index = self._cache[token] = zlib.crc32(token.encode("utf-8")) % self.n_features
+        return index
+
+    def tokens(self, text: str) -> List[str]:
+        tokens = list(text)
+        tokens += [text[i:i + 2] for i in range(len(text) - 1)]
+        tokens += [tag for word, tag in _LEXICON if word in text]
+        return tokens
+
+    def transform(self, texts: Sequence[str]) -> np.ndarray:
+        """把文本批量转换为特征矩阵 (n, n_features)，每行做 L2 归一化"""
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for row, text in enumerate(texts):
+            indices = [self._index(token) for token in self.tokens(text)]
+            np.add.at(matrix[row], indices, 1.0)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+class LogisticRegression:
+    """
+    NumPy 实现的逻辑回归，全批量梯度下降 + L2 正则
+    multilabel=False 时为 softmax 多分类；multilabel=True 时每个标签独立 sigmoid（一个样本可以有多个标签）
+    """
+
+    def __init__(self, labels: Sequence[str], multilabel: bool = False, lr: float = 2.0,
+                 epochs: int = 300, l2: float = 1e-4):
+        self.labels = list(labels)
+        self.multilabel = multilabel
+        self.lr = lr
+        self.epochs = epochs
+        self.l2 = l2
+        self.weights: Optional[np.ndarray] = None
+        self.bias: Optional[np.ndarray] = None
+
+    def _scores(self, features: np.ndarray) -> np.ndarray:
+        logits = features @ self.weights + self.bias
+        if self.multilabel:
+            return 1.0 / (1.0 + np.exp(-logits))
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def fit(self, features: np.ndarray, targets: np.ndarray) -> "LogisticRegression":
+        """
+        :param features: 特征矩阵 (n, d)
+        :param targets: one-hot / multi-hot 标签矩阵 (n, k)
+        """
+        n, d = features.shape
+        self.weights = np.zeros((d, len(self.labels)), dtype=np.float32)
+        self.bias = np.zeros(len(self.labels), dtype=np.float32)
+        for _ in range(self.epochs):
+            # softmax 和 sigmoid 的交叉熵梯度形式相同
+            error = self._scores(features) - targets
+            self.weights -= self.lr * (features.T @ error / n + self.l2 * self.weights)
+            self.bias -= self.lr * error.mean(axis=0)
+        return self
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        return self._scores(features)
+
+
+def _sentiment_confidence(proba: np.ndarray) -> np.ndarray:
+    return proba.max(axis=1)
+
+
+def _category_confidence(proba: np.ndarray) -> np.ndarray:
+    # 多标签：每个标签的判断都要足够确定，取最不确定的那个
+    return np.maximum(proba, 1.0 - proba).min(axis=1)
+
+
+def calibrate_threshold(confidence: np.ndarray, correct: np.ndarray, target_precision: float = 0.97,
+                        min_threshold: float = 0.5) -> float:
+    """
+    在验证集上校准置信度阈值：找到最低的阈值，使得置信度不低于阈值的样本准确率达到 target_precision
+    阈值越低，本地能回答的工单越多
+    """
+    order = np.argsort(-confidence)
+    precision = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    passing = np.nonzero(precision >= target_precision)[0]
+    if len(passing) == 0:
+        return 1.0
+    return max(min_threshold, float(confidence[order][passing[-1]]))
+
+
+class LocalPreClassifier:
+    """
+    本地预分类器，给出与 analyze_sentiment / classify_issue 相同格式的结果
+    置信度低于校准阈值时返回 None，由调用方交给大模型处理
+    """
+
+    def __init__(self, n_features: int = 2 ** 12):
+        self.featurizer = HashingFeaturizer(n_features)
+        self.sentiment_model = LogisticRegression(SENTIMENT_LABELS)
+        self.category_model = LogisticRegression(CATEGORY_LABELS, multilabel=True)
+        self.sentiment_threshold = 1.0
+        self.category_threshold = 1.0
+
+    def fit(self, records: Iterable[dict], validation: Iterable[dict],
+            target_precision: float = 0.97) -> "LocalPreClassifier":
+        """
+        用记录下来的大模型输出训练，并在验证集上校准阈值
+        :param records: [{"feedback", "sentiment", "categories"}]
+        :param validation: 与 records 格式相同的验证集
+        :param target_precision: 本地回答部分需要达到的准确率
+        """
+        records, validation = list(records), list(validation)
+        features = self.featurizer.transform([r["feedback"] for r in records])
+        self.sentiment_model.fit(features, self._sentiment_targets(records))
+        self.category_model.fit(features, self._category_targets(records))
+
+        features = self.featurizer.transform([r["feedback"] for r in validation])
+        proba = self.sentiment_model.predict_proba(features)
+        correct = proba.argmax(axis=1) == self._sentiment_targets(validation).argmax(axis=1)
+        self.sentiment_threshold = calibrate_threshold(_sentiment_confidence(proba), correct, target_precision)
+        proba = self.category_model.predict_proba(features)
+        correct = ((proba >= 0.5) == (self._category_targets(validation) > 0)).all(axis=1)
+        self.category_threshold = calibrate_threshold(_category_confidence(proba), correct, target_precision)
+        return self
+
+    @staticmethod
+    def _sentiment_targets(records: List[dict]) -> np.ndarray:
+        targets = np.zeros((len(records), len(SENTIMENT_LABELS)), dtype=np.float32)
+        for row, record in enumerate(records):
+            targets[row, SENTIMENT_LABELS.index(record["sentiment"])] = 1.0
+        return targets
+
+    @staticmethod
+    def _category_targets(records: List[dict]) -> np.ndarray:
+        targets = np.zeros((len(records), len(CATEGORY_LABELS)), dtype=np.float32)
+        for row, record in enumerate(records):
+            for name in record["categories"]:
+                if name in CATEGORY_LABELS:
+                    targets[row, CATEGORY_LABELS.index(name)] = 1.0
+        return targets
+
+    def predict_sentiment_batch(self, texts: Sequence[str]) -> List[Optional[dict]]:
+        proba = self.sentiment_model.predict_proba(self.featurizer.transform(texts))
+        confidence = _sentiment_confidence(proba)
+        results = []
+        for row, label in enumerate(proba.argmax(axis=1)):
+            if confidence[row] < self.sentiment_threshold:
+                results.append(None)
+            else:
+                results.append({"sentiment": SENTIMENT_LABELS[label],
+                                "confidence": round(float(confidence[row]), 2), "key_phrases": []})
+        return results
+
+    def predict_categories_batch(self, texts: Sequence[str]) -> List[Optional[dict]]:
+        proba = self.category_model.predict_proba(self.featurizer.transform(texts))
+        confidence = _category_confidence(proba)
+        results = []
+        for row in range(len(texts)):
+            order = [i for i in np.argsort(-proba[row]) if proba[row, i] >= 0.5][:2]
+            if confidence[row] < self.category_threshold or not order:
+                results.append(None)
+            else:
+                results.append({"categories": [CATEGORY_LABELS[i] for i in order]})
+        return results
+
+    def predict_sentiment(self, text: str) -> Optional[dict]:
+        """高置信度时返回情感结果，否则返回 None"""
+        return self.predict_sentiment_batch([text])[0]
+
+    def predict_categories(self, text: str) -> Optional[dict]:
+        """高置信度时返回分类结果，否则返回 None"""
+        return self.predict_categories_batch([text])[0]
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            n_features=self.featurizer.n_features,
+            sentiment_weights=self.sentiment_model.weights, sentiment_bias=self.sentiment_model.bias,
+            category_weights=self.category_model.weights, category_bias=self.category_model.bias,
+            thresholds=np.array([self.sentiment_threshold, self.category_threshold]),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LocalPreClassifier":
+        with np.load(path) as data:
+            classifier = cls(int(data["n_features"]))
+            classifier.sentiment_model.weights = data["sentiment_weights"]
+            classifier.sentiment_model.bias = data["sentiment_bias"]
+            classifier.category_model.weights = data["category_weights"]
+            classifier.category_model.bias = data["category_bias"]
+            classifier.sentiment_threshold, classifier.category_threshold = data["thresholds"].tolist()
+        return classifier
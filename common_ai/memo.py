@@ -0,0 +1,172 @@
+#带缓存的 RunnableLambda：纯函数节点（length_function、pass_through、extract_order_id 等）相同输入只计算一次
+#- 字典、列表输入自动转换成可哈希的缓存键
+#- LRU 缓存，条目数有上限
+#- 请求级去重：同一次请求中多个分支引用同一个节点、输入相同时只计算一次（并发的分支等待第一个计算完成）
+#- 命中率统计
+import contextvars
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+# 当前请求的去重表，RunnableParallel 的分支在线程池中执行时会复制上下文，共享同一个表
+_request_scope: contextvars.ContextVar[Optional[Dict[Any, Future]]] = contextvars.ContextVar(
+    "memo_request_scope", default=None)
+_scope_lock = threading.Lock()
+
+_MISSING = object()
+
+
+def make_key(value: Any) -> Any:
+    """
+    把输入转换成可哈希的缓存键，字典与键的顺序无关
+    :raises TypeError: 输入中包含无法哈希的对象（如消息对象）
+    """
+    if isinstance(value, dict):
+        return dict, frozenset((key, make_key(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return type(value), tuple(make_key(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset, frozenset(make_key(item) for item in value)
+    hash(value)
+    # 带上类型，避免 1、1.0、True 共用一个缓存条目
+    return type(value), value
+
+
+@contextmanager
+def request_scope() -> Iterator[None]:
+    """开启请求级去重，嵌套调用时沿用外层的去重表"""
+    if _request_scope.get() is not None:
+        yield
+        return
+    token = _request_scope.set({})
+    try:
+        yield
+    finally:
+        _request_scope.reset(token)
+
+
+class RequestScoped(Runnable):
+    """
+    在请求级去重范围内执行链
+
+    用法:
+        chain = RequestScoped(RunnableParallel(extract=extract_chain, analysis=analysis_chain))
+    """
+
+    def __init__(self, bound: Runnable, name: Optional[str] = None):
+        self.bound = bound
+        self.name = name or bound.get_name()
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        with request_scope():
+            return self.bound.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        with request_scope():
+            return await self.bound.ainvoke(input, config, **kwargs)
+
+
+class MemoizedLambda(Runnable):
+    """
+    带缓存的 RunnableLambda，函数必须是纯函数
+
+    用法:
+        order_id_step = MemoizedLambda(extract_order_id, maxsize=4096)
+        order_id_step.stats()   # {"hits": ..., "misses": ..., "hit_rate": ...}
+
+    maxsize=0 时不做跨请求缓存，只做请求级去重
+    """
+
+    def __init__(self, func: Callable, name: Optional[str] = None, maxsize: int = 1024):
+        self.func = func
+        self.name = name or getattr(func, "__name__", "MemoizedLambda")
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._scope_hits = 0
+        self._misses = 0
+        self._uncacheable = 0
+
+    def _lookup(self, key: Any) -> Any:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return self._cache[key]
+        return _MISSING
+
+    def _store(self, key: Any, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def _compute(self, input: Any, key: Any) -> Any:
+        with self._lock:
+            self._misses += 1
+        value = self.func(input)
+        self._store(key, value)
+        return value
+
+    def _call(self, input: Any) -> Any:
+        try:
+            key = make_key(input)
+        except TypeError:
+            with self._lock:
+                self._uncacheable += 1
+            return self.func(input)
+
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        scope = _request_scope.get()
+        if scope is None:
+            return self._compute(input, key)
+
+        scope_key = (id(self), key)
+        with _scope_lock:
+            future = scope.get(scope_key)
+            owner = future is None
+            if owner:
+                future = scope[scope_key] = Future()
+        if not owner:
+            with self._lock:
+                self._scope_hits += 1
+            return future.result()
+        try:
+            value = self._compute(input, key)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(value)
+        return value
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self._call_with_config(self._call, input, config)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._scope_hits + self._misses
+            return {
+                "hits": self._hits,
+                "request_hits": self._scope_hits,
+                "misses": self._misses,
+                "uncacheable": self._uncacheable,
+                "size": len(self._cache),
+                "hit_rate": (self._hits + self._scope_hits) / lookups if lookups else 0.0,
+            }
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._hits = self._scope_hits = self._misses = self._uncacheable = 0
+
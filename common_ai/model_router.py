@@ -0,0 +1,417 @@
+#多后端模型门面：同一个聊天模型接口背后挂多个模型/服务，按策略选择
+#- race: 同时请求所有后端，第一个成功的结果胜出，其余放弃（异步调用会被真正取消）
+#- balanced: 按观测到的延迟加权随机选择后端，越快的后端分到越多流量；失败时按权重依次换下一个
+#- failover: 按配置顺序使用，前一个失败或熔断时换下一个
+#每个后端有路由自己的熔断器（common_ai/circuit_breaker.py），与 get_breaker 按模型名共享的熔断器互不影响；
+#熔断中的后端直接跳过，半开状态只放行 half_open_max_calls 个探测请求
+#
+#用法:
+#    model = ModelRouter(backends={
+#        "qwen-max-latest": ChatOpenAI(model="qwen-max-latest", base_url=ALI_TONGYI_URL),
+#        "deepseek-v3": ChatOpenAI(model="deepseek-v3", base_url=ALI_TONGYI_URL),
+#    }, policy="balanced")
+#    chain = prompt | model | StrOutputParser()
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManager,
+    AsyncCallbackManagerForLLMRun,
+    CallbackManager,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from common_ai.circuit_breaker import OPEN, CircuitBreaker, CircuitOpenError, ModelUnavailableError
+from common_ai.hedging import LatencyTracker
+
+POLICIES = ("race", "balanced", "failover")
+
+# 竞速请求共享的线程池
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="model-router")
+
+
+class BackendStats:
+    """
+    单个后端的统计：调用次数、失败次数、竞速胜出次数，以及最近 window 次成功调用的延迟中位数
+    用中位数而不是滑动平均：一次长尾请求不会让后端长时间分不到流量（分不到流量也就没有新样本来纠正）
+    """
+
+    def __init__(self, name: str, window: int, initial_latency: float, breaker: CircuitBreaker):
+        self.name = name
+        self.calls = 0
+        self.failures = 0
+        self.wins = 0
+        self.samples = 0
+        self.tracker = LatencyTracker(window=window, quantile=0.5, initial=initial_latency, min_samples=1,
+                                      refresh_every=1)
+        self.breaker = breaker
+        self._lock = threading.Lock()
+
+    @property
+    def latency(self) -> Optional[float]:
+        return self.tracker.value if self.samples else None
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.samples += 1
+        self.tracker.record(latency)
+        self.breaker.record_success()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+        self.breaker.record_failure()
+
+    def record_win(self) -> None:
+        with self._lock:
+            self.wins += 1
+
+    def acquire(self) -> None:
+        """每次真正调用后端前经过熔断器，半开状态下占用一个探测名额"""
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"后端 {self.name} 熔断中，请求被拒绝")
+
+
+class ModelRouter(BaseChatModel):
+    """
+    多后端聊天模型，可以直接用在任何链条和智能体中
+
+    参数说明:
+        backends: 名称 -> 模型（任意接受消息列表的 Runnable），failover 按这里的顺序
+        policy: "race" / "balanced" / "failover"
+        race_width: race 时同时请求的后端数，按观测延迟从快到慢选取，默认全部
+        window: 每个后端保留最近多少次成功调用的延迟，取中位数作为权重依据
+        initial_latency: 所有后端都还没有样本时使用的估计延迟(秒)
+        breaker_options: 传给每个后端熔断器（CircuitBreaker）的参数，如 failure_threshold、recovery_timeout
+
+    流式调用不做竞速：按策略排好顺序后依次尝试，拿到第一个 chunk 之后就固定使用这个后端
+    """
+
+    backends: Dict[str, Any]
+    policy: str = "failover"
+    race_width: Optional[int] = None
+    window: int = 50
+    initial_latency: float = 1.0
+    breaker_options: Dict[str, Any] = {}
+
+    _stats: Dict[str, BackendStats] = PrivateAttr(default_factory=dict)
+    _rng: random.Random = PrivateAttr(default_factory=random.Random)
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.policy not in POLICIES:
+            raise ValueError(f"未知的策略 {self.policy}，可选: {', '.join(POLICIES)}")
+        if not self.backends:
+            raise ValueError("至少需要配置一个后端")
+        # 熔断器归这个路由所有：同名模型在其他地方（如 get_breaker(模型名)）的失败不会让路由跳过该后端，反之亦然
+        self._stats = {name: BackendStats(name, self.window, self.initial_latency,
+                                          CircuitBreaker(name, **self.breaker_options))
+                       for name in self.backends}
+
+    @property
+    def _llm_type(self) -> str:
+        return "model-router"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"policy": self.policy, "backends": list(self.backends)}
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ModelRouter":
+        """每个后端各自绑定工具，延迟统计和熔断状态与原路由共享"""
+        bound = self.model_copy(update={
+            "backends": {name: model.bind_tools(tools, **kwargs) for name, model in self.backends.items()}})
+        bound._stats = self._stats
+        return bound
+
+    # ------------------------------------------------------------------
+    # 后端选择
+    # ------------------------------------------------------------------
+
+    def _available(self) -> List[str]:
+        # 只排除熔断打开的后端；半开状态的探测名额在真正调用时由 BackendStats.acquire 占用
+        names = [name for name in self.backends if self._stats[name].breaker.state != OPEN]
+        if not names:
+            raise ModelUnavailableError(f"所有后端都在熔断中: {', '.join(self.backends)}")
+        return names
+
+    def _latencies(self, names: List[str]) -> Dict[str, float]:
+        """还没有样本的后端按已知最快的延迟估计，先让它分到流量，再用实际样本纠正"""
+        known = [self._stats[name].latency for name in names if self._stats[name].latency is not None]
+        default = min(known) if known else self.initial_latency
+        return {name: max(self._stats[name].latency or default, 1e-3) for name in names}
+
+    def _order(self) -> List[str]:
+        """按策略给出本次请求尝试后端的顺序"""
+        names = self._available()
+        if self.policy == "failover":
+            return names
+        latencies = self._latencies(names)
+        if self.policy == "race":
+            return sorted(names, key=latencies.get)
+        # balanced: 按 1/延迟 加权，不放回地抽出完整顺序
+        order = []
+        weights = {name: 1.0 / latency for name, latency in latencies.items()}
+        while weights:
+            pick = self._rng.choices(list(weights), weights=list(weights.values()))[0]
+            order.append(pick)
+            del weights[pick]
+        return order
+
+    def _call(self, name: str, messages: List[BaseMessage], stop: Optional[List[str]], config: Dict,
+              kwargs: Dict[str, Any]) -> BaseMessage:
+        stats = self._stats[name]
+        stats.acquire()
+        start = time.perf_counter()
+        try:
+            message = self.backends[name].invoke(messages, config, stop=stop, **kwargs)
+        except Exception:
+            stats.record_failure()
+            raise
+        except BaseException:
+            stats.breaker.release()
+            raise
+        stats.record(time.perf_counter() - start)
+        return message
+
+    @staticmethod
+    def _result(name: str, message: BaseMessage) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"backend": name})
+
+    # ------------------------------------------------------------------
+    # 同步调用
+    # ------------------------------------------------------------------
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        config = _child_config(run_manager)
+        order = self._order()
+        if self.policy == "race":
+            return self._race(order[:self.race_width or len(order)], messages, stop, config, kwargs)
+        error: Optional[Exception] = None
+        for name in order:
+            try:
+                return self._result(name, self._call(name, messages, stop, config, kwargs))
+            except Exception as e:
+                error = e
+        raise ModelUnavailableError(f"所有后端调用失败: {', '.join(order)}") from error
+
+    def _race(self, names: List[str], messages: List[BaseMessage], stop: Optional[List[str]], config: Dict,
+              kwargs: Dict[str, Any]) -> ChatResult:
+        futures = {_executor.submit(self._call, name, messages, stop, config, kwargs): name for name in names}
+        pending = set(futures)
+        error: Optional[Exception] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # 线程中已开始的同步调用无法中断，只能放弃结果；它们结束后仍会更新延迟统计
+                    for loser in pending:
+                        loser.cancel()
+                    name = futures[future]
+                    self._stats[name].record_win()
+                    return self._result(name, future.result())
+                error = future.exception()
+        raise ModelUnavailableError(f"所有后端调用失败: {', '.join(names)}") from error
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        config = _child_config(run_manager)
+        order = self._order()
+        error: Optional[Exception] = None
+        for name in order:
+            stats = self._stats[name]
+            try:
+                stats.acquire()
+            except CircuitOpenError as e:
+                error = e
+                continue
+            start = time.perf_counter()
+            stream = self.backends[name].stream(messages, config, stop=stop, **kwargs)
+            try:
+                first = next(stream)
+            except StopIteration:
+                stats.record(time.perf_counter() - start)
+                return
+            except Exception as e:
+                stats.record_failure()
+                error = e
+                continue
+            except BaseException:
+                stats.breaker.release()
+                raise
+            # 已经有输出，之后的错误不能再换后端，直接抛给调用方；调用方中途停止读取时归还探测名额
+            try:
+                for chunk in _chain_first(first, stream):
+                    message = chunk if isinstance(chunk, AIMessageChunk) else AIMessageChunk(content=str(chunk))
+                    generation = ChatGenerationChunk(message=message)
+                    if run_manager is not None:
+                        run_manager.on_llm_new_token(generation.text, chunk=generation)
+                    yield generation
+            except Exception:
+                stats.record_failure()
+                raise
+            except BaseException:
+                stats.breaker.release()
+                raise
+            stats.record(time.perf_counter() - start)
+            return
+        raise ModelUnavailableError(f"所有后端调用失败: {', '.join(order)}") from error
+
+    # ------------------------------------------------------------------
+    # 异步调用
+    # ------------------------------------------------------------------
+
+    async def _acall(self, name: str, messages: List[BaseMessage], stop: Optional[List[str]], config: Dict,
+                     kwargs: Dict[str, Any]) -> BaseMessage:
+        stats = self._stats[name]
+        stats.acquire()
+        start = time.perf_counter()
+        try:
+            message = await self.backends[name].ainvoke(messages, config, stop=stop, **kwargs)
+        except Exception:
+            stats.record_failure()
+            raise
+        except BaseException:
+            # 竞速中输掉被取消（CancelledError），没有结果，不计入熔断
+            stats.breaker.release()
+            raise
+        stats.record(time.perf_counter() - start)
+        return message
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        config = _child_config(run_manager)
+        order = self._order()
+        if self.policy != "race":
+            error: Optional[Exception] = None
+            for name in order:
+                try:
+                    return self._result(name, await self._acall(name, messages, stop, config, kwargs))
+                except Exception as e:
+                    error = e
+            raise ModelUnavailableError(f"所有后端调用失败: {', '.join(order)}") from error
+
+        names = order[:self.race_width or len(order)]
+        tasks = {asyncio.ensure_future(self._acall(name, messages, stop, config, kwargs)): name for name in names}
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        name = tasks[task]
+                        self._stats[name].record_win()
+                        return self._result(name, task.result())
+                    error = task.exception()
+            raise ModelUnavailableError(f"所有后端调用失败: {', '.join(names)}") from error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        config = _child_config(run_manager)
+        order = self._order()
+        error: Optional[Exception] = None
+        for name in order:
+            stats = self._stats[name]
+            try:
+                stats.acquire()
+            except CircuitOpenError as e:
+                error = e
+                continue
+            start = time.perf_counter()
+            stream = self.backends[name].astream(messages, config, stop=stop, **kwargs)
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                stats.record(time.perf_counter() - start)
+                return
+            except Exception as e:
+                stats.record_failure()
+                error = e
+                continue
+            except BaseException:
+                stats.breaker.release()
+                raise
+            chunk = first
+            try:
+                while True:
+                    message = chunk if isinstance(chunk, AIMessageChunk) else AIMessageChunk(content=str(chunk))
+                    generation = ChatGenerationChunk(message=message)
+                    if run_manager is not None:
+                        await run_manager.on_llm_new_token(generation.text, chunk=generation)
+                    yield generation
+                    try:
+                        chunk = await stream.__anext__()
+                    except StopAsyncIteration:
+                        break
+            except Exception:
+                stats.record_failure()
+                raise
+            except BaseException:
+                stats.breaker.release()
+                raise
+            stats.record(time.perf_counter() - start)
+            return
+        raise ModelUnavailableError(f"所有后端调用失败: {', '.join(order)}") from error
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """每个后端的调用数、失败数、竞速胜出数、平均延迟和熔断状态"""
+        return {
+            name: {
+                "calls": stats.calls,
+                "failures": stats.failures,
+                "wins": stats.wins,
+                "latency": stats.latency,
+                "state": stats.breaker.state,
+            }
+            for name, stats in self._stats.items()
+        }
+
+
+def _child_config(run_manager: Any) -> Dict[str, Any]:
+    """后端调用挂在路由这次调用下面，回调和追踪能看到实际使用的后端（做法同 ParentRunManager.get_child）"""
+    if run_manager is None:
+        return {}
+    manager_cls = AsyncCallbackManager if isinstance(run_manager, AsyncCallbackManagerForLLMRun) else CallbackManager
+    manager = manager_cls(handlers=[], parent_run_id=run_manager.run_id)
+    manager.set_handlers(run_manager.inheritable_handlers)
+    manager.add_tags(run_manager.inheritable_tags)
+    manager.add_metadata(run_manager.inheritable_metadata)
+    return {"callbacks": manager}
+
+
+def _chain_first(first: Any, rest: Iterator[Any]) -> Iterator[Any]:
+    yield first
+    yield from rest
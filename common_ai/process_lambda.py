@@ -0,0 +1,198 @@
+#进程池版 RunnableLambda：CPU 密集的预处理（文本规范化、分词、隐私信息扫描）放到多进程执行，不再受 GIL 限制
+#- 创建时检查函数能否被 pickle（lambda、闭包不行）
+#- batch() 把小输入分块提交，摊薄进程间通信开销
+#- 大的 NumPy 数组 / bytes 通过共享内存传给子进程，不经过管道序列化
+#  数组在子进程中是共享内存上的视图，不复制；bytes 在子进程中复制一次，函数拿到的仍是普通 bytes
+import math
+import os
+import pickle
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, List, Optional, Union
+
+import numpy as np
+from langchain_core.runnables import Runnable, RunnableConfig
+
+# 超过这个字节数的数组 / bytes 走共享内存
+SHM_THRESHOLD = 64 * 1024
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_process_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """进程内共享的进程池，第一次使用时创建"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            # 先启动资源跟踪器，子进程继承同一个，共享内存只会被登记在父进程的跟踪器里
+            resource_tracker.ensure_running()
+            _pool_workers = max_workers or os.cpu_count() or 1
+            _pool = ProcessPoolExecutor(max_workers=_pool_workers)
+        return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def check_picklable(func: Callable) -> None:
+    """
+    检查函数能否被发送到子进程
+    :raises TypeError: lambda、嵌套函数、闭包等不能被 pickle 的函数
+    """
+    try:
+        pickle.dumps(func)
+    except (pickle.PicklingError, AttributeError, TypeError) as e:
+        raise TypeError(f"函数 {getattr(func, '__qualname__', func)!r} 不能被 pickle，"
+                        f"进程池中只能执行模块级函数: {e}") from e
+
+
+def _run_chunk(func: Callable, items: List[Any]) -> List[Any]:
+    return [func(item) for item in items]
+
+
+def _run_shared(func: Callable, name: str, kind: str, shape: tuple, dtype: str) -> Any:
+    # 进程池子进程与父进程共用同一个资源跟踪器，共享内存由父进程 unlink，子进程只 close
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        if kind == "ndarray":
+            # 直接在共享内存上构造数组视图，不复制；视图只在这次调用期间有效
+            # 用 frombuffer 而不是 np.ndarray(buffer=...)：前者持有缓冲区导出，视图还在时 close() 会抛出 BufferError，
+            # 后者不持有，close() 照样解除映射，之后再访问视图会直接段错误
+            result = func(np.frombuffer(shm.buf, dtype=dtype, count=math.prod(shape)).reshape(shape))
+        else:
+            # bytes 没有只读视图可用，复制一次，函数拿到的是普通 bytes（省掉的是管道上的序列化）
+            result = func(bytes(shm.buf[:shape[0]]))
+    except BaseException as e:
+        # 异常的 traceback 里还引用着视图，先清掉再 close
+        traceback.clear_frames(e.__traceback__)
+        try:
+            shm.close()
+        except BufferError:
+            pass
+        raise
+    try:
+        shm.close()
+    except BufferError:
+        # 结果仍引用共享内存（返回了切片，或把视图放进了列表、字典），复制出来后再 close
+        result = pickle.loads(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        shm.close()
+    return result
+
+
+def _is_large(item: Any) -> bool:
+    return isinstance(item, (np.ndarray, bytes, bytearray)) and _nbytes(item) >= SHM_THRESHOLD
+
+
+def _nbytes(item: Any) -> int:
+    return item.nbytes if isinstance(item, np.ndarray) else len(item)
+
+
+class _SharedPayload:
+    """父进程一侧的共享内存：写入一次，调用结束后释放"""
+
+    def __init__(self, item: Union[np.ndarray, bytes, bytearray]):
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, _nbytes(item)))
+        if isinstance(item, np.ndarray):
+            self.args = ("ndarray", item.shape, item.dtype.str)
+            np.ndarray(item.shape, dtype=item.dtype, buffer=self.shm.buf)[...] = item
+        else:
+            self.args = ("bytes", (len(item),), "")
+            self.shm.buf[:len(item)] = item
+
+    def release(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+class RunnableProcessLambda(Runnable):
+    """
+    在共享进程池中执行函数的 RunnableLambda
+
+    用法:
+        normalize = RunnableProcessLambda(normalize_text)     # normalize_text 必须是模块级函数
+        normalize.batch(texts)
+
+    注意:
+        函数的输入输出都需要能被 pickle；大的 NumPy 数组 / bytes 输入自动走共享内存，
+        数组以共享内存上的视图传入，函数不能在返回后继续持有它（返回值中的视图会被复制出来）
+    """
+
+    def __init__(self, func: Callable, name: Optional[str] = None, chunk_size: Optional[int] = None,
+                 max_workers: Optional[int] = None):
+        """
+        :param func: 模块级函数
+        :param name: 节点名称
+        :param chunk_size: batch() 时每个任务包含的输入数，默认按进程数自动计算
+        :param max_workers: 进程池大小（只在第一次创建共享进程池时生效）
+        """
+        check_picklable(func)
+        self.func = func
+        self.name = name or getattr(func, "__name__", "RunnableProcessLambda")
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+
+    def _submit_one(self, pool: ProcessPoolExecutor, item: Any, payloads: List[_SharedPayload]):
+        if _is_large(item):
+            payload = _SharedPayload(item)
+            payloads.append(payload)
+            return pool.submit(_run_shared, self.func, payload.shm.name, *payload.args)
+        return pool.submit(self.func, item)
+
+    def _invoke(self, input: Any) -> Any:
+        payloads: List[_SharedPayload] = []
+        try:
+            return self._submit_one(get_process_pool(self.max_workers), input, payloads).result()
+        finally:
+            # 等子进程用完后在当前线程释放，保证函数返回时共享内存已经 unlink
+            for payload in payloads:
+                payload.release()
+
+    def _batch(self, inputs: List[Any]) -> List[Any]:
+        pool = get_process_pool(self.max_workers)
+        chunk_size = self.chunk_size or max(1, math.ceil(len(inputs) / (_pool_workers * 4)))
+        futures = []
+        small = []
+        payloads: List[_SharedPayload] = []
+        try:
+            for index, item in enumerate(inputs):
+                if _is_large(item):
+                    futures.append(([index], self._submit_one(pool, item, payloads), False))
+                else:
+                    small.append(index)
+            for start in range(0, len(small), chunk_size):
+                indices = small[start:start + chunk_size]
+                futures.append((indices, pool.submit(_run_chunk, self.func, [inputs[i] for i in indices]), True))
+            results: List[Any] = [None] * len(inputs)
+            for indices, future, chunked in futures:
+                values = future.result() if chunked else [future.result()]
+                for index, value in zip(indices, values):
+                    results[index] = value
+            return results
+        finally:
+            for _, future, _ in futures:
+                future.cancel()
+            wait([future for _, future, _ in futures])
+            for payload in payloads:
+                payload.release()
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self._call_with_config(self._invoke, input, config)
+
+    def batch(self, inputs: List[Any], config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None,
+              *, return_exceptions: bool = False, **kwargs: Any) -> List[Any]:
+        if not inputs:
+            return []
+        if return_exceptions:
+            return super().batch(inputs, config, return_exceptions=True, **kwargs)
+        if isinstance(config, list):
+            config = config[0]
+        return self._call_with_config(self._batch, list(inputs), config)
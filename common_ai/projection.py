@@ -0,0 +1,71 @@
+#声明式字段投影：用一个 Runnable 代替一组只做取值的 lambda
+#字段路径在创建时编译成一个 Python 函数，执行时不再经过 RunnableParallel 的线程池分发和逐个回调
+from typing import Any, Dict, Optional, Tuple, Union
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+FieldSpec = Union[str, Tuple[str, Any]]
+
+_NO_DEFAULT = object()
+
+
+def _parse_spec(spec: FieldSpec) -> Tuple[list, Any]:
+    if isinstance(spec, tuple):
+        path, default = spec
+    else:
+        path, default = spec, _NO_DEFAULT
+    return path.split(".") if path else [], default
+
+
+def compile_projection(fields: Dict[str, FieldSpec]):
+    """
+    把字段规格编译成一个提取函数
+    :param fields: {输出键: "a.b.c"} 或 {输出键: ("a.b.c", 默认值)}，路径为空字符串表示整个输入
+    :return: (提取函数, 生成的源码)
+    """
+    defaults = []
+    lines = ["def _project(x):", "    out = {}"]
+    for key, spec in fields.items():
+        path, default = _parse_spec(spec)
+        expression = "x" + "".join(f"[{part!r}]" for part in path)
+        if default is _NO_DEFAULT:
+            lines.append(f"    out[{key!r}] = {expression}")
+        else:
+            lines.append("    try:")
+            lines.append(f"        out[{key!r}] = {expression}")
+            lines.append("    except (KeyError, IndexError, TypeError):")
+            lines.append(f"        out[{key!r}] = _defaults[{len(defaults)}]")
+            defaults.append(default)
+    lines.append("    return out")
+    source = "\n".join(lines)
+    namespace = {"_defaults": defaults}
+    exec(compile(source, "<projection>", "exec"), namespace)
+    return namespace["_project"], source
+
+
+class RunnableProjection(Runnable):
+    """
+    声明式字段投影
+
+    用法:
+        RunnableProjection({
+            "order_id": "analysis.order_id.order_id",
+            "sentiment": ("analysis.sentiment.sentiment", "NEUTRAL"),
+        })
+
+    与 {"order_id": lambda x: ..., "sentiment": lambda x: ...} 的结果相同，
+    区别是整个投影只产生一次调用（开启追踪时只有一个 run），不经过线程池
+    注意：有默认值的字段，路径上任意一层缺失都会使用默认值
+    """
+
+    def __init__(self, fields: Dict[str, FieldSpec], name: Optional[str] = None):
+        self.fields = dict(fields)
+        self.name = name or "RunnableProjection"
+        self._project, self.source = compile_projection(self.fields)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Dict[str, Any]:
+        return self._call_with_config(self._project, input, config)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Dict[str, Any]:
+        # 纯内存取值，直接在事件循环中执行，不需要放到线程池
+        return self.invoke(input, config, **kwargs)
@@ -0,0 +1,96 @@
+#模型提供方的延迟加载
+#langchain_community 的 ChatTongyi（连带 dashscope、langsmith）导入约 0.9s，langchain_openai 约 1.2s，
+#示例脚本在模块顶层创建模型时，即使这次运行用不到模型也要付出这部分启动时间。
+#LazyChatModel 只记录提供方和参数，第一次调用时才导入提供方模块并创建模型；它本身是 Runnable，可以直接组成链条
+#
+#用法:
+#    model_special = LazyChatModel("tongyi", model_name="qwen-max", temperature=0.2)
+#    chain = prompt | model_special | StrOutputParser()   # 此时还没有导入 langchain_community
+import importlib
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+# 提供方名称 -> "模块:类名"
+PROVIDERS: Dict[str, str] = {
+    "tongyi": "langchain_community.chat_models.tongyi:ChatTongyi",
+    "openai": "langchain_openai:ChatOpenAI",
+    "fake": "common_ai.fake_models:FakeChatModel",
+}
+
+
+def load_provider(provider: str) -> type:
+    """按名称导入模型类，也可以直接传 "模块:类名" """
+    spec = PROVIDERS.get(provider, provider)
+    if ":" not in spec:
+        raise ValueError(f"未知的模型提供方 {provider}，可选: {', '.join(PROVIDERS)}，或使用 \"模块:类名\"")
+    module_name, class_name = spec.split(":", 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class LazyChatModel(Runnable):
+    """
+    第一次调用时才创建的聊天模型
+
+    参数说明:
+        provider: PROVIDERS 中的名称或 "模块:类名"
+        kwargs: 创建模型的参数
+
+    还没有创建模型时，读取 kwargs 中已有的属性（如 model_name）直接返回参数值，不会触发导入；
+    其他属性和方法转发给真实模型
+    """
+
+    def __init__(self, provider: str, **kwargs: Any):
+        self.provider = provider
+        self.kwargs = kwargs
+        self._model: Optional[Runnable] = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> Runnable:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = load_provider(self.provider)(**self.kwargs)
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def get_name(self, suffix: Optional[str] = None, *, name: Optional[str] = None) -> str:
+        if self._model is not None:
+            return self._model.get_name(suffix, name=name)
+        return super().get_name(suffix, name=name or PROVIDERS.get(self.provider, self.provider).split(":")[-1])
+
+    def __getattr__(self, name: str) -> Any:
+        # 只有常规属性查找失败时才会进入这里
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self.__dict__.get("_model") is None and name in self.__dict__.get("kwargs", {}):
+            return self.kwargs[name]
+        return getattr(self.model, name)
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> Runnable:
+        return self.model.bind_tools(tools, **kwargs)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.model.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return await self.model.ainvoke(input, config, **kwargs)
+
+    def batch(self, inputs: List[Any], config: Any = None, *, return_exceptions: bool = False,
+              **kwargs: Any) -> List[Any]:
+        return self.model.batch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+
+    async def abatch(self, inputs: List[Any], config: Any = None, *, return_exceptions: bool = False,
+                     **kwargs: Any) -> List[Any]:
+        return await self.model.abatch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        return self.model.stream(input, config, **kwargs)
+
+    def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        return self.model.astream(input, config, **kwargs)
@@ -0,0 +1,106 @@
+#检索增强的回复：按工单的问题分类从本地知识库取政策、FAQ 片段，在 token 预算内挑选前几条放进回复提示词
+#代替 qwen-max 的联网搜索（enable_search）：不用等搜索，提示词里只有预算内的几条片段，内容也可控
+#
+#用法:
+#    snippets = PolicySnippets(retriever, max_tokens=300)
+#    docs = snippets.retrieve("物流为什么这么慢", ["物流问题"])
+#    prompt += format_snippets(docs)
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from common_ai.retrieval import Retriever, normalize
+
+
+def estimate_tokens(text: str) -> int:
+    """按字符数近似 token 数：千问的分词器一个汉字约一个 token，英文数字偏多估，用作预算足够"""
+    return len(text)
+
+
+def snippet_category(metadata: Mapping[str, Any]) -> Optional[str]:
+    """
+    片段所属的问题分类：优先取 metadata 中的 category，
+    没有时取 source 的第一级目录（按分类分目录存放文档，用 DocumentIngestor 写入的就是这种）
+    """
+    category = metadata.get("category")
+    if category:
+        return category
+    source = metadata.get("source")
+    parts = Path(source).parts if source else ()
+    return parts[0] if len(parts) > 1 else None
+
+
+def pack_snippets(documents: Sequence[Document], max_tokens: int, max_snippets: int) -> List[Document]:
+    """按顺序挑选片段，总 token 数不超过 max_tokens；放不下的跳过，继续尝试后面较短的片段"""
+    selected, used, seen = [], 0, set()
+    for doc in documents:
+        if len(selected) >= max_snippets:
+            break
+        text = doc.page_content.strip()
+        cost = estimate_tokens(text)
+        if text in seen or used + cost > max_tokens:
+            continue
+        seen.add(text)
+        selected.append(doc)
+        used += cost
+    return selected
+
+
+def format_snippets(documents: Sequence[Document]) -> str:
+    """编号列出片段，没有片段时为空字符串"""
+    return "\n".join(f"{i}. {doc.page_content.strip()}" for i, doc in enumerate(documents, 1))
+
+
+class PolicySnippets:
+    """
+    按问题分类检索政策、FAQ 片段
+
+    - 每个分类一个查询："【分类】反馈原文"，所有查询一次向量化，各自只在该分类的片段中检索（VectorStore.search 的 rows）
+    - 知识库中没有该分类的片段（或片段都没有分类信息）时在全部片段中检索；没有分类时直接用反馈原文检索
+    - 多个分类的结果按名次交替合并，再按 token 预算挑选；有重排序模型时先在各分类的候选中重排
+    - 分类到行号的映射在第一次检索时建立，向量存储的行数变化后重建
+
+    参数说明:
+        retriever: 提供向量模型、向量存储和可选的重排序模型
+        max_tokens: 片段的 token 预算（按字符数估算）
+        max_snippets: 最多放进提示词的片段数
+        fetch_k: 每个分类取回的候选数
+    """
+
+    def __init__(self, retriever: Retriever, max_tokens: int = 300, max_snippets: int = 3, fetch_k: int = 10):
+        self.retriever = retriever
+        self.max_tokens = max_tokens
+        self.max_snippets = max_snippets
+        self.fetch_k = fetch_k
+        self._rows: Dict[str, np.ndarray] = {}
+        self._count = -1
+
+    def category_rows(self, category: str) -> Optional[np.ndarray]:
+        """该分类的片段所在的行号，没有时为 None"""
+        store = self.retriever.store
+        if self._count != store.count:
+            rows = defaultdict(list)
+            for row, metadata in enumerate(store.metadatas):
+                rows[snippet_category(metadata)].append(row)
+            self._rows = {key: np.array(value, dtype=np.int64) for key, value in rows.items() if key}
+            self._count = store.count
+        return self._rows.get(category)
+
+    def retrieve(self, feedback: str, categories: Optional[Sequence[str]] = None) -> List[Document]:
+        retriever = self.retriever
+        categories = [category for category in (categories or []) if category] or [None]
+        queries = [f"【{category}】{feedback}" if category else feedback for category in categories]
+        vectors = normalize(retriever.embeddings.embed_documents(queries))
+        results = []
+        for query, category, vector in zip(queries, categories, vectors):
+            rows = self.category_rows(category) if category else None
+            scores, found = retriever.store.search(vector, self.fetch_k, rows=rows)
+            docs = [retriever._document(int(row), float(score)) for row, score in zip(found[0], scores[0]) if row >= 0]
+            results.append(retriever.rerank(query, docs, self.fetch_k))
+        merged: List[Document] = []
+        for rank in range(self.fetch_k):
+            merged.extend(docs[rank] for docs in results if rank < len(docs))
+        return pack_snippets(merged, self.max_tokens, self.max_snippets)
@@ -0,0 +1,712 @@
+#检索：文档向量化、内存映射的向量存储、可选的 IVF 索引、NumPy 向量化 top-k 和批量重排序
+#向量模型默认 text-embedding-v3（ALI_TONGYI_EMBEDDING_MODEL），重排序模型默认 gte-rerank-v2（ALI_TONGYI_RERANK_MODEL）
+#
+#用法:
+#    store = VectorStore("kb_index", dim=1024)
+#    retriever = Retriever(embeddings=dashscope_embeddings(), store=store, reranker=Reranker())
+#    retriever.add_texts(texts, metadatas)
+#    docs = retriever.invoke("退款多久到账")            # BaseRetriever，可以直接放进链条
+#    results = retriever.search_batch(queries)         # 多个查询一次向量化、一次扫描
+#    hybrid = HybridRetriever(retriever=retriever, index=BM25Index.build(...))   # 向量 + BM25，RRF 融合后重排序
+import contextlib
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from common_ai.ai_variable import ALI_TONGYI_EMBEDDING_MODEL, ALI_TONGYI_RERANK_MODEL
+from common_ai.bm25 import BM25Index
+
+DASHSCOPE_RERANK_URL = "https://dashscope.aliyuncs.com/api/v1/services/rerank/text-rerank/text-rerank"
+# text-embedding-v3 的兼容接口每次最多 10 条文本
+EMBEDDING_BATCH_SIZE = 10
+
+
+def text_id(text: str) -> str:
+    """文本内容的 xxhash64，用作默认的文档 id，相同内容得到相同 id"""
+    import xxhash
+
+    return xxhash.xxh64_hexdigest(text.encode("utf-8"))
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行归一化为单位向量（float32），之后余弦相似度就是点积"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def dashscope_embeddings(model: str = ALI_TONGYI_EMBEDDING_MODEL, **kwargs: Any) -> Embeddings:
+    """通过 OpenAI 兼容接口访问 DashScope 向量模型，地址和密钥取自 common_ai.settings 中该模型的配置"""
+    from langchain_openai import OpenAIEmbeddings
+
+    from common_ai.settings import get_settings
+
+    profile = get_settings().profile(model)
+    options = dict(model=model, base_url=profile.base_url, api_key=profile.api_key, timeout=profile.timeout,
+                   max_retries=profile.max_retries, check_embedding_ctx_length=False, chunk_size=EMBEDDING_BATCH_SIZE)
+    options.update(kwargs)
+    return OpenAIEmbeddings(**options)
+
+
+def embed_batches(embeddings: Embeddings, texts: Iterable[str], batch_size: int = EMBEDDING_BATCH_SIZE,
+                  max_concurrency: int = 4) -> Iterator[np.ndarray]:
+    """
+    分批向量化，最多 max_concurrency 个批次同时请求，按输入顺序逐批返回归一化后的 float32 矩阵
+    texts 可以是生成器：同一时刻只持有 max_concurrency 个批次，内存占用与语料大小无关
+    """
+
+    def batches():
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    if max_concurrency <= 1:
+        for batch in batches():
+            yield normalize(embeddings.embed_documents(batch))
+        return
+    with ThreadPoolExecutor(max_concurrency, thread_name_prefix="embed") as pool:
+        pending = deque()
+        for batch in batches():
+            pending.append(pool.submit(embeddings.embed_documents, batch))
+            if len(pending) >= max_concurrency:
+                yield normalize(pending.popleft().result())
+        while pending:
+            yield normalize(pending.popleft().result())
+
+
+def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """每行取分数最高的 k 个下标（argpartition，不做全排序），返回按分数降序排列的 (分数, 下标)"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.float32), empty.astype(np.int64)
+    index = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < scores.shape[1] else \
+        np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+    top = np.take_along_axis(scores, index, axis=1)
+    order = np.argsort(-top, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(index, order, axis=1)
+
+
+class IVFIndex:
+    """
+    倒排文件（IVF）近似最近邻索引，纯 NumPy 实现
+
+    - 训练：对（采样的）向量做球面 k-means，得到 nlist 个聚类中心
+    - 每个向量归入最近的中心；各聚类的行号按聚类排好序存成一个数组，用偏移量切分（CSR），不为每个聚类单独建列表
+    - 查询：先算查询与所有中心的相似度，只扫描最近的 nprobe 个聚类
+    nprobe 越大召回越高、速度越慢；新增的向量直接归入最近的中心，分布变化很大时应重新训练
+    """
+
+    def __init__(self, nlist: int = 256, nprobe: int = 8, iterations: int = 10, sample: int = 50_000,
+                 seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.sample = sample
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._assign = np.empty(0, dtype=np.int32)  # 行号 -> 聚类
+        self._order: Optional[np.ndarray] = None  # 按聚类排序的行号
+        self._offsets: Optional[np.ndarray] = None
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray, block: int = 65536) -> np.ndarray:
+        return np.concatenate([np.argmax(vectors[i:i + block] @ centroids.T, axis=1)
+                               for i in range(0, len(vectors), block)]) if len(vectors) else np.empty(0, np.int64)
+
+    def train(self, vectors: np.ndarray) -> None:
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > self.sample:
+            vectors = vectors[np.sort(rng.choice(len(vectors), self.sample, replace=False))]
+        vectors = normalize(vectors)
+        nlist = min(self.nlist, len(vectors))
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+        for _ in range(self.iterations):
+            assign = self._nearest(vectors, centroids)
+            # 按聚类排序后用 reduceat 求和，比 np.add.at 快一个数量级
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=nlist)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums = np.zeros_like(centroids)
+            nonempty = counts > 0
+            sums[nonempty] = np.add.reduceat(vectors[order], starts[nonempty], axis=0)
+            # 空聚类用随机向量重新初始化
+            empty = ~nonempty
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            centroids = normalize(sums)
+        self.centroids = centroids
+        self._assign = np.empty(0, dtype=np.int32)
+        self._order = None
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def add(self, start: int, vectors: np.ndarray) -> None:
+        """向量的行号从 start 开始连续"""
+        assign = self._nearest(normalize(vectors), self.centroids).astype(np.int32)
+        if start > len(self._assign):
+            raise ValueError(f"行号不连续: 已有 {len(self._assign)} 行，新增从 {start} 开始")
+        self._assign = np.concatenate([self._assign[:start], assign])
+        self._order = None
+
+    def _build(self) -> None:
+        self._order = np.argsort(self._assign, kind="stable")
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(self._assign, minlength=len(self.centroids)))])
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """查询向量最近的 nprobe 个聚类中的全部行号"""
+        if self._order is None:
+            self._build()
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self._order[self._offsets[p]:self._offsets[p + 1]] for p in probes])
+
+    def save(self, path: Union[str, Path]) -> None:
+        np.savez(path, centroids=self.centroids, assign=self._assign,
+                 params=np.array([self.nlist, self.nprobe, self.iterations, self.sample, self.seed]))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "IVFIndex":
+        with np.load(path) as data:
+            index = cls(*map(int, data["params"]))
+            index.centroids = data["centroids"]
+            index._assign = data["assign"]
+        return index
+
+
+class VectorStore:
+    """
+    向量存储：向量放在一个按行追加的矩阵中，文本和元数据放在内存列表中
+
+    - path 为空时全部放在内存；指定目录时向量矩阵是内存映射的 .npy 文件（np.lib.format.open_memmap），
+      操作系统按需换入，语料比内存大也可以检索；文本和元数据追加写入 records.jsonl
+    - dtype 可选 float32 或 float16。float16 占用的磁盘和页缓存减半，但检索时要先转换为 float32，
+      NumPy 的 float16 转换每个元素约 4ns，逐个查询的全量扫描会慢一个数量级，需要批量查询或配合 IVF 索引
+    - 向量写入前归一化，相似度为余弦相似度（点积）
+    - 删除只打标记，检索时跳过；compact() 重写文件回收空间
+    - 同一个 id 再次写入时替换旧记录
+    - 非线程安全：写入和检索不要并发进行，多线程只读检索是安全的
+    """
+
+    def __init__(self, path: Union[str, Path, None] = None, dim: Optional[int] = None, dtype: str = "float32",
+                 capacity: int = 1024, block_rows: int = 65536):
+        self.path = Path(path) if path else None
+        self.block_rows = block_rows
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        self._records = None
+        self.index: Optional[IVFIndex] = None
+        if self.path is not None and (self.path / "meta.json").exists():
+            self._open()
+        else:
+            if dim is None:
+                raise ValueError("新建向量存储需要指定 dim")
+            self.dim = dim
+            self.dtype = np.dtype(dtype)
+            self.count = 0
+            self._vectors = self._allocate(capacity)
+            self._alive = np.zeros(capacity, dtype=bool)
+            if self.path is not None:
+                self._write_meta()
+
+    # ------------------------------------------------------------------
+    # 文件
+    # ------------------------------------------------------------------
+
+    def _allocate(self, capacity: int, name: str = "vectors.npy") -> np.ndarray:
+        if self.path is None:
+            return np.zeros((capacity, self.dim), dtype=self.dtype)
+        self.path.mkdir(parents=True, exist_ok=True)
+        return np.lib.format.open_memmap(self.path / name, mode="w+", dtype=self.dtype, shape=(capacity, self.dim))
+
+    def _open(self) -> None:
+        meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        self.dim, self.dtype, self.count = meta["dim"], np.dtype(meta["dtype"]), meta["count"]
+        self._vectors = np.load(self.path / "vectors.npy", mmap_mode="r+")
+        self._alive = np.zeros(len(self._vectors), dtype=bool)
+        records = self.path / "records.jsonl"
+        # 新建后还没有写入任何记录时没有这个文件
+        with open(records, encoding="utf-8") if records.exists() else contextlib.nullcontext([]) as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("deleted"):
+                    self._delete_row(self._rows.get(record["id"]))
+                else:
+                    self._append_row(record["id"], record["text"], record.get("metadata") or {})
+        if len(self.ids) != self.count:
+            # 向量写入了但记录没有（写入过程中进程退出），以记录为准
+            self.count = len(self.ids)
+        if (self.path / "index.npz").exists():
+            self.index = IVFIndex.load(self.path / "index.npz")
+
+    def _write_meta(self) -> None:
+        meta = {"dim": self.dim, "dtype": self.dtype.name, "count": self.count}
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, self.path / "meta.json")
+
+    def _log(self, record: Dict[str, Any]) -> None:
+        if self.path is None:
+            return
+        if self._records is None:
+            self._records = open(self.path / "records.jsonl", "a", encoding="utf-8")
+        self._records.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def flush(self) -> None:
+        """把向量、记录和元信息写到磁盘"""
+        if self.path is None:
+            return
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        if self._records is not None:
+            self._records.flush()
+        if self.index is not None:
+            self.index.save(self.path / "index.npz")
+        self._write_meta()
+
+    def close(self) -> None:
+        self.flush()
+        if self._records is not None:
+            self._records.close()
+            self._records = None
+
+    def __enter__(self) -> "VectorStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._vectors)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        if self.path is None:
+            vectors = np.zeros((capacity, self.dim), dtype=self.dtype)
+            vectors[:self.count] = self._vectors[:self.count]
+        else:
+            # 新文件写完后再替换，旧文件在替换前一直可用
+            vectors = self._allocate(capacity, "vectors.npy.tmp")
+            for start in range(0, self.count, self.block_rows):
+                end = min(self.count, start + self.block_rows)
+                vectors[start:end] = self._vectors[start:end]
+            vectors.flush()
+            del self._vectors
+            os.replace(self.path / "vectors.npy.tmp", self.path / "vectors.npy")
+            vectors = np.load(self.path / "vectors.npy", mmap_mode="r+")
+        self._vectors = vectors
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        self._alive = alive
+
+    def _append_row(self, id: str, text: str, metadata: Dict[str, Any]) -> int:
+        self._delete_row(self._rows.get(id))
+        row = len(self.ids)
+        self.ids.append(id)
+        self.texts.append(text)
+        self.metadatas.append(metadata)
+        self._rows[id] = row
+        self._alive[row] = True
+        return row
+
+    def _delete_row(self, row: Optional[int]) -> None:
+        if row is not None and self._alive[row]:
+            self._alive[row] = False
+            del self._rows[self.ids[row]]
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray, texts: Sequence[str],
+            metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        vectors = normalize(vectors).reshape(-1, self.dim)
+        if not (len(ids) == len(vectors) == len(texts)):
+            raise ValueError(f"ids、vectors、texts 长度不一致: {len(ids)}, {len(vectors)}, {len(texts)}")
+        metadatas = metadatas or [{}] * len(ids)
+        start = self.count
+        self._grow(start + len(ids))
+        self._vectors[start:start + len(ids)] = vectors
+        for id, text, metadata in zip(ids, texts, metadatas):
+            self._append_row(id, text, metadata)
+            self._log({"id": id, "text": text, "metadata": metadata})
+        self.count += len(ids)
+        if self.index is not None and self.index.trained:
+            self.index.add(start, vectors)
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """删除记录，返回实际删除的条数"""
+        deleted = 0
+        for id in ids:
+            row = self._rows.get(id)
+            if row is not None:
+                self._delete_row(row)
+                self._log({"id": id, "deleted": True})
+                deleted += 1
+        return deleted
+
+    def compact(self) -> None:
+        """去掉已删除的行，重写向量文件和记录文件；索引会按新的行号重新归类"""
+        keep = np.flatnonzero(self._alive[:self.count])
+        ids = [self.ids[i] for i in keep]
+        texts = [self.texts[i] for i in keep]
+        metadatas = [self.metadatas[i] for i in keep]
+        vectors = np.empty((len(keep), self.dim), dtype=self.dtype)
+        for start in range(0, len(keep), self.block_rows):
+            vectors[start:start + self.block_rows] = self._vectors[keep[start:start + self.block_rows]]
+        if self._records is not None:
+            self._records.close()
+            self._records = None
+        if self.path is not None:
+            (self.path / "records.jsonl").unlink(missing_ok=True)
+        del self._vectors
+        self.ids, self.texts, self.metadatas, self._rows = [], [], [], {}
+        self.count = 0
+        self._vectors = self._allocate(max(1024, len(keep)))
+        self._alive = np.zeros(len(self._vectors), dtype=bool)
+        index, self.index = self.index, None
+        if len(keep):
+            self.add(ids, vectors.astype(np.float32), texts, metadatas)
+        if index is not None and index.trained:
+            self.index = index
+            index.add(0, self._vectors[:self.count].astype(np.float32))
+        self.flush()
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, id: str) -> bool:
+        return id in self._rows
+
+    def vectors(self) -> np.ndarray:
+        """全部行的向量（包括已删除的），内存映射时不会读入内存"""
+        return self._vectors[:self.count]
+
+    def build_index(self, nlist: Optional[int] = None, nprobe: int = 8, **kwargs: Any) -> IVFIndex:
+        """训练 IVF 索引，nlist 默认取 sqrt(行数)"""
+        nlist = nlist or max(1, int(np.sqrt(max(1, self.count))))
+        index = IVFIndex(nlist=nlist, nprobe=nprobe, **kwargs)
+        alive = np.flatnonzero(self._alive[:self.count])
+        sample = alive if len(alive) <= index.sample else \
+            np.sort(np.random.default_rng(index.seed).choice(alive, index.sample, replace=False))
+        index.train(self._vectors[sample].astype(np.float32))
+        for start in range(0, self.count, self.block_rows):
+            index.add(start, self._vectors[start:min(self.count, start + self.block_rows)].astype(np.float32))
+        self.index = index
+        return index
+
+    def search(self, queries: np.ndarray, k: int = 4, exact: bool = False,
+               nprobe: Optional[int] = None, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        检索与查询向量最相似的 k 行
+        :param queries: (q, dim) 或 (dim,) 的查询向量
+        :param exact: 为 True 时忽略索引，全量扫描
+        :param rows: 只在这些行中精确检索（如按元数据筛出的行），为空时检索全部行
+        :return: (分数, 行号)，形状均为 (q, k)，按分数降序；结果不足 k 条时行号为 -1
+        """
+        queries = normalize(queries).reshape(-1, self.dim)
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            results = [self._search_rows(query, rows, k) for query in queries]
+        elif self.index is not None and self.index.trained and not exact:
+            results = [self._search_rows(query, self.index.candidates(query, nprobe), k) for query in queries]
+        else:
+            results = [self._search_all(queries, k)]
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        offset = 0
+        for result_scores, result_rows in results:
+            n, found = result_scores.shape
+            scores[offset:offset + n, :found] = result_scores
+            rows[offset:offset + n, :found] = result_rows
+            offset += n
+        rows[~np.isfinite(scores)] = -1
+        return scores, rows
+
+    def _search_all(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        # 按块扫描：每块转换为 float32 后与全部查询做一次矩阵乘法，块内先取 top-k 再与已有结果合并
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, self.count, self.block_rows):
+            end = min(self.count, start + self.block_rows)
+            scores = queries @ self._vectors[start:end].astype(np.float32, copy=False).T
+            alive = self._alive[start:end]
+            if not alive.all():
+                scores[:, ~alive] = -np.inf
+            scores, rows = _top_k(scores, k)
+            best_scores, index = _top_k(np.concatenate([best_scores, scores], axis=1), k)
+            best_rows = np.take_along_axis(np.concatenate([best_rows, rows + start], axis=1), index, axis=1)
+        return best_scores, best_rows
+
+    def _search_rows(self, query: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows = rows[self._alive[rows]]
+        rows.sort()  # 按行号顺序读取内存映射文件，减少随机访问
+        scores = self._vectors[rows].astype(np.float32, copy=False) @ query
+        scores, index = _top_k(scores[None, :], k)
+        return scores, rows[index]
+
+    def get(self, row: int) -> Dict[str, Any]:
+        return {"id": self.ids[row], "text": self.texts[row], "metadata": self.metadatas[row]}
+
+    def row(self, id: str) -> Optional[int]:
+        """id 所在的行号，不存在或已删除时为 None"""
+        return self._rows.get(id)
+
+
+class Reranker:
+    """
+    DashScope 文本排序接口（gte-rerank-v2）
+
+    候选文档按 batch_size 分批，最多 max_concurrency 个批次同时请求，合并各批的分数后排序；
+    各批分数由同一个模型独立打分，可以直接比较
+    """
+
+    def __init__(self, model: str = ALI_TONGYI_RERANK_MODEL, url: str = DASHSCOPE_RERANK_URL,
+                 api_key: Optional[str] = None, batch_size: int = 50, max_concurrency: int = 4,
+                 timeout: float = 30.0):
+        import httpx
+
+        if api_key is None:
+            from common_ai.settings import get_settings
+
+            secret = get_settings().profile(model).api_key
+            api_key = secret.get_secret_value() if secret else None
+        self.model = model
+        self.url = url
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._client = httpx.Client(headers=headers, timeout=timeout,
+                                    limits=httpx.Limits(max_connections=max_concurrency))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self.calls = 0
+
+    def _score(self, query: str, documents: List[str]) -> List[float]:
+        response = self._client.post(self.url, json={
+            "model": self.model,
+            "input": {"query": query, "documents": documents},
+            "parameters": {"top_n": len(documents), "return_documents": False},
+        })
+        response.raise_for_status()
+        self.calls += 1
+        scores = [0.0] * len(documents)
+        for item in response.json()["output"]["results"]:
+            scores[item["index"]] = item["relevance_score"]
+        return scores
+
+    def scores(self, query: str, documents: Sequence[str]) -> List[float]:
+        """每个文档与查询的相关性分数，顺序与 documents 相同"""
+        batches = [list(documents[i:i + self.batch_size]) for i in range(0, len(documents), self.batch_size)]
+        if len(batches) <= 1 or self.max_concurrency <= 1:
+            results = [self._score(query, batch) for batch in batches]
+        else:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="rerank")
+            results = list(self._pool.map(lambda batch: self._score(query, batch), batches))
+        return [score for batch in results for score in batch]
+
+    def rerank(self, query: str, documents: Sequence[str], top_n: Optional[int] = None) -> List[Tuple[int, float]]:
+        """返回 [(文档下标, 分数)]，按分数降序，最多 top_n 个"""
+        scores = self.scores(query, documents)
+        order = sorted(range(len(scores)), key=lambda i: -scores[i])
+        return [(i, scores[i]) for i in order[:top_n]]
+
+    def close(self) -> None:
+        self._client.close()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+class Retriever(BaseRetriever):
+    """
+    向量检索 + 可选的重排序
+
+    参数说明:
+        embeddings: 向量模型
+        store: 向量存储
+        reranker: 重排序模型，为空时直接返回向量检索结果
+        k: 返回的文档数
+        fetch_k: 有重排序时先取回的候选数
+        batch_size、max_concurrency: 写入时向量化的批大小和并发批次数
+
+    返回的 Document.metadata 中带有 id、score（向量相似度），重排序时还有 rerank_score
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    embeddings: Embeddings
+    store: VectorStore
+    reranker: Optional[Reranker] = None
+    k: int = 4
+    fetch_k: int = 20
+    batch_size: int = EMBEDDING_BATCH_SIZE
+    max_concurrency: int = 4
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[Iterable[Dict[str, Any]]] = None,
+                  ids: Optional[Iterable[str]] = None) -> int:
+        """
+        分批向量化并写入，texts、metadatas、ids 可以是生成器；ids 默认为文本的 xxhash
+        :return: 写入的条数
+        """
+        metadatas = iter(metadatas) if metadatas is not None else None
+        ids = iter(ids) if ids is not None else None
+        return self.add_records((next(ids) if ids else text_id(text), text, next(metadatas) if metadatas else {})
+                                for text in texts)
+
+    def add_records(self, records: Iterable[Tuple[str, str, Dict[str, Any]]]) -> int:
+        """
+        分批向量化并写入 (id, 文本, 元数据)，records 可以是生成器，按需取用
+        :return: 写入的条数
+        """
+        pending = deque()
+
+        def source():
+            # 取出文本的同时记下对应的 id 和元数据，向量按相同顺序返回
+            for record in records:
+                pending.append(record)
+                yield record[1]
+
+        written = 0
+        for vectors in embed_batches(self.embeddings, source(), self.batch_size, self.max_concurrency):
+            batch = [pending.popleft() for _ in range(len(vectors))]
+            self.store.add([b[0] for b in batch], vectors, [b[1] for b in batch], [b[2] for b in batch])
+            written += len(batch)
+        return written
+
+    def add_documents(self, documents: Iterable[Document], **kwargs: Any) -> int:
+        documents = list(documents)
+        return self.add_texts([doc.page_content for doc in documents], [doc.metadata for doc in documents],
+                              [doc.id for doc in documents] if all(doc.id for doc in documents) else None)
+
+    def search_batch(self, queries: Sequence[str], k: Optional[int] = None) -> List[List[Document]]:
+        """多个查询一次向量化、一次扫描向量矩阵，再逐个重排序"""
+        k = k or self.k
+        query_vectors = normalize(self.embeddings.embed_documents(list(queries)))
+        fetch_k = max(k, self.fetch_k) if self.reranker is not None else k
+        scores, rows = self.store.search(query_vectors, fetch_k)
+        results = []
+        for query, query_scores, query_rows in zip(queries, scores, rows):
+            candidates = [(int(row), float(score)) for row, score in zip(query_rows, query_scores) if row >= 0]
+            documents = [self._document(row, score) for row, score in candidates]
+            results.append(self.rerank(query, documents, k))
+        return results
+
+    def rerank(self, query: str, documents: List[Document], k: int) -> List[Document]:
+        """有重排序模型时按相关性重排并在 metadata 中记下 rerank_score，返回前 k 个"""
+        if self.reranker is None or not documents:
+            return documents[:k]
+        ranked = self.reranker.rerank(query, [doc.page_content for doc in documents], top_n=k)
+        documents = [documents[i] for i, _ in ranked]
+        for doc, (_, score) in zip(documents, ranked):
+            doc.metadata["rerank_score"] = score
+        return documents
+
+    def _document(self, row: int, score: float) -> Document:
+        record = self.store.get(row)
+        return Document(page_content=record["text"], id=record["id"],
+                        metadata={**record["metadata"], "id": record["id"], "score": score})
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.search_batch([query])[0]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60,
+                           weights: Optional[Sequence[float]] = None) -> List[Tuple[str, float]]:
+    """
+    倒数排名融合（RRF）：文档的分数为各路结果中 weight / (k + 名次) 之和，名次从 1 开始
+    只用名次，不用各路原始分数，向量相似度和 BM25 分数量纲不同也能直接融合
+    :return: [(id, 分数)]，按分数降序
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, id in enumerate(ranking, 1):
+            fused[id] = fused.get(id, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    向量检索 + BM25 关键词检索，倒数排名融合后重排序
+
+    向量检索擅长语义相近的表述，BM25 能精确匹配订单号、商品编号这类标识，两者互补。
+    两路各取 fetch_k 个，RRF 融合后取前 fetch_k 个交给 retriever 的重排序模型（gte-rerank-v2），返回 k 个。
+    查询中有编号时，BM25 结果中精确包含该编号的文档排在融合结果最前面：RRF 只看名次，
+    两路都出现、但名次一般的文档分数会超过只在 BM25 排第一的文档，知识库小时精确命中可能被挤出前 k
+
+    参数说明:
+        retriever: 提供向量模型、向量存储和重排序模型
+        index: 与向量存储同一批文档、相同 id 构建的 BM25Index，文本从向量存储中取
+        k: 返回的文档数
+        fetch_k: 每一路取回的候选数，也是交给重排序的候选数
+        rrf_k: RRF 的平滑常数，越大各名次的分数差距越小
+
+    返回的 Document.metadata 中带有 id、rrf_score、exact_match（是否精确包含查询中的编号），
+    以及 vector_rank、bm25_rank（该路没有命中时为 None），重排序时还有 rerank_score
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    retriever: Retriever
+    index: BM25Index
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def search_batch(self, queries: Sequence[str], k: Optional[int] = None) -> List[List[Document]]:
+        """多个查询一次向量化、一次扫描向量矩阵，BM25 逐个检索，再逐个融合、重排序"""
+        k = k or self.k
+        fetch_k = max(k, self.fetch_k)
+        store = self.retriever.store
+        query_vectors = normalize(self.retriever.embeddings.embed_documents(list(queries)))
+        _, vector_rows = store.search(query_vectors, fetch_k)
+        results = []
+        for query, rows in zip(queries, vector_rows):
+            vector_ids = [store.ids[row] for row in rows if row >= 0]
+            _, bm25_rows = self.index.search(query, fetch_k)
+            bm25_ids = [self.index.ids[row] for row in bm25_rows]
+            exact = {id for id, hit in zip(bm25_ids, self.index.identifier_matches(query, bm25_rows)) if hit}
+            vector_rank = {id: rank for rank, id in enumerate(vector_ids, 1)}
+            bm25_rank = {id: rank for rank, id in enumerate(bm25_ids, 1)}
+            fused = reciprocal_rank_fusion([vector_ids, bm25_ids], self.rrf_k)
+            if exact:
+                # 稳定排序：精确命中编号的文档在前，各自保持 RRF 的顺序
+                fused.sort(key=lambda item: item[0] not in exact)
+            documents = []
+            for id, score in fused[:fetch_k]:
+                row = store.row(id)
+                if row is None:
+                    continue
+                record = store.get(row)
+                documents.append(Document(page_content=record["text"], id=id, metadata={
+                    **record["metadata"], "id": id, "rrf_score": score, "exact_match": id in exact,
+                    "vector_rank": vector_rank.get(id), "bm25_rank": bm25_rank.get(id)}))
+            results.append(self.retriever.rerank(query, documents, k))
+        return results
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.search_batch([query])[0]
@@ -0,0 +1,26 @@
+#按路径加载仓库中的示例脚本（文件名以数字开头，不能直接 import）
+#用于基准测试复用示例中定义的函数和链
+import contextlib
+import importlib.util
+import io
+import os
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def load_script(relative_path: str, quiet: bool = True):
+    """
+    加载示例脚本并返回模块对象
+    :param relative_path: 相对仓库根目录的路径，如 "phase1_basic/03_langchain_lamdba/02_runnable_parallel.py"
+    :param quiet: 是否屏蔽脚本在导入时的打印输出
+    """
+    # 示例脚本在导入时会创建 ChatTongyi，没有配置密钥时使用占位值
+    os.environ.setdefault("DASHSCOPE_API_KEY", "fake-key")
+    path = REPO_ROOT / relative_path
+    name = "_script_" + path.stem
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        spec.loader.exec_module(module)
+    return module
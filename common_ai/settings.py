@@ -0,0 +1,360 @@
+#模型配置：每个模型一份不可变的配置（地址、超时、并发、RPM/TPM 配额、缓存策略、流式默认值）
+#进程内只加载一次，之后 get_settings() 只是读取一个引用；配置文件修改后由 SettingsWatcher 重新加载并整体替换，
+#正在运行的工作线程不需要重启，下一次调用 get_settings() 就能拿到新配置。
+#新配置校验失败时保留旧配置，不会让进程带着半份配置运行
+#
+#配置文件（YAML/JSON/TOML）示例见 phase5_optimization/13_settings/ai_settings.yaml:
+#    default_model: qwen-max-latest
+#    defaults: {timeout: 30, max_concurrency: 8}
+#    models:
+#      qwen-max-latest: {rpm: 600, tpm: 1000000, cache: {enabled: true}}
+#      deepseek-v3: {timeout: 60, max_concurrency: 4}
+#
+#用法:
+#    profile = get_settings().profile("qwen-max-latest")
+#    model = ChatOpenAI(**profile.chat_kwargs())
+#    watcher = watch_settings("ai_settings.yaml")   # 文件修改后自动生效
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, SecretStr, ValidationError, model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from common_ai.ai_variable import (
+    ALI_TONGYI_API_KEY_OS_VAR_NAME,
+    ALI_TONGYI_DEEPSEEK_R1,
+    ALI_TONGYI_DEEPSEEK_V3,
+    ALI_TONGYI_MAX_MODEL,
+    ALI_TONGYI_REASONER_MODEL,
+)
+
+DEFAULT_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+# 指定配置文件路径的环境变量
+SETTINGS_FILE_VAR_NAME = "AI_SETTINGS_FILE"
+# 没有在配置文件中出现也会生成配置的模型
+KNOWN_MODELS = [ALI_TONGYI_MAX_MODEL, ALI_TONGYI_DEEPSEEK_R1, ALI_TONGYI_DEEPSEEK_V3, ALI_TONGYI_REASONER_MODEL]
+
+
+class CachePolicy(BaseModel):
+    """模型响应缓存策略"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    enabled: bool = False
+    ttl_seconds: float = Field(3600.0, gt=0)
+    max_entries: int = Field(10_000, ge=0)
+
+
+class StreamingDefaults(BaseModel):
+    """流式输出默认值，max_chars、max_delay 对应 CoalescingStream 的合并参数"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    enabled: bool = True
+    max_chars: int = Field(256, gt=0)
+    max_delay: float = Field(0.02, ge=0)
+
+
+class ModelProfile(BaseModel):
+    """单个模型的配置，创建后不可修改"""
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    model: str
+    base_url: str = DEFAULT_BASE_URL
+    api_key_env: str = ALI_TONGYI_API_KEY_OS_VAR_NAME
+    # 加载配置时从 api_key_env 指定的环境变量读取一次，之后不再调用 os.getenv
+    api_key: Optional[SecretStr] = Field(
+        default_factory=lambda data: os.getenv(data["api_key_env"]), validate_default=True, repr=False)
+    timeout: float = Field(60.0, gt=0)
+    max_retries: int = Field(2, ge=0)
+    max_concurrency: int = Field(8, ge=1)
+    rpm: Optional[int] = Field(None, gt=0)  # 每分钟请求数配额
+    tpm: Optional[int] = Field(None, gt=0)  # 每分钟 token 数配额
+    temperature: Optional[float] = Field(None, ge=0, le=2)
+    cache: CachePolicy = CachePolicy()
+    streaming: StreamingDefaults = StreamingDefaults()
+
+    @property
+    def requests_per_second(self) -> Optional[float]:
+        """RPM 换算成每秒请求数，可以直接传给 SharedRateLimiter"""
+        return self.rpm / 60 if self.rpm else None
+
+    def chat_kwargs(self) -> Dict[str, Any]:
+        """ChatOpenAI 的构造参数"""
+        kwargs = {
+            "model": self.model,
+            "base_url": self.base_url,
+            "api_key": self.api_key,
+            "timeout": self.timeout,
+            "max_retries": self.max_retries,
+            "streaming": self.streaming.enabled,
+        }
+        if self.temperature is not None:
+            kwargs["temperature"] = self.temperature
+        return kwargs
+
+
+def _merge(defaults: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """模型配置覆盖公共默认值，cache、streaming 这类嵌套配置逐项合并"""
+    merged = dict(defaults)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = {**merged[key], **value}
+        merged[key] = value
+    return merged
+
+
+class AISettings(BaseSettings):
+    """
+    全部模型配置
+
+    参数来源（优先级从高到低）: 配置文件 > 环境变量(AI_ 前缀，嵌套字段用 __ 分隔) > 默认值
+    base_url 兼容原来的 ALI_TONGYI_URL 环境变量
+    """
+    model_config = SettingsConfigDict(env_prefix="AI_", env_nested_delimiter="__", frozen=True, extra="ignore",
+                                      validate_by_name=True)
+
+    base_url: str = Field(DEFAULT_BASE_URL, validation_alias=AliasChoices("AI_BASE_URL", "ALI_TONGYI_URL"))
+    default_model: str = ALI_TONGYI_MAX_MODEL
+    # 所有模型共用的默认值，字段同 ModelProfile
+    defaults: Dict[str, Any] = {}
+    models: Dict[str, ModelProfile] = {}
+    version: int = 0  # 第几次加载，每次热更新加一
+
+    @model_validator(mode="before")
+    @classmethod
+    def _build_profiles(cls, data: Any) -> Any:
+        # 模型配置 = 全局 base_url + defaults + 模型自己的配置
+        if not isinstance(data, dict):
+            return data
+        base_url = next((data[key] for key in ("base_url", "AI_BASE_URL", "ALI_TONGYI_URL") if data.get(key)), None)
+        base = {"base_url": base_url or DEFAULT_BASE_URL}
+        # 形状不对时抛 ValueError，由 pydantic 转成 ValidationError，而不是在合并时抛出 AttributeError/TypeError
+        for key in ("defaults", "models"):
+            if not isinstance(data.get(key) or {}, dict):
+                raise ValueError(f"{key} 必须是映射，实际是 {type(data[key]).__name__}")
+        defaults = _merge(base, data.get("defaults") or {})
+        models = dict.fromkeys(KNOWN_MODELS, {})
+        models.update(data.get("models") or {})
+        for name, profile in models.items():
+            if not isinstance(profile or {}, (dict, ModelProfile)):
+                raise ValueError(f"models.{name} 必须是映射，实际是 {type(profile).__name__}")
+        data = dict(data)
+        data["models"] = {
+            name: profile if isinstance(profile, ModelProfile) else _merge(defaults, {"model": name, **(profile or {})})
+            for name, profile in models.items()
+        }
+        return data
+
+    def profile(self, name: Optional[str] = None) -> ModelProfile:
+        """取模型配置，未配置的模型使用 defaults 生成"""
+        name = name or self.default_model
+        profile = self.models.get(name)
+        if profile is None:
+            profile = ModelProfile(**_merge(_merge({"base_url": self.base_url}, self.defaults), {"model": name}))
+        return profile
+
+
+def parse_settings(text: str, suffix: str) -> Dict[str, Any]:
+    """按扩展名解析 YAML/JSON/TOML 格式的配置"""
+    if suffix in (".yaml", ".yml"):
+        import yaml
+
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError(f"YAML 格式错误: {e}") from e
+    elif suffix == ".toml":
+        import tomllib
+
+        data = tomllib.loads(text)
+    elif suffix == ".json":
+        data = json.loads(text) if text.strip() else None
+    else:
+        raise ValueError(f"不支持的配置文件格式: {suffix}，可选 .yaml/.yml/.json/.toml")
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        raise ValueError("配置文件顶层必须是映射")
+    return data
+
+
+def read_settings_file(path: Union[str, Path]) -> Dict[str, Any]:
+    """读取配置文件，格式由扩展名决定"""
+    path = Path(path)
+    return parse_settings(path.read_text(encoding="utf-8"), path.suffix)
+
+
+def load_settings(path: Union[str, Path, None] = None, version: int = 0) -> AISettings:
+    """读取并校验配置，path 为空时只使用环境变量和默认值；校验失败抛出 ValidationError"""
+    data = read_settings_file(path) if path else {}
+    return AISettings(**{**data, "version": version})
+
+
+_current: Optional[AISettings] = None
+_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_listeners: List[Callable[[AISettings, AISettings], None]] = []
+
+
+def get_settings() -> AISettings:
+    """
+    当前配置。第一次调用时加载（AI_SETTINGS_FILE 指定的文件，没有则只用环境变量），之后直接返回同一个对象
+    每次请求都可以调用，热更新后返回新对象；同一次请求内应保存返回值，避免前后读到两份不同的配置
+    """
+    settings = _current
+    if settings is None:
+        with _lock:
+            if _current is None:
+                _swap(load_settings(os.getenv(SETTINGS_FILE_VAR_NAME)))
+            settings = _current
+    return settings
+
+
+def _swap(settings: AISettings) -> Optional[AISettings]:
+    global _current
+    old, _current = _current, settings
+    return old
+
+
+def set_settings(settings: AISettings) -> None:
+    """替换当前配置并通知监听者（监听者在调用线程中执行，异常不影响替换）"""
+    with _lock:
+        old = _swap(settings)
+        listeners = list(_listeners)
+    if old is not None:
+        for listener in listeners:
+            try:
+                listener(old, settings)
+            except Exception:
+                pass
+
+
+def on_settings_change(listener: Callable[[AISettings, AISettings], None]) -> Callable[[], None]:
+    """注册配置变化监听 listener(old, new)，如按新的 rpm 调整限流器；返回取消注册的函数"""
+    with _lock:
+        _listeners.append(listener)
+    return lambda: _listeners.remove(listener)
+
+
+def reload_settings(path: Union[str, Path, None] = None, skip_empty: bool = False) -> Optional[AISettings]:
+    """
+    重新加载配置，失败时抛出异常并保留当前配置
+    多个线程同时调用时依次执行，后读取文件的一定后生效，不会被先读取的旧内容覆盖
+    skip_empty: 文件为空时不加载，返回 None
+    """
+    path = path or os.getenv(SETTINGS_FILE_VAR_NAME)
+    with _reload_lock:
+        data = {}
+        if path:
+            path = Path(path)
+            text = path.read_text(encoding="utf-8")
+            if skip_empty and not text.strip():
+                return None
+            data = parse_settings(text, path.suffix)
+        current = _current
+        settings = AISettings(**{**data, "version": current.version + 1 if current else 0})
+        set_settings(settings)
+    return settings
+
+
+class SettingsWatcher:
+    """
+    监视配置文件，修改后重新加载
+
+    - 用 watchdog 监视文件所在目录：编辑器常见的"写临时文件再改名"也能捕获
+    - Linux(inotify) 上只在文件写完关闭或改名后加载，其他平台没有关闭事件，退回到 modified 事件
+    - 直接覆盖写入时文件会短暂为空，空文件本身是合法配置（全部使用默认值），所以热更新时跳过空文件；
+      修改配置推荐先写临时文件再改名
+    - 连续多次写入在 debounce 秒内只加载一次
+    - 新文件读取或校验失败时保留当前配置，错误记录在 errors/last_error 中
+    """
+
+    def __init__(self, path: Union[str, Path], debounce: float = 0.1,
+                 on_error: Optional[Callable[[Exception], None]] = None):
+        self.path = Path(path).resolve()
+        self.debounce = debounce
+        self.on_error = on_error
+        self.reloads = 0
+        self.errors = 0
+        self.skipped = 0
+        self.last_error: Optional[Exception] = None
+        self._timer: Optional[threading.Timer] = None
+        self._timer_lock = threading.Lock()
+        self._observer = None
+
+    def start(self) -> "SettingsWatcher":
+        from watchdog.events import EVENT_TYPE_CLOSED, EVENT_TYPE_CREATED, EVENT_TYPE_MODIFIED, EVENT_TYPE_MOVED
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        watcher = self
+        self._observer = Observer()
+        if type(self._observer).__name__ == "InotifyObserver":
+            triggers = {EVENT_TYPE_CLOSED, EVENT_TYPE_MOVED}
+        else:
+            triggers = {EVENT_TYPE_MODIFIED, EVENT_TYPE_CREATED, EVENT_TYPE_MOVED}
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type not in triggers:
+                    return
+                paths = {event.src_path, getattr(event, "dest_path", "")}
+                if str(watcher.path) in {os.path.abspath(p) for p in paths if p}:
+                    watcher._schedule()
+
+        self._observer.schedule(_Handler(), str(self.path.parent), recursive=False)
+        self._observer.daemon = True
+        self._observer.start()
+        return self
+
+    def _schedule(self) -> None:
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self.reload)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def reload(self) -> bool:
+        """
+        立即重新加载，成功返回 True；文件为空（正在被覆盖写入）时跳过，写完后的事件会再次触发加载
+        加载失败时保留当前配置并记录错误，任何异常都不会抛出，避免计时器线程退出后不再热更新
+        """
+        try:
+            if reload_settings(self.path, skip_empty=True) is None:
+                self.skipped += 1
+                return False
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+            if self.on_error is not None:
+                self.on_error(e)
+            return False
+        self.reloads += 1
+        return True
+
+    def stop(self) -> None:
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def __enter__(self) -> "SettingsWatcher":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def watch_settings(path: Union[str, Path, None] = None, **kwargs: Any) -> SettingsWatcher:
+    """加载配置文件并开始监视，path 为空时使用 AI_SETTINGS_FILE"""
+    path = path or os.getenv(SETTINGS_FILE_VAR_NAME)
+    if not path:
+        raise ValueError(f"没有指定配置文件，请传入 path 或设置环境变量 {SETTINGS_FILE_VAR_NAME}")
+    reload_settings(path)
+    return SettingsWatcher(path, **kwargs).start()
@@ -0,0 +1,286 @@
+#流式调用的首 token 延迟(TTFT)与 token 间隔统计
+#回调处理器，挂在 config["callbacks"] 上即可，链条（chain.stream）和智能体（create_agent）内部的模型调用都会触发：
+#- 每次模型调用记录开始、首个 token、每个 chunk 到达和结束的时间
+#- 计算 TTFT、生成速度(token/s)、token 间隔以及超过阈值的卡顿
+#- 按模型汇总成直方图，导出为 Prometheus 文本格式，或同时写入 OpenTelemetry 的 Histogram
+#
+#用法:
+#    metrics = StreamLatencyCallback()
+#    for chunk in chain.stream({"topic": "大数据"}, config={"callbacks": [metrics]}):
+#        ...
+#    print(metrics.to_prometheus())
+import bisect
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# 秒级延迟的默认分桶，覆盖从几毫秒的 token 间隔到几十秒的长回复
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RATE_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 200, 500, 1000, 2000)
+
+
+class Histogram:
+    """Prometheus 风格的累计直方图：每个上界一个计数，另外记录总和与总数"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """按分桶估算分位数，返回所在桶的上界"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class CallTiming:
+    """一次模型调用的时间线，时间均为 time.perf_counter()"""
+
+    __slots__ = ("model", "start", "chunks", "end", "tokens", "error")
+
+    def __init__(self, model: str, start: float):
+        self.model = model
+        self.start = start
+        self.chunks: List[float] = []
+        self.end: Optional[float] = None
+        self.tokens = 0
+        self.error = False
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return self.chunks[0] - self.start if self.chunks else None
+
+    @property
+    def gaps(self) -> List[float]:
+        return [b - a for a, b in zip(self.chunks, self.chunks[1:])]
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """首 token 之后的生成速度，不含排队和首 token 等待"""
+        if self.end is None or len(self.chunks) < 2:
+            return None
+        elapsed = self.end - self.chunks[0]
+        return (self.tokens - 1) / elapsed if elapsed > 0 else None
+
+
+def _model_name(serialized: Optional[Dict[str, Any]], metadata: Optional[Dict[str, Any]],
+                invocation_params: Optional[Dict[str, Any]]) -> str:
+    # 优先使用 langchain 填充的 ls_model_name，其次是调用参数中的模型名
+    if metadata and metadata.get("ls_model_name"):
+        return str(metadata["ls_model_name"])
+    params = invocation_params or {}
+    name = params.get("model") or params.get("model_name")
+    if name:
+        return str(name)
+    return (serialized or {}).get("name") or "unknown"
+
+
+class _ModelStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.stalls = 0
+        self.tokens = 0
+        self.ttft = Histogram(LATENCY_BUCKETS)
+        self.inter_token = Histogram(LATENCY_BUCKETS)
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.tokens_per_second = Histogram(RATE_BUCKETS)
+
+
+class StreamLatencyCallback(BaseCallbackHandler):
+    """
+    统计流式调用的 TTFT、token 间隔和生成速度
+
+    参数说明:
+        stall_threshold: token 间隔超过这个时间(秒)记为一次卡顿
+        keep_calls: 保留最近多少次调用的完整时间线（含每个 chunk 的到达时间），0 表示不保留
+        meter: OpenTelemetry 的 Meter，传入后每个观测值同时写入同名 Histogram
+    """
+
+    # 同步执行，异步链条中也不切换线程，每个 token 的开销只有几次字典和列表操作
+    run_inline = True
+
+    def __init__(self, stall_threshold: float = 0.5, keep_calls: int = 0, meter: Any = None):
+        self.stall_threshold = stall_threshold
+        self.calls: Deque[CallTiming] = deque(maxlen=keep_calls)
+        self._active: Dict[UUID, CallTiming] = {}
+        self._models: Dict[str, _ModelStats] = defaultdict(_ModelStats)
+        self._lock = threading.Lock()
+        self._otel = _otel_instruments(meter) if meter is not None else None
+
+    # ------------------------------------------------------------------
+    # 回调
+    # ------------------------------------------------------------------
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        model = _model_name(serialized, metadata, kwargs.get("invocation_params"))
+        self._active[run_id] = CallTiming(model, time.perf_counter())
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID,
+                     metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        model = _model_name(serialized, metadata, kwargs.get("invocation_params"))
+        self._active[run_id] = CallTiming(model, time.perf_counter())
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        timing = self._active.get(run_id)
+        if timing is not None and token:
+            timing.chunks.append(time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        timing = self._active.pop(run_id, None)
+        if timing is None:
+            return
+        timing.end = time.perf_counter()
+        timing.tokens = _output_tokens(response) or len(timing.chunks)
+        self._observe(timing)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        timing = self._active.pop(run_id, None)
+        if timing is None:
+            return
+        timing.end = time.perf_counter()
+        timing.error = True
+        with self._lock:
+            self._models[timing.model].errors += 1
+            self.calls.append(timing)
+
+    def _observe(self, timing: CallTiming) -> None:
+        ttft = timing.ttft
+        gaps = timing.gaps
+        rate = timing.tokens_per_second
+        with self._lock:
+            stats = self._models[timing.model]
+            stats.requests += 1
+            stats.tokens += timing.tokens
+            stats.duration.observe(timing.end - timing.start)
+            if ttft is not None:
+                stats.ttft.observe(ttft)
+            for gap in gaps:
+                stats.inter_token.observe(gap)
+                if gap > self.stall_threshold:
+                    stats.stalls += 1
+            if rate is not None:
+                stats.tokens_per_second.observe(rate)
+            self.calls.append(timing)
+        if self._otel is not None:
+            attributes = {"model": timing.model}
+            self._otel["duration"].record(timing.end - timing.start, attributes)
+            if ttft is not None:
+                self._otel["ttft"].record(ttft, attributes)
+            for gap in gaps:
+                self._otel["inter_token"].record(gap, attributes)
+            if rate is not None:
+                self._otel["tokens_per_second"].record(rate, attributes)
+
+    # ------------------------------------------------------------------
+    # 汇总与导出
+    # ------------------------------------------------------------------
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """每个模型的请求数、卡顿次数和 TTFT/token 间隔的 p50、p99（按分桶估算）"""
+        with self._lock:
+            return {
+                model: {
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "tokens": stats.tokens,
+                    "stalls": stats.stalls,
+                    "ttft_p50": stats.ttft.quantile(0.5),
+                    "ttft_p99": stats.ttft.quantile(0.99),
+                    "inter_token_p50": stats.inter_token.quantile(0.5),
+                    "inter_token_p99": stats.inter_token.quantile(0.99),
+                    "tokens_per_second_avg": stats.tokens_per_second.sum / stats.tokens_per_second.count
+                    if stats.tokens_per_second.count else 0.0,
+                }
+                for model, stats in self._models.items()
+            }
+
+    def to_prometheus(self, prefix: str = "llm") -> str:
+        """导出为 Prometheus 文本格式，可以直接作为 /metrics 接口的响应"""
+        lines: List[str] = []
+        with self._lock:
+            models = sorted(self._models.items())
+            for name, kind, help_text in (
+                ("requests_total", "counter", "模型调用次数"),
+                ("errors_total", "counter", "模型调用失败次数"),
+                ("output_tokens_total", "counter", "输出 token 数"),
+                ("stalls_total", "counter", "token 间隔超过阈值的次数"),
+            ):
+                lines.append(f"# HELP {prefix}_{name} {help_text}")
+                lines.append(f"# TYPE {prefix}_{name} {kind}")
+                attribute = {"requests_total": "requests", "errors_total": "errors",
+                             "output_tokens_total": "tokens", "stalls_total": "stalls"}[name]
+                for model, stats in models:
+                    lines.append(f'{prefix}_{name}{{model="{_escape(model)}"}} {getattr(stats, attribute)}')
+            for name, attribute, help_text in (
+                ("time_to_first_token_seconds", "ttft", "首 token 延迟"),
+                ("inter_token_seconds", "inter_token", "相邻 token 的到达间隔"),
+                ("request_duration_seconds", "duration", "模型调用总耗时"),
+                ("tokens_per_second", "tokens_per_second", "首 token 之后的生成速度"),
+            ):
+                lines.append(f"# HELP {prefix}_{name} {help_text}")
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                for model, stats in models:
+                    lines.extend(_histogram_lines(f"{prefix}_{name}", _escape(model), getattr(stats, attribute)))
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._models.clear()
+            self.calls.clear()
+
+
+def _output_tokens(response: LLMResult) -> int:
+    """优先使用模型返回的 usage，流式调用没有 usage 时按 chunk 数计"""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage and usage.get("output_tokens"):
+                return usage["output_tokens"]
+    return 0
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(name: str, model: str, histogram: Histogram) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{model="{model}",le="{bound:g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{model="{model}",le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{model="{model}"}} {histogram.sum:.6f}')
+    lines.append(f'{name}_count{{model="{model}"}} {histogram.count}')
+    return lines
+
+
+def _otel_instruments(meter: Any) -> Dict[str, Any]:
+    """在传入的 OpenTelemetry Meter 上创建对应的 Histogram，未安装 opentelemetry 时不会走到这里"""
+    return {
+        "ttft": meter.create_histogram("llm.time_to_first_token", unit="s", description="首 token 延迟"),
+        "inter_token": meter.create_histogram("llm.inter_token", unit="s", description="相邻 token 的到达间隔"),
+        "duration": meter.create_histogram("llm.request.duration", unit="s", description="模型调用总耗时"),
+        "tokens_per_second": meter.create_histogram("llm.tokens_per_second", unit="{token}/s",
+                                                    description="首 token 之后的生成速度"),
+    }
@@ -0,0 +1,259 @@
+#流式输出合并：把 chain.stream / astream 的细碎 chunk 按大小或时间窗口合并后再写出
+#- 每个 chunk 单独 write + flush 时，1000 个 token 就是 1000 次系统调用；合并后按 max_chars 或 max_delay 刷新一次
+#- 第一个 chunk 默认立即刷新，不增加首字延迟
+#- 生产者和消费者之间是有界队列：消费者（终端、慢客户端）跟不上时生产者阻塞，不再从上游拉取，内存不会无限增长；
+#  积压的 chunk 在下一次刷新时合并成一大块写出
+#
+#用法:
+#    for text in CoalescingStream(chain.stream({"topic": "大数据"}), max_delay=0.02):
+#        print(text, end="", flush=True)
+#
+#    async def handler(request):
+#        return await stream_sse(request, chain.astream({"topic": "大数据"}))
+import asyncio
+import json
+import queue
+import threading
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional
+
+from aiohttp import web
+
+_END = object()
+
+
+class _Failure:
+    """上游抛出的异常，通过队列转交给消费者重新抛出"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def chunk_text(chunk: Any) -> str:
+    """StrOutputParser 输出字符串，直接流式调用模型时是 AIMessageChunk"""
+    if isinstance(chunk, str):
+        return chunk
+    content = getattr(chunk, "content", chunk)
+    return content if isinstance(content, str) else str(content)
+
+
+class _Buffer:
+    """合并缓冲区：累计到 max_chars 或从第一个 chunk 起超过 max_delay 时需要刷新"""
+
+    def __init__(self, max_chars: int, max_delay: float, flush_first: bool):
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self.pending_first = flush_first
+        self.parts: List[str] = []
+        self.size = 0
+        self.deadline: Optional[float] = None
+
+    def add(self, text: str, now: float) -> bool:
+        self.parts.append(text)
+        self.size += len(text)
+        if self.deadline is None:
+            self.deadline = now + self.max_delay
+        if self.pending_first:
+            self.pending_first = False
+            return True
+        return self.size >= self.max_chars or now >= self.deadline
+
+    def timeout(self, now: float) -> Optional[float]:
+        """距离刷新时刻还有多久，缓冲区为空时返回 None（一直等待）"""
+        return None if self.deadline is None else max(0.0, self.deadline - now)
+
+    def take(self) -> str:
+        text = "".join(self.parts)
+        self.parts = []
+        self.size = 0
+        self.deadline = None
+        return text
+
+
+class _StreamStats:
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.chunks = 0
+        self.flushes = 0
+        self.peak_pending = 0
+        self.backpressure_waits = 0
+
+    def stats(self) -> dict:
+        """chunks: 上游 chunk 数；flushes: 合并后的写出次数；backpressure_waits: 生产者因队列满而等待的次数"""
+        return {
+            "chunks": self.chunks,
+            "flushes": self.flushes,
+            "chunks_per_flush": self.chunks / self.flushes if self.flushes else 0.0,
+            "peak_pending": self.peak_pending,
+            "max_pending": self.max_pending,
+            "backpressure_waits": self.backpressure_waits,
+        }
+
+
+class CoalescingStream(_StreamStats):
+    """
+    同步迭代器：后台线程从 source 拉取 chunk 放入有界队列，迭代时按大小或时间窗口合并后返回
+
+    参数说明:
+        source: chain.stream(...) 等同步迭代器，chunk 为字符串或消息 chunk
+        max_chars: 缓冲区达到这么多字符立即刷新
+        max_delay: 缓冲区中最早的 chunk 最多等待多久(秒)就刷新
+        max_pending: 队列中最多积压多少个 chunk，超过后生产者阻塞
+        flush_first: 第一个 chunk 立即刷新，保证首字延迟不变
+    """
+
+    def __init__(self, source: Iterable[Any], max_chars: int = 256, max_delay: float = 0.02,
+                 max_pending: int = 64, flush_first: bool = True):
+        super().__init__(max_pending)
+        self._source = source
+        self._buffer = _Buffer(max_chars, max_delay, flush_first)
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_pending)
+        self._closed = threading.Event()
+
+    def _put(self, item: Any) -> bool:
+        if self._queue.full():
+            self.backpressure_waits += 1
+        # 带超时轮询，消费者提前退出时生产者线程也能结束
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self) -> None:
+        try:
+            for chunk in self._source:
+                if not self._put(chunk_text(chunk)):
+                    return
+            self._put(_END)
+        except BaseException as e:
+            self._put(_Failure(e))
+
+    def __iter__(self) -> Iterator[str]:
+        return self._run()
+
+    def _run(self) -> Iterator[str]:
+        buffer = self._buffer
+        threading.Thread(target=self._produce, name="coalescing-stream", daemon=True).start()
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=buffer.timeout(time.monotonic()))
+                except queue.Empty:
+                    # 时间窗口到了，上游还没有新的 chunk
+                    self.flushes += 1
+                    yield buffer.take()
+                    continue
+                self.peak_pending = max(self.peak_pending, self._queue.qsize() + 1)
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    if buffer.parts:
+                        self.flushes += 1
+                        yield buffer.take()
+                    raise item.error
+                if not item:
+                    continue
+                self.chunks += 1
+                if buffer.add(item, time.monotonic()):
+                    self.flushes += 1
+                    yield buffer.take()
+            if buffer.parts:
+                self.flushes += 1
+                yield buffer.take()
+        finally:
+            self._closed.set()
+
+
+class AsyncCoalescingStream(_StreamStats):
+    """异步版本：生产者是事件循环中的任务，参数含义与 CoalescingStream 相同"""
+
+    def __init__(self, source: AsyncIterable[Any], max_chars: int = 256, max_delay: float = 0.02,
+                 max_pending: int = 64, flush_first: bool = True):
+        super().__init__(max_pending)
+        self._source = source
+        self._buffer = _Buffer(max_chars, max_delay, flush_first)
+
+    async def _produce(self, pending: asyncio.Queue) -> None:
+        try:
+            async for chunk in self._source:
+                if pending.full():
+                    self.backpressure_waits += 1
+                await pending.put(chunk_text(chunk))
+            await pending.put(_END)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            await pending.put(_Failure(e))
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._run()
+
+    async def _run(self) -> AsyncIterator[str]:
+        buffer = self._buffer
+        loop = asyncio.get_running_loop()
+        pending: asyncio.Queue = asyncio.Queue(maxsize=self.max_pending)
+        producer = asyncio.create_task(self._produce(pending))
+        try:
+            while True:
+                if not pending.empty():
+                    item = pending.get_nowait()
+                else:
+                    timeout = buffer.timeout(loop.time())
+                    try:
+                        item = await (pending.get() if timeout is None else asyncio.wait_for(pending.get(), timeout))
+                    except asyncio.TimeoutError:
+                        self.flushes += 1
+                        yield buffer.take()
+                        continue
+                self.peak_pending = max(self.peak_pending, pending.qsize() + 1)
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    if buffer.parts:
+                        self.flushes += 1
+                        yield buffer.take()
+                    raise item.error
+                if not item:
+                    continue
+                self.chunks += 1
+                if buffer.add(item, loop.time()):
+                    self.flushes += 1
+                    yield buffer.take()
+            if buffer.parts:
+                self.flushes += 1
+                yield buffer.take()
+        finally:
+            producer.cancel()
+
+
+def sse_event(text: str) -> bytes:
+    """一次刷新编码成一个 SSE 事件，JSON 编码后内容中的换行不会截断事件"""
+    return f"data: {json.dumps({'content': text}, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def stream_sse(request: web.Request, source: AsyncIterable[Any], **options: Any) -> web.StreamResponse:
+    """
+    aiohttp 处理函数中以 SSE 返回合并后的流，options 传给 AsyncCoalescingStream
+    response.write 在发送缓冲区满时会等待 drain，慢客户端的背压由此传到上游
+    """
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    async for text in AsyncCoalescingStream(source, **options):
+        await response.write(sse_event(text))
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+
+async def stream_websocket(ws: Any, source: AsyncIterable[Any], **options: Any) -> None:
+    """
+    把合并后的流发送到 WebSocket，每次刷新一条文本消息
+    同时支持 aiohttp 的 WebSocketResponse(send_str) 和 websockets 的连接(send)，两者都会等待发送缓冲区
+    """
+    send = getattr(ws, "send_str", None) or ws.send
+    async for text in AsyncCoalescingStream(source, **options):
+        await send(json.dumps({"content": text}, ensure_ascii=False))
+    await send(json.dumps({"done": True}))
@@ -0,0 +1,138 @@
+#合成客户反馈语料，带情感、分类、紧急程度标签
+#用于本地分类器训练、基准测试和离线演示，不依赖真实数据
+import random
+from typing import List, Optional
+
+CATEGORY_TEMPLATES = {
+    "物流问题": ["物流为什么这么慢，这都{n}天了", "快递一直没更新，配送太慢了", "发货{n}天了还没收到",
+             "快递员没送货上门就签收了", "物流信息{n}天没动了"],
+    "产品质量": ["收到的商品有破损，质量太差了", "用了{n}天就坏了", "做工很粗糙，有明显瑕疵",
+             "东西收到就不能用", "质量跟描述完全不一样"],
+    "客户服务": ["客服态度很差，一直不理人", "联系客服{n}次都没人回复", "客服响应太慢了",
+             "客服回复很敷衍", "人工服务一直排队"],
+    "支付问题": ["重复扣款了，请核实", "付款失败但是钱被扣了", "多扣了{n}元",
+             "账单金额不对", "支付页面一直报错"],
+    "退货退款": ["申请退货{n}天了还没处理", "退款一直没到账", "退货流程太复杂了",
+             "想换货但是找不到入口", "退回的商品已签收，退款呢"],
+    "其他": ["请问有没有发票", "建议增加更多颜色", "想了解一下会员活动",
+           "你们的店铺什么时候上新", "请问可以开具电子发票吗"],
+}
+POSITIVE_TEMPLATES = ["客服态度很好，问题解决得很快，谢谢！", "物流很快，{n}天就到了，非常满意",
+                      "质量很好，推荐购买", "退款很快就到账了，点赞", "商品不错，会回购的"]
+POSITIVE_CATEGORIES = ["客户服务", "物流问题", "产品质量", "退货退款", "其他"]
+# 褒贬混合的反馈，大模型判断也常常不一致
+MIXED_TEMPLATES = ["物流很快，但是质量太差了", "东西还行，就是客服态度一般", "价格不错，可惜发货有点慢",
+                   "质量挺好，但是退款流程太麻烦", "整体满意，只是包装有点破损"]
+MIXED_CATEGORIES = [["产品质量"], ["客户服务"], ["物流问题"], ["退货退款"], ["物流问题", "产品质量"]]
+URGENT_SUFFIXES = ["请马上处理！", "再不处理我就投诉了", "很紧急，请立刻回复"]
+MILD_SUFFIXES = ["", "。", "，麻烦看一下", "，怎么回事？", "，希望尽快解决"]
+
+
+def generate_feedback(count: int, seed: Optional[int] = 0, mixed_ratio: float = 0.15,
+                      noise: float = 0.03) -> List[dict]:
+    """
+    生成合成客户反馈
+    :param count: 数量
+    :param seed: 随机种子
+    :param mixed_ratio: 混合两个问题类型的比例（这部分反馈更难判断）
+    :param noise: 标签噪声比例，模拟大模型输出本身的不一致
+    :return: [{"feedback", "sentiment", "categories", "urgency"}]
+    """
+    rng = random.Random(seed)
+    categories = [name for name in CATEGORY_TEMPLATES if name != "其他"]
+    records = []
+    for _ in range(count):
+        order = f"订单号：ORD{rng.randrange(10 ** 9, 10 ** 10)}，" if rng.random() < 0.6 else ""
+        roll = rng.random()
+        if roll < 0.15:
+            index = rng.randrange(len(POSITIVE_TEMPLATES))
+            text = POSITIVE_TEMPLATES[index].format(n=rng.randint(1, 5))
+            labels, sentiment, urgency = [POSITIVE_CATEGORIES[index]], "POSITIVE", "LOW"
+        elif roll < 0.22:
+            index = rng.randrange(len(MIXED_TEMPLATES))
+            text = MIXED_TEMPLATES[index]
+            labels = list(MIXED_CATEGORIES[index])
+            sentiment, urgency = rng.choice(["NEUTRAL", "NEGATIVE"]), "LOW"
+        elif roll < 0.3:
+            text = rng.choice(CATEGORY_TEMPLATES["其他"])
+            labels, sentiment, urgency = ["其他"], "NEUTRAL", "LOW"
+        else:
+            labels = [rng.choice(categories)]
+            if rng.random() < mixed_ratio:
+                labels.append(rng.choice([name for name in categories if name != labels[0]]))
+            text = "，".join(rng.choice(CATEGORY_TEMPLATES[name]).format(n=rng.randint(2, 15))
+                            for name in labels)
+            sentiment = "NEGATIVE"
+            if rng.random() < 0.3:
+                text += rng.choice(URGENT_SUFFIXES)
+                urgency = "HIGH"
+            else:
+                text += rng.choice(MILD_SUFFIXES)
+                urgency = "MEDIUM"
+        if rng.random() < noise:
+            sentiment = rng.choice(["POSITIVE", "NEUTRAL", "NEGATIVE"])
+        if rng.random() < noise:
+            labels = [rng.choice(list(CATEGORY_TEMPLATES))]
+        records.append({"feedback": order + text, "sentiment": sentiment,
+                        "categories": labels, "urgency": urgency})
+    return records
+
+
+# 客服知识库：每个分类若干条政策/FAQ 模板，填入不同的商品、时限、金额生成大量不重复的条目
+KNOWLEDGE_TEMPLATES = {
+    "物流问题": ["物流政策：{product}下单后{n}个工作日内发货，{region}地区配送时效约{m}天",
+             "物流信息超过{n}天没有更新时，可以联系客服核实包裹位置，核实后{m}小时内回复",
+             "快递未送货上门就显示签收的，{n}天内反馈可以申请补发{product}或全额退款",
+             "{region}地区受天气影响，{product}的配送可能延迟{n}到{m}天，请耐心等待",
+             "发货超过{n}天仍未收到{product}，可以申请延误补偿{amount}元优惠券"],
+    "产品质量": ["{product}收到时有破损的，请在{n}天内拍照上传，审核通过后免费换新",
+             "{product}在{m}天内出现非人为质量问题，可以申请退货或维修",
+             "{product}保修期为{n}个月，保修期内免费维修，超出保修期按成本价收费",
+             "商品与描述不符的，{n}天内可以申请无理由退货，运费由商家承担",
+             "{product}出现做工瑕疵，可以选择补偿{amount}元或者换货"],
+    "客户服务": ["人工客服服务时间为每天{n}点到{m}点，其他时间可以留言，上班后{n}小时内回复",
+             "客服{m}小时内未回复的，可以拨打热线，或在订单页点击投诉客服",
+             "对客服服务不满意的，可以在{n}天内评价，我们会回访并改进",
+             "咨询{product}相关问题时，请提供订单号，客服会优先处理",
+             "高峰期人工客服排队较长，可以先使用自助服务查询{product}的物流和售后进度"],
+    "支付问题": ["重复扣款会在{n}个工作日内自动原路退回，超过{m}天未到账请联系客服",
+             "支付失败但已扣款的，款项会在{n}小时内退回原支付账户",
+             "账单金额与订单不一致的，请提供支付截图，核实后{n}个工作日内退还差额{amount}元以内",
+             "支付页面报错时，请更换支付方式或在{n}分钟后重试",
+             "使用优惠券支付{product}时，实付金额会自动扣减{amount}元"],
+    "退货退款": ["退货申请提交后{n}个工作日内审核，审核通过后{m}天内退款到账",
+             "退回的{product}签收后{n}个工作日内完成退款，原路退回",
+             "换货请在订单页选择申请售后，{product}换货寄回运费由商家承担",
+             "超过{n}天未处理的退货申请，可以联系客服加急，加急后{m}小时内处理",
+             "{product}退款金额{amount}元以内的，审核通过后立即到账"],
+    "其他": ["电子发票在确认收货后{n}天内开具，可以在订单页下载",
+           "会员每月可以领取{amount}元优惠券，购买{product}可以叠加使用",
+           "新品{product}每月{n}日上新，关注店铺可以收到上新提醒",
+           "{product}支持定制颜色，定制周期约{n}天",
+           "纸质发票需要在下单后{n}天内申请，随{product}一起寄出"],
+}
+PRODUCTS = ["手机", "耳机", "笔记本电脑", "平板", "手表", "音箱", "充电器", "键盘", "鼠标", "显示器",
+            "冰箱", "洗衣机", "空调", "电视", "吸尘器", "电饭煲", "微波炉", "台灯", "背包", "运动鞋"]
+REGIONS = ["华东", "华南", "华北", "西南", "西北", "东北", "华中", "偏远"]
+
+
+def generate_knowledge_base(count: int, seed: Optional[int] = 0) -> List[dict]:
+    """
+    生成合成的客服知识库条目（政策、FAQ），用于检索和 RAG 的基准测试
+    :param count: 条目数
+    :param seed: 随机种子
+    :return: [{"id", "text", "category"}]，分类与 generate_feedback 的 categories 相同
+    """
+    rng = random.Random(seed)
+    categories = list(KNOWLEDGE_TEMPLATES)
+    records = []
+    for i in range(count):
+        category = categories[i % len(categories)]
+        text = rng.choice(KNOWLEDGE_TEMPLATES[category]).format(
+            product=rng.choice(PRODUCTS), region=rng.choice(REGIONS), n=rng.randint(1, 30),
+            m=rng.randint(1, 72), amount=rng.choice([5, 10, 20, 50, 100, 200]))
+        # 商品编号让每条记录都不重复，也是关键词检索需要精确匹配的标识
+        code = f"SKU{rng.randrange(10 ** 5, 10 ** 6)}"
+        records.append({"id": f"KB{i:07d}", "text": f"【{category}】{text}（适用商品编号 {code}）",
+                        "category": category})
+    return records
@@ -0,0 +1,99 @@
+#向量化批处理：声明为接收 NumPy 数组的函数，batch() 时把所有输入堆叠成一个数组只调用一次
+#例如 data_analysis_chain 中的 mean/sum/count/max、RunnableMap 示例中的平方、立方
+import inspect
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+from langchain_core.runnables import Runnable, RunnableConfig
+
+
+def vectorized(func: Callable) -> Callable:
+    """
+    装饰器：声明函数可以向量化
+    约定：输入的第 0 维是批次维度，函数对每一行独立计算，返回第 0 维长度相同的数组（或值为这种数组的字典）
+    """
+    func.__vectorized__ = True
+    return func
+
+
+def is_vectorized(func: Callable) -> bool:
+    """函数被 @vectorized 装饰，或第一个参数标注为 np.ndarray 时认为可以向量化"""
+    if getattr(func, "__vectorized__", False):
+        return True
+    try:
+        parameters = list(inspect.signature(func).parameters.values())
+    except (TypeError, ValueError):
+        return False
+    return bool(parameters) and parameters[0].annotation is np.ndarray
+
+
+def _to_python(value: Any) -> Any:
+    return value.tolist() if isinstance(value, (np.ndarray, np.generic)) else value
+
+
+def _rows(value: Any, size: int, label: str) -> List[Any]:
+    rows = np.asarray(value)
+    if rows.shape[:1] != (size,):
+        raise ValueError(f"向量化函数返回的{label}第 0 维 {rows.shape[:1]} 与批次大小 {size} 不一致"
+                         f"（需要每个输入一行，不能是标量）")
+    return rows.tolist()
+
+
+def _split(result: Union[np.ndarray, Dict[str, np.ndarray]], size: int) -> List[Any]:
+    if isinstance(result, dict):
+        columns = {key: _rows(value, size, f"字段 {key!r} ") for key, value in result.items()}
+        return [{key: column[i] for key, column in columns.items()} for i in range(size)]
+    return _rows(result, size, "")
+
+
+class RunnableVectorized(Runnable):
+    """
+    向量化的 RunnableLambda
+
+    - invoke(x): 把单个输入当作长度为 1 的批次计算
+    - batch(inputs): 函数可以向量化且输入能堆叠成规则的数值数组时，只调用一次函数；
+      否则（函数没有声明向量化、输入长短不一、非数值）退回逐个调用
+    """
+
+    def __init__(self, func: Callable, name: Optional[str] = None):
+        self.func = func
+        self.name = name or getattr(func, "__name__", "RunnableVectorized")
+        self.vectorizable = is_vectorized(func)
+
+    def _stack(self, inputs: List[Any]) -> Optional[np.ndarray]:
+        try:
+            stacked = np.asarray(inputs)
+        except ValueError:
+            return None
+        if stacked.dtype.kind not in "biuf":
+            return None
+        return stacked
+
+    def _call_batch(self, inputs: List[Any]) -> List[Any]:
+        if not self.vectorizable:
+            return [_to_python(self.func(item)) for item in inputs]
+        stacked = self._stack(inputs)
+        if stacked is not None:
+            return _split(self.func(stacked), len(inputs))
+        if len(inputs) > 1:
+            # 输入长短不一时逐个作为长度为 1 的批次调用，函数看到的仍然是带批次维度的数组
+            return [self._call_batch([item])[0] for item in inputs]
+        # 单个输入也不能转成数值数组（非数值），只能原样传给函数
+        return [_to_python(self.func(inputs[0]))]
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        if not self.vectorizable:
+            return self._call_with_config(lambda x: _to_python(self.func(x)), input, config)
+        return self._call_with_config(lambda x: self._call_batch([x])[0], input, config)
+
+    def batch(self, inputs: List[Any], config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None,
+              *, return_exceptions: bool = False, **kwargs: Any) -> List[Any]:
+        if not inputs:
+            return []
+        if return_exceptions:
+            # 需要逐个返回异常时只能逐个调用
+            return super().batch(inputs, config, return_exceptions=True, **kwargs)
+        if isinstance(config, list):
+            config = config[0]
+        # 整个批次只产生一个 run
+        return self._call_with_config(self._call_batch, list(inputs), config)
@@ -0,0 +1,251 @@
+#多进程工作池：在 N 个进程中运行同一条链，绕开 GIL 对提示词渲染、JSON 解析、正则等 Python 代码的限制
+#所有进程共享一个有界输入队列和一个限流器，关闭时会处理完已提交的任务再退出
+import itertools
+import multiprocessing
+import pickle
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from multiprocessing import connection
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+_STOP = None
+_IDLE = -1
+
+
+class WorkerError(RuntimeError):
+    """
+    工作进程中的异常或结果无法传回主进程时的替代异常
+    例如 openai.RateLimitError 等 APIStatusError 需要关键字参数 response、body，pickle 后无法重建；
+    这里只保留异常类型名、repr 和格式化的调用栈
+    """
+
+    def __init__(self, type_name: str, message: str, traceback_text: str = ""):
+        super().__init__(type_name, message, traceback_text)
+        self.type_name = type_name
+        self.message = message
+        self.traceback_text = traceback_text
+
+    def __str__(self) -> str:
+        return f"{self.type_name}: {self.message}" + (f"\n{self.traceback_text}" if self.traceback_text else "")
+
+
+def _worker_error(e: BaseException) -> WorkerError:
+    return WorkerError(type(e).__name__, repr(e), "".join(traceback.format_exception(type(e), e, e.__traceback__)))
+
+
+class SharedRateLimiter:
+    """
+    跨进程共享的令牌桶限流器
+    令牌数和上次补充时间存放在共享内存(multiprocessing.Value)中，所有工作进程共同消耗同一个配额
+    """
+
+    def __init__(self, rate: float, burst: int = 1, context=None):
+        """
+        :param rate: 每秒允许的请求数（RPM 配额需要除以 60）
+        :param burst: 令牌桶容量
+        :param context: multiprocessing 上下文，需与工作池一致
+        """
+        context = context or multiprocessing.get_context()
+        self.rate = rate
+        self.burst = burst
+        self._tokens = context.Value("d", float(burst), lock=False)
+        self._updated = context.Value("d", time.time(), lock=False)
+        self._lock = context.Lock()
+
+    def acquire(self) -> None:
+        """取得一个令牌，令牌不足时睡眠等待"""
+        while True:
+            with self._lock:
+                now = time.time()
+                tokens = min(self.burst, self._tokens.value + (now - self._updated.value) * self.rate)
+                self._updated.value = now
+                if tokens >= 1:
+                    self._tokens.value = tokens - 1
+                    return
+                self._tokens.value = tokens
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+def _dumps(ok: bool, value: Any) -> Tuple[bool, bytes]:
+    """
+    在工作进程中序列化结果或异常，返回 (是否成功, 序列化后的数据)：无法序列化、或序列化后无法重建的，换成 WorkerError
+    队列的后台线程遇到无法序列化的对象只会丢弃，主进程反序列化失败会中断收集线程，两种情况都要在这里拦下
+    """
+    try:
+        data = pickle.dumps(value)
+        if not ok:
+            # 异常的 pickle 在重建时才会失败（缺少关键字参数），在这里试一次
+            pickle.loads(data)
+        return ok, data
+    except Exception as e:
+        return False, pickle.dumps(_worker_error(value if not ok else e))
+
+
+def _worker_main(index: int, chain_factory: Callable, inputs, results, current,
+                 limiter: Optional[SharedRateLimiter]) -> None:
+    # 每个进程只构建一次链（预先 fork，之后重复使用）
+    chain = chain_factory()
+    while True:
+        item = inputs.get()
+        if item is _STOP:
+            return
+        job_id, payload = item
+        # 记下正在处理的任务，进程崩溃时主进程据此让这个任务失败
+        current[index] = job_id
+        try:
+            if limiter is not None:
+                limiter.acquire()
+            ok, value = True, chain.invoke(payload)
+        except Exception as e:
+            ok, value = False, e
+        # 每个进程一个结果管道，同步写入：进程崩溃时不会像共享的 Queue 那样留下被占用的写锁，卡住其他进程
+        results.send((job_id, *_dumps(ok, value)))
+        current[index] = _IDLE
+
+
+class ChainWorkerPool:
+    """
+    预先启动 N 个工作进程运行同一条链
+
+    用法:
+        pool = ChainWorkerPool(build_chain, workers=4)
+        future = pool.submit({"user_input": "..."})
+        results = pool.map(inputs)
+        pool.shutdown()
+
+    注意:
+        chain_factory 在子进程中调用，需要是模块级函数（spawn 模式下会被 pickle）；
+        链本身（包含 lambda）不需要能被 pickle，但输入需要；
+        无法传回主进程的结果或异常以 WorkerError 返回；工作进程意外退出时它正在处理的任务以 WorkerError 失败，
+        所有进程都退出后排队中的任务也以 WorkerError 失败，之后的 submit 直接抛出
+    """
+
+    def __init__(self, chain_factory: Callable[[], Any], workers: Optional[int] = None, queue_size: int = 1000,
+                 rate_limiter: Optional[SharedRateLimiter] = None, context=None):
+        """
+        :param chain_factory: 构建链的函数，每个工作进程调用一次
+        :param workers: 进程数，默认 CPU 核数
+        :param queue_size: 输入队列容量，队列满时 submit 会阻塞
+        :param rate_limiter: 跨进程共享的限流器
+        :param context: multiprocessing 上下文，默认使用平台默认方式
+        """
+        context = context or multiprocessing.get_context()
+        self.workers = workers or multiprocessing.cpu_count()
+        self._inputs = context.Queue(maxsize=queue_size)
+        self._futures: Dict[int, Future] = {}
+        self._futures_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._closed = False
+        # 每个工作进程正在处理的任务 id，空闲时为 _IDLE
+        self._current = context.Array("q", [_IDLE] * self.workers, lock=False)
+        self._readers: Dict[Any, int] = {}  # 结果管道的读端 -> 进程序号，进程退出、读到 EOF 后移除
+        self._processes = []
+        for i in range(self.workers):
+            reader, writer = context.Pipe(duplex=False)
+            process = context.Process(target=_worker_main,
+                                      args=(i, chain_factory, self._inputs, writer, self._current, rate_limiter),
+                                      daemon=True, name=f"chain-worker-{i}")
+            process.start()
+            # 关闭主进程中的写端，进程退出后读端才能读到 EOF
+            writer.close()
+            self._readers[reader] = i
+            self._processes.append(process)
+        self._collector = threading.Thread(target=self._collect, name="chain-pool-collector", daemon=True)
+        self._collector.start()
+
+    def _fail(self, job_ids: Iterable[int], error: BaseException) -> None:
+        with self._futures_lock:
+            futures = [self._futures.pop(job_id, None) for job_id in job_ids]
+        for future in futures:
+            if future is not None:
+                future.set_exception(error)
+
+    def _worker_exited(self, index: int) -> None:
+        """工作进程退出（管道 EOF）：正常退出时没有进行中的任务；意外退出时它正在处理的任务失败"""
+        process = self._processes[index]
+        process.join(1)
+        job_id = self._current[index]
+        if job_id != _IDLE:
+            self._fail([job_id], WorkerError(
+                "WorkerDied", f"工作进程 {process.name} 已退出（exitcode={process.exitcode}）"))
+
+    def _fail_pending(self, message: str) -> None:
+        with self._futures_lock:
+            pending = list(self._futures)
+        self._fail(pending, WorkerError("WorkerDied", message))
+
+    def _collect(self) -> None:
+        while self._readers:
+            for reader in connection.wait(list(self._readers)):
+                try:
+                    job_id, ok, data = reader.recv()
+                except (EOFError, OSError):
+                    self._worker_exited(self._readers.pop(reader))
+                    reader.close()
+                    continue
+                try:
+                    value = pickle.loads(data)
+                    with self._futures_lock:
+                        future = self._futures.pop(job_id, None)
+                    if future is None:
+                        continue
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(value)
+                except Exception as e:
+                    # 收集线程不能退出，否则所有未完成的 Future 都会一直等待
+                    self._fail([job_id], _worker_error(e))
+        # 所有进程都已退出：关闭时由 shutdown 处理剩下的任务，否则是进程全部崩溃，排队中的任务不会再有结果
+        if not self._closed:
+            self._fail_pending("所有工作进程都已退出")
+
+    def submit(self, payload: Any) -> Future:
+        """提交一个输入，返回 Future；输入队列满时阻塞（背压）"""
+        if self._closed:
+            raise RuntimeError("工作池已关闭")
+        if not any(process.is_alive() for process in self._processes):
+            raise WorkerError("WorkerDied", "所有工作进程都已退出")
+        job_id = next(self._ids)
+        future = Future()
+        with self._futures_lock:
+            self._futures[job_id] = future
+        self._inputs.put((job_id, payload))
+        return future
+
+    def map(self, payloads: Iterable[Any]) -> List[Any]:
+        """按输入顺序返回结果"""
+        futures = [self.submit(payload) for payload in payloads]
+        return [future.result() for future in futures]
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """
+        优雅关闭：不再接受新任务，已提交的任务全部处理完后工作进程退出
+        :param timeout: 等待每个进程退出的最长时间，超时后强制终止
+        """
+        if self._closed:
+            return
+        self._closed = True
+        # 停止信号排在所有已提交任务之后，保证队列被处理完
+        for _ in self._processes:
+            self._inputs.put(_STOP)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        # 进程都退出后管道读到 EOF，收集线程处理完剩下的结果后结束
+        self._collector.join()
+        # 被强制终止的进程上的任务不会再有结果
+        with self._futures_lock:
+            for future in self._futures.values():
+                future.set_exception(RuntimeError("工作进程已终止"))
+            self._futures.clear()
+
+    def __enter__(self) -> "ChainWorkerPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
@@ -1,11 +1,11 @@
-import os
-
 from langchain.chat_models import init_chat_model
 from langchain_community.chat_models import ChatTongyi
 from langchain_openai import ChatOpenAI
 from openai import OpenAI
 
 from common_ai.ai_variable import *
+from common_ai.model_router import ModelRouter
+from common_ai.settings import get_settings
 
 
 # init_chat_model 不支持tongyi的模型 目前支持
@@ -32,11 +32,12 @@ def get_model_example1():
     返回值:
         无返回值，但会打印模型响应的类型和完整对象
     """
+    profile = get_settings().profile(ALI_TONGYI_MAX_MODEL)  # 模型配置，进程内只加载一次
     model = init_chat_model(
-        model=ALI_TONGYI_MAX_MODEL,  # 模型名称，指定要使用的AI模型
+        model=profile.model,  # 模型名称，指定要使用的AI模型
         model_provider=ALI_TONGYI,  # 模型提供商，指定模型的提供商类型
-        api_key=os.getenv(ALI_TONGYI_API_KEY_OS_VAR_NAME),  # API 密钥（可选，可从环境变量读取）
-        base_url=ALI_TONGYI_URL,  # API的基础URL
+        api_key=profile.api_key,  # API 密钥（加载配置时从环境变量读取）
+        base_url=profile.base_url,  # API的基础URL
     )
     response = model.invoke("你好！请用一句话介绍什么是人工智能。")  # 向模型发送请求
     print(f"\n返回对象类型: {type(response)}")
@@ -57,10 +58,13 @@ def get_model_example2():
     返回值:
         无返回值，但会打印模型响应的类型、完整对象和内容详情
     """
+    profile = get_settings().profile(ALI_TONGYI_MAX_MODEL)
     model = ChatOpenAI(  # 初始化OpenAI聊天模型实例
-        model=ALI_TONGYI_MAX_MODEL,  # 模型名称，指定要使用的AI模型
-        api_key=os.getenv(ALI_TONGYI_API_KEY_OS_VAR_NAME),  # API密钥，从环境变量获取
-        base_url=ALI_TONGYI_URL,  # API的基础URL
+        model=profile.model,  # 模型名称，指定要使用的AI模型
+        api_key=profile.api_key,  # API密钥，加载配置时从环境变量获取
+        base_url=profile.base_url,  # API的基础URL
+        timeout=profile.timeout,  # 超时、重试次数等按模型在配置文件中调整
+        max_retries=profile.max_retries,
     )
     response = model.invoke("你好！请用一句话介绍什么是人工智能。")  # 向模型发送请求
     print(f"\n返回对象类型: {type(response)}")
@@ -85,12 +89,13 @@ def get_model_example3():
     返回值:
         无返回值，但会打印API响应的详细信息
     """
+    profile = get_settings().profile(ALI_TONGYI_MAX_MODEL)
     model = OpenAI(  # 初始化OpenAI原生客户端
-        api_key=os.getenv(ALI_TONGYI_API_KEY_OS_VAR_NAME),  # API密钥，从环境变量获取
-        base_url=ALI_TONGYI_URL  # API的基础URL
+        api_key=profile.api_key.get_secret_value() if profile.api_key else None,  # API密钥，加载配置时从环境变量获取
+        base_url=profile.base_url  # API的基础URL
     )
     response = model.chat.completions.create(  # 调用聊天完成接口
-        model=ALI_TONGYI_MAX_MODEL,  # 模型名称，指定要使用的AI模型
+        model=profile.model,  # 模型名称，指定要使用的AI模型
         messages=[{"role": "user", "content": "你好！请用一句话介绍什么是人工智能。"}]  # 消息列表，包含用户角色和内容
     )
     print(f"\n返回对象类型: {type(response)}")  # 打印响应对象的类型
@@ -117,8 +122,35 @@ def get_model_example4():
     print(f"返回对象的值: {response.content}")  # 打印模型响应的具体内容
 
 
+#多个模型/服务组合成一个模型使用
+def get_model_example5():
+    """
+    使用 ModelRouter 把多个后端组合成一个聊天模型
+    接口与其他聊天模型相同，可以直接放进链条；后端之间按策略选择
+
+    ModelRouter 参数说明:
+        backends: 名称 -> 模型，failover 策略按这里的顺序使用
+        policy: race 同时请求取最快的结果；balanced 按观测延迟加权分配流量；failover 失败或熔断时换下一个
+
+    返回值:
+        无返回值，但会打印模型响应的内容和各后端的调用统计
+    """
+    settings = get_settings()
+    model = ModelRouter(
+        backends={
+            name: ChatOpenAI(**settings.profile(name).chat_kwargs())  # 每个模型的地址、超时等来自各自的配置
+            for name in (ALI_TONGYI_MAX_MODEL, ALI_TONGYI_DEEPSEEK_V3)
+        },
+        policy="race",  # 两个模型同时请求，谁先返回用谁
+    )
+    response = model.invoke("你好！请用一句话介绍什么是人工智能。")  # 向模型发送请求
+    print(f"返回对象的值: {response.content}")
+    print(f"后端统计: {model.stats()}")
+
+
 if __name__ == '__main__':
     get_model_example1()
     get_model_example2()
     get_model_example3()
     get_model_example4()
+    get_model_example5()
@@ -7,6 +7,7 @@ from langchain_community.chat_models import ChatTongyi
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 
+from common_ai.streaming import CoalescingStream
 from ModelIO.modelIO import prompt
 
 """
@@ -73,3 +74,9 @@ print("\n=== 流式输出方式 (stream) ===")
 for chunk in chain.stream({"topic": "大数据"}):
     # flush=True确保立即输出，模拟实时效果
     print(chunk, end="", flush=True)
+
+print("\n=== 合并刷新的流式输出 ===")
+# 6. 逐 chunk flush 时每个 token 都是一次系统调用；CoalescingStream 按 20ms 时间窗口合并后再输出，
+# 第一个 chunk 仍然立即输出，观感上和逐字输出没有区别（对比数据见 phase5_optimization/09_streaming）
+for text in CoalescingStream(chain.stream({"topic": "云计算"}), max_delay=0.02):
+    print(text, end="", flush=True)
@@ -1,10 +1,18 @@
+import os
 import re
 import time
+from pathlib import Path
 
-from langchain_community.chat_models import ChatTongyi
-from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.runnables import RunnableParallel, RunnableLambda, RunnablePassthrough
 
+from common_ai.circuit_breaker import CircuitOpenError, ModelUnavailableError, get_breaker
+from common_ai.distill_log import ParquetLogSink
+from common_ai.local_analyzers import local_categories, local_order_id, local_priority, local_reply, local_sentiment
+from common_ai.local_classifier import LocalPreClassifier
+from common_ai.memo import MemoizedLambda
+from common_ai.projection import RunnableProjection
+from common_ai.providers import LazyChatModel
+
 # 业务场景：电商客户反馈处理系统
 # 需求描述:某电商平台需要自动处理客户反馈，实现以下功能：
 #  1. 情感分析：判断用户反馈的情感倾向
@@ -19,28 +27,94 @@ from langchain_core.runnables import RunnableParallel, RunnableLambda, RunnableP
 3. 使用大模型识别反馈中的问题类型
 4. 使用大模型判断处理优先级
 5. 总和以上信息给大模型生成初步回复
+降级模式：模型服务不可用（重试耗尽或熔断打开）时，各分析步骤改用本地规则分析器，
+保证链条仍然输出结构化结果，而不是把错误字符串交给 JsonOutputParser
+本地预分类：情感分析和问题分类先经过本地预分类器，高置信度的工单直接返回，只有不确定的才调用大模型
+蒸馏数据：设置环境变量 DISTILL_LOG_DIR 后，大模型的分析结果会异步写入 Parquet，用于训练本地预分类器
+检索增强：设置环境变量 KB_INDEX_PATH（本地知识库的向量存储目录）后，生成回复前按问题分类检索政策、FAQ 片段，
+只把 token 预算内的前几条放进提示词，回复模型不再联网搜索
 '''
 
-model = ChatTongyi()
-model_special = ChatTongyi(
+# 模型在第一次调用时才创建：导入 ChatTongyi（连带 dashscope、langsmith）约 0.9s，
+# 全部走本地预分类或降级路径时不需要付出这部分启动时间
+model = LazyChatModel("tongyi")
+model_special = LazyChatModel(
+    "tongyi",
     model_name="qwen-max",
     temperature=0.2,  # 控制创造性
     max_tokens=2000,  # 最大输出长度
     streaming=False,  # 关闭流式输出
     enable_search=True  # 启用联网搜索增强
 )
+# 启用检索增强时生成回复用的模型：参考资料来自本地知识库，关闭联网搜索，省去搜索的等待和搜索结果占用的 token
+model_reply = LazyChatModel(
+    "tongyi",
+    model_name="qwen-max",
+    temperature=0.2,
+    max_tokens=2000,
+    streaming=False
+)
+
+
+# 本地预分类器，由 phase5_optimization/02_local_classifier/01_train_classifier.py 训练生成，不存在时不启用
+PRE_CLASSIFIER_PATH = os.getenv(
+    "PRE_CLASSIFIER_PATH",
+    str(Path(__file__).resolve().parents[2] / "phase5_optimization" / "02_local_classifier" / "pre_classifier.npz"))
+pre_classifier = LocalPreClassifier.load(PRE_CLASSIFIER_PATH) if os.path.exists(PRE_CLASSIFIER_PATH) else None
+
+# 蒸馏数据记录，未设置 DISTILL_LOG_DIR 时不启用
+distill_sink = ParquetLogSink(os.environ["DISTILL_LOG_DIR"]) if os.getenv("DISTILL_LOG_DIR") else None
+
+# 回复用的本地知识库，由 common_ai.ingestion.DocumentIngestor 或 Retriever.add_texts 写入，未设置 KB_INDEX_PATH 时不启用
+KB_INDEX_PATH = os.getenv("KB_INDEX_PATH")
+policy_snippets = None
+if KB_INDEX_PATH and os.path.exists(KB_INDEX_PATH):
+    from common_ai.embedding_service import get_embedding_service
+    from common_ai.rag import PolicySnippets
+    from common_ai.retrieval import Retriever, VectorStore
 
+    policy_snippets = PolicySnippets(
+        Retriever(embeddings=get_embedding_service(), store=VectorStore(KB_INDEX_PATH)),
+        max_tokens=int(os.getenv("KB_MAX_TOKENS", "300")))
 
-def call_qwen_with_retry(prompt, max_retries=3, retry_delay=2):
-    """带错误重试的千问模型调用"""
+# 每个模型一个熔断器，上游故障时所有分支、所有工单共享熔断状态
+breaker = get_breaker(model_special.model_name)
+
+
+def call_qwen_with_retry(prompt, max_retries=3, retry_delay=2, chat_model=None):
+    """
+    带错误重试和熔断的千问模型调用
+    :param chat_model: 调用的模型，默认 model_special；与 model_special 是同一个模型名，共用熔断器
+    :raises ModelUnavailableError: 重试耗尽或熔断打开时抛出，由调用方降级处理
+    """
+    chat_model = chat_model or model_special
     for attempt in range(max_retries):
         try:
-            response = model_special.invoke(prompt)
+            response = breaker.call(chat_model.invoke, prompt)
             return response.content
+        except CircuitOpenError:
+            # 熔断打开时直接失败，不再重试和等待
+            raise
         except Exception as e:
             print(f"模型调用失败 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
-            time.sleep(retry_delay)
-    return "模型服务暂时不可用，请稍后再试。"
+            if attempt < max_retries - 1:
+                time.sleep(retry_delay)
+    raise ModelUnavailableError("模型服务暂时不可用，请稍后再试。")
+
+
+def parse_json(text: str) -> dict:
+    """
+    把模型输出解析成字典
+    JsonOutputParser 会连带导入 langsmith 等模块（约 0.5s），只在走到大模型路径时才导入，不拖慢脚本启动
+    """
+    from langchain_core.output_parsers import JsonOutputParser
+
+    return JsonOutputParser().parse(text)
+
+
+def feedback_text(user_input) -> str:
+    """链条中传入的是 {"user_input": ...} 字典，取出反馈原文"""
+    return user_input["user_input"] if isinstance(user_input, dict) else user_input
 
 
 # 1. 首先根据用户的输入进行提取订单ID，
@@ -60,13 +134,17 @@ def extract_order_id(user_input: str) -> dict:
     print("extract_order_id 输入：",user_input)
     try:
         # 正则提取
-        match = re.search(r'ORD\d{10}', user_input)
+        match = re.search(r'ORD\d{10}', feedback_text(user_input))
         return {"order_id": match.group(0) if match else "NOT_FOUND"}
     except:
-        result =  call_qwen_with_retry(prompt, 3, 2)
+        try:
+            result =  call_qwen_with_retry(prompt, 3, 2)
+        except ModelUnavailableError as e:
+            # 降级：使用本地正则提取
+            print("extract_order_id 降级：", e)
+            return local_order_id(feedback_text(user_input))
         print("extract_order_id 输出：",result)
-        output_parser = JsonOutputParser()
-        return output_parser.parse(result)
+        return parse_json(result)
 
 
 # 2. 使用大模型判断用户的情感倾向
@@ -93,10 +171,21 @@ def analyze_sentiment(user_input: str) -> dict:
         }}
         """
     print("analyze_sentiment 输入：",user_input)
-    result = call_qwen_with_retry(prompt, 3, 2)
-    output_parser = JsonOutputParser()
-    result = output_parser.parse(result)
+    if pre_classifier is not None:
+        result = pre_classifier.predict_sentiment(feedback_text(user_input))
+        if result is not None:
+            print("analyze_sentiment 本地预分类：",result)
+            return result
+    try:
+        result = call_qwen_with_retry(prompt, 3, 2)
+    except ModelUnavailableError as e:
+        # 降级：使用本地规则分析
+        print("analyze_sentiment 降级：", e)
+        return local_sentiment(feedback_text(user_input))
+    result = parse_json(result)
     print("analyze_sentiment 输出：",result)
+    if distill_sink is not None:
+        distill_sink.log("sentiment", feedback_text(user_input), result)
     return result
 
 
@@ -126,10 +215,21 @@ def classify_issue(user_input: str) -> dict:
         无需其他说明，返回结果只要返回一个JSON对象。
         """
     print("classify_issue 输入：",user_input)
-    result = call_qwen_with_retry(prompt, 3, 2)
-    output_parser = JsonOutputParser()
-    result = output_parser.parse(result)
+    if pre_classifier is not None:
+        result = pre_classifier.predict_categories(feedback_text(user_input))
+        if result is not None:
+            print("classify_issue 本地预分类：",result)
+            return result
+    try:
+        result = call_qwen_with_retry(prompt, 3, 2)
+    except ModelUnavailableError as e:
+        # 降级：使用本地规则分析
+        print("classify_issue 降级：", e)
+        return local_categories(feedback_text(user_input))
+    result = parse_json(result)
     print("classify_issue 输出：",result)
+    if distill_sink is not None:
+        distill_sink.log("categories", feedback_text(user_input), result)
     return result
 
 
@@ -152,10 +252,16 @@ def assess_priority(user_input: str) -> dict:
         }}
         """
     print("assess_priority 输入：",user_input)
-    result = call_qwen_with_retry(prompt, 3, 2)
-    output_parser = JsonOutputParser()
-    result = output_parser.parse(result)
+    try:
+        result = call_qwen_with_retry(prompt, 3, 2)
+    except ModelUnavailableError as e:
+        # 降级：使用本地规则分析
+        print("assess_priority 降级：", e)
+        return local_priority(feedback_text(user_input))
+    result = parse_json(result)
     print("assess_priority 输出：",result)
+    if distill_sink is not None:
+        distill_sink.log("urgency", feedback_text(user_input), result)
     return result
 
 
@@ -171,6 +277,7 @@ def generate_reply(data: dict) -> str:
             - 问题类型：{categories}
             - 紧急程度：{urgency} (需在{sla_hours}小时内响应)
             {key_phrases_section}
+        {knowledge_section}
         ### 回复要求：
         1. 根据情感倾向调整语气：
             - 积极反馈：表达感谢，适当赞美
@@ -188,6 +295,22 @@ def generate_reply(data: dict) -> str:
         key_phrases_section = "- 关键要点：" + "，".join(key_phrases[:3])
     else:
         key_phrases_section = ""
+    # 检索增强：按问题分类取本地知识库的片段，有片段时回复不联网搜索；检索失败或没有片段时保持原来的联网搜索
+    knowledge_section = ""
+    reply_model = model_special
+    if policy_snippets is not None:
+        try:
+            snippets = policy_snippets.retrieve(data["original_feedback"]["user_input"], data["categories"])
+        except Exception as e:
+            print("generate_reply 检索失败：", e)
+            snippets = []
+        print("generate_reply 检索片段：", [doc.metadata.get("id") for doc in snippets])
+        if snippets:
+            from common_ai.rag import format_snippets
+
+            knowledge_section = ("### 相关政策（承诺的时限、金额和处理方式以此为准，没有提到的不要编造）：\n"
+                                 + format_snippets(snippets))
+            reply_model = model_reply
     # 格式化提示词
     formatted_prompt =  prompt.format(
         feedback=data["original_feedback"]["user_input"],
@@ -197,20 +320,29 @@ def generate_reply(data: dict) -> str:
         categories=data["categories"],
         urgency=data["urgency"],
         sla_hours=data["sla_hours"],
-        key_phrases_section=key_phrases_section
+        key_phrases_section=key_phrases_section,
+        knowledge_section=knowledge_section
     )
     print("generate_reply 提示词：",formatted_prompt)
-    return call_qwen_with_retry(formatted_prompt, 3, 2)
+    try:
+        return call_qwen_with_retry(formatted_prompt, 3, 2, chat_model=reply_model)
+    except ModelUnavailableError as e:
+        # 降级：使用模板回复
+        print("generate_reply 降级：", e)
+        return local_reply(data)
+
+# 订单ID提取是纯函数：提取链和分析链共用一个带缓存的节点，重复的反馈不再重复提取
+order_id_step = MemoizedLambda(extract_order_id, maxsize=4096)
 
 # 6. 构建提取链条
 extract_chain = RunnableParallel(
-    order_id=(extract_order_id),
+    order_id=order_id_step,
     original_feedback=lambda x: x
 )
 # 7. 构建分析链条
 analysis_chain = RunnableParallel(
     original_feedback=lambda x: x,
-    order_id=extract_order_id,
+    order_id=order_id_step,
     sentiment= (analyze_sentiment),
     categories= (classify_issue),
     urgency= (assess_priority)
@@ -221,17 +353,18 @@ processing_chain = (
         RunnablePassthrough.assign(
             analysis=lambda x: analysis_chain.invoke({"user_input": x["user_input"]})
         )
-        | {
-            "original_feedback": lambda x: x["analysis"]["original_feedback"],
-            "order_id": lambda x: x["analysis"]["order_id"]["order_id"],
-            "sentiment": lambda x: x["analysis"]["sentiment"].get("sentiment", "NEUTRAL"),
-            "confidence": lambda x: x["analysis"]["sentiment"].get("confidence", 0.8),
-            "key_phrases": lambda x: x["analysis"]["sentiment"].get("key_phrases", []),
-            "categories": lambda x: x["analysis"]["categories"]["categories"],
-            "urgency": lambda x: x["analysis"]["urgency"]["urgency"],
-            "sla_hours": lambda x: x["analysis"]["urgency"]["sla_hours"],
-            "urgency_reason": lambda x: x["analysis"]["urgency"].get("reason", "")
-        }
+        # 字段投影：一次编译、一次调用，代替九个各自经过线程池分发的 lambda
+        | RunnableProjection({
+            "original_feedback": "analysis.original_feedback",
+            "order_id": "analysis.order_id.order_id",
+            "sentiment": ("analysis.sentiment.sentiment", "NEUTRAL"),
+            "confidence": ("analysis.sentiment.confidence", 0.8),
+            "key_phrases": ("analysis.sentiment.key_phrases", []),
+            "categories": "analysis.categories.categories",
+            "urgency": "analysis.urgency.urgency",
+            "sla_hours": "analysis.urgency.sla_hours",
+            "urgency_reason": ("analysis.urgency.reason", "")
+        })
         # 生成答案
         | RunnableLambda(generate_reply)
 )
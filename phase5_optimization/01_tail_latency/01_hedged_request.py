@@ -0,0 +1,77 @@
+"""
+对冲请求示例 - 降低模型调用的 p99 延迟
+本文件用一个重尾延迟的假模型模拟"偶尔遇到慢副本"的上游服务，
+对比直接调用与 HedgedRunnable 包装后的 p50/p99 以及额外请求量
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common_ai.fake_models import FakeChatModel, heavy_tail_latency
+from common_ai.hedging import HedgedRunnable
+
+'''
+对冲请求的核心思路:
+1. 大部分请求很快，少数请求落到慢副本上，拖高了 p99
+2. 主请求超过 p95 还没返回，说明它大概率落到了慢副本，此时再发一个副本请求
+3. 两个请求谁先成功用谁，另一个被取消
+4. 对冲请求只发生在最慢的 ~5% 请求上，再加上比例上限，额外负载是有界的
+'''
+
+REQUESTS = 2000
+CONCURRENCY = 32
+
+
+class CountingResponder:
+    """统计上游实际收到的请求数"""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, messages):
+        with self._lock:
+            self.calls += 1
+        return "ok"
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def run(runnable, requests=REQUESTS):
+    """并发执行请求，返回每个请求的端到端耗时"""
+
+    def one(i):
+        start = time.perf_counter()
+        runnable.invoke(f"问题{i}")
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        return list(pool.map(one, range(requests)))
+
+
+def report(name, latencies, calls):
+    print(f"{name}: p50={percentile(latencies, 0.5) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 0.99) * 1000:.1f}ms "
+          f"上游请求数={calls} (额外 {calls / len(latencies) - 1:.1%})")
+
+
+if __name__ == '__main__':
+    # 1. 直接调用：p99 被慢副本拖高
+    responder = CountingResponder()
+    model = FakeChatModel(responder=responder, latency=heavy_tail_latency(rng=random.Random(42)))
+    baseline = run(model)
+    report("直接调用", baseline, responder.calls)
+
+    # 2. 对冲调用：先预热让 p95 统计稳定，再正式测量
+    responder = CountingResponder()
+    model = FakeChatModel(responder=responder, latency=heavy_tail_latency(rng=random.Random(42)))
+    hedged_model = HedgedRunnable(model, max_hedge_ratio=0.05)
+    run(hedged_model, requests=200)
+    responder.calls = 0
+    hedged = run(hedged_model)
+    report("对冲调用", hedged, responder.calls)
+    print("对冲统计:", hedged_model.stats())
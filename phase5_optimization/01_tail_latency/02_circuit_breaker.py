@@ -0,0 +1,106 @@
+"""
+熔断与降级示例 - 故障注入
+本文件把客户反馈处理系统中的 model_special 替换为可注入故障的假模型，演示：
+1. 上游正常时，链条正常调用模型
+2. 上游故障时，熔断器打开，后续工单不再重试等待，直接走本地规则分析，仍输出结构化结果
+3. 上游恢复后，半开探测成功，熔断器关闭，恢复调用模型
+4. 降级时使用的规则情感分析不会把"快递""尽快"这类催促误判为积极
+"""
+import contextlib
+import io
+import json
+import re
+import time
+
+from common_ai.circuit_breaker import CircuitBreaker
+from common_ai.fake_models import FakeChatModel
+from common_ai.local_analyzers import local_sentiment
+from common_ai.script_loader import load_script
+
+TICKETS = [
+    "订单号：ORD1234567890，物流为什么这么慢，这都10天了？",
+    "ORD2234567890 收到的商品有破损，质量太差了，要求退款",
+    "客服态度很好，问题解决得很快，谢谢！",
+    "订单ORD3234567890重复扣款了，请马上处理，不然我要投诉",
+]
+
+# 规则情感分析的期望结果，前几条都含"快""满意"等字样但是投诉或催促
+SENTIMENT_CASES = [
+    ("快递10天还没到，请尽快处理", "NEGATIVE"),
+    ("快点给我退款，等太久了", "NEGATIVE"),
+    ("对这次购物很不满意", "NEGATIVE"),
+    ("请尽快安排快递上门取件", "NEUTRAL"),
+    ("发货快，包装也不错，五星好评", "POSITIVE"),
+    ("质量很棒，推荐购买", "POSITIVE"),
+    ("客服态度很好，问题解决得很快，谢谢！", "POSITIVE"),
+]
+
+
+class FaultInjector:
+    """假模型的回复函数：outage=True 时模拟上游故障"""
+
+    def __init__(self):
+        self.outage = False
+        self.calls = 0
+
+    def __call__(self, messages):
+        self.calls += 1
+        if self.outage:
+            raise ConnectionError("upstream 503")
+        prompt = messages[-1].content
+        if "提取订单ID" in prompt:
+            match = re.search(r'ORD\d{10}', prompt)
+            return json.dumps({"order_id": match.group(0) if match else "NOT_FOUND"})
+        if "情感倾向" in prompt and "返回JSON" in prompt:
+            return json.dumps({"sentiment": "NEGATIVE", "confidence": 0.9, "key_phrases": ["物流慢"]})
+        if "分类选项" in prompt:
+            return json.dumps({"categories": ["物流问题"]})
+        if "紧急程度" in prompt and "评估标准" in prompt:
+            return json.dumps({"urgency": "MEDIUM", "sla_hours": 12, "reason": "表达不满"})
+        return "您好，非常抱歉给您带来不便，我们会尽快处理。"
+
+
+def process(demo, ticket):
+    """处理一个工单，返回 (耗时, 结果)，屏蔽示例中的调试输出"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = demo.processing_chain.invoke({"user_input": ticket})
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    demo = load_script("phase1_basic/05_project_demo/01_project_demo1.py")
+    injector = FaultInjector()
+    demo.model_special = FakeChatModel(responder=injector)
+    demo.breaker = CircuitBreaker("fake-qwen", min_calls=5, recovery_timeout=1.0)
+
+    print("=== 1. 上游正常 ===")
+    for ticket in TICKETS:
+        cost, result = process(demo, ticket)
+        print(f"{cost * 1000:7.1f}ms 熔断状态={demo.breaker.state} 回复={result[:30]}")
+
+    print("\n=== 2. 注入故障：上游全部失败 ===")
+    injector.outage = True
+    injector.calls = 0
+    for i in range(3):
+        for ticket in TICKETS:
+            cost, result = process(demo, ticket)
+            print(f"{cost * 1000:7.1f}ms 熔断状态={demo.breaker.state} 回复={result[:30]}")
+    print(f"故障期间 {len(TICKETS) * 3} 个工单，实际打到上游的请求数: {injector.calls}")
+
+    print("\n=== 3. 上游恢复，等待熔断进入半开 ===")
+    injector.outage = False
+    time.sleep(1.1)
+    print(f"熔断状态={demo.breaker.state}")
+    for ticket in TICKETS:
+        cost, result = process(demo, ticket)
+        print(f"{cost * 1000:7.1f}ms 熔断状态={demo.breaker.state} 回复={result[:30]}")
+
+    print("\n=== 4. 降级模式下的规则情感分析 ===")
+    wrong = []
+    for text, expected in SENTIMENT_CASES:
+        sentiment = local_sentiment(text)
+        print(f"{sentiment['sentiment']:8s} 期望={expected:8s} 关键词={sentiment['key_phrases']} {text}")
+        if sentiment["sentiment"] != expected:
+            wrong.append(text)
+    assert not wrong, f"规则情感分析判断错误: {wrong}"
@@ -0,0 +1,59 @@
+"""
+本地预分类器训练脚本
+训练数据是大模型分析结果的记录（feedback, sentiment, categories），
+没有提供记录文件时使用合成语料演示
+
+用法:
+    python 01_train_classifier.py                          # 合成语料
+    python 01_train_classifier.py --data records.jsonl     # 大模型输出记录，每行一个 JSON
+    python 01_train_classifier.py --logs /data/distill     # 客户反馈处理系统记录的 Parquet 蒸馏数据
+    python 01_train_classifier.py --output pre_classifier.npz --precision 0.98
+"""
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+
+from common_ai.distill_log import load_distillation_records
+from common_ai.local_classifier import LocalPreClassifier
+from common_ai.synthetic_data import generate_feedback
+
+DEFAULT_OUTPUT = Path(__file__).resolve().parent / "pre_classifier.npz"
+
+
+def load_records(path):
+    """读取 JSONL 格式的大模型输出记录"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练本地预分类器")
+    parser.add_argument("--data", help="大模型输出记录文件(JSONL)，不提供时使用合成语料")
+    parser.add_argument("--logs", help="蒸馏数据目录(Parquet，DISTILL_LOG_DIR)")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT), help="模型保存路径")
+    parser.add_argument("--precision", type=float, default=0.97, help="本地回答部分的目标准确率")
+    parser.add_argument("--size", type=int, default=4000, help="合成语料数量")
+    args = parser.parse_args()
+
+    if args.logs:
+        records = load_distillation_records(args.logs)
+    elif args.data:
+        records = load_records(args.data)
+    else:
+        records = generate_feedback(args.size, seed=1)
+    random.Random(0).shuffle(records)
+    split = int(len(records) * 0.8)
+    train, validation = records[:split], records[split:]
+
+    start = time.perf_counter()
+    classifier = LocalPreClassifier().fit(train, validation, target_precision=args.precision)
+    print(f"训练完成: {len(train)} 条训练, {len(validation)} 条验证, 耗时 {time.perf_counter() - start:.1f}s")
+    print(f"校准阈值: 情感={classifier.sentiment_threshold:.3f} 分类={classifier.category_threshold:.3f}")
+    classifier.save(args.output)
+    print(f"模型已保存到 {args.output}")
+
+
+if __name__ == '__main__':
+    main()
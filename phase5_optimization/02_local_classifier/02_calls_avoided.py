@@ -0,0 +1,38 @@
+"""
+本地预分类器基准测试 - 统计可以省掉多少次大模型调用
+在合成语料上训练、校准阈值，然后在独立的测试集上统计：
+1. 本地直接回答的工单比例（情感、分类两个调用分别统计）
+2. 本地回答部分的准确率
+3. 本地分类的耗时
+"""
+import time
+
+from common_ai.local_classifier import LocalPreClassifier
+from common_ai.synthetic_data import generate_feedback
+
+if __name__ == '__main__':
+    train = generate_feedback(3200, seed=1)
+    validation = generate_feedback(800, seed=2)
+    test = generate_feedback(5000, seed=3)
+
+    classifier = LocalPreClassifier().fit(train, validation, target_precision=0.97)
+    print(f"校准阈值: 情感={classifier.sentiment_threshold:.3f} 分类={classifier.category_threshold:.3f}")
+
+    texts = [record["feedback"] for record in test]
+    start = time.perf_counter()
+    sentiments = classifier.predict_sentiment_batch(texts)
+    categories = classifier.predict_categories_batch(texts)
+    cost = time.perf_counter() - start
+
+    answered_sentiment = [(r, t) for r, t in zip(sentiments, test) if r is not None]
+    answered_category = [(r, t) for r, t in zip(categories, test) if r is not None]
+    sentiment_accuracy = sum(r["sentiment"] == t["sentiment"] for r, t in answered_sentiment)
+    category_accuracy = sum(set(r["categories"]) == set(t["categories"]) for r, t in answered_category)
+    avoided = len(answered_sentiment) + len(answered_category)
+
+    print(f"测试集 {len(test)} 条，本地分类耗时 {cost * 1000:.0f}ms（每条 {cost / len(test) * 1e6:.0f}µs）")
+    print(f"情感: 本地回答 {len(answered_sentiment) / len(test):.1%}，"
+          f"准确率 {sentiment_accuracy / max(1, len(answered_sentiment)):.1%}")
+    print(f"分类: 本地回答 {len(answered_category) / len(test):.1%}，"
+          f"准确率 {category_accuracy / max(1, len(answered_category)):.1%}")
+    print(f"省掉的大模型调用: {avoided}/{len(test) * 2} ({avoided / (len(test) * 2):.1%})")
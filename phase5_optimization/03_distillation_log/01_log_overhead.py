@@ -0,0 +1,89 @@
+"""
+蒸馏数据记录开销基准测试
+1. 测量 ParquetLogSink.log() 在请求路径上的单次耗时（平均值、p99）
+2. 用很小的队列模拟写盘跟不上的情况，验证记录被丢弃而请求不会被阻塞
+3. 读回 Parquet 文件，合并成训练记录
+4. 坏记录和写盘失败不会让后台线程退出
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import pyarrow.parquet as pq
+
+from common_ai.distill_log import ParquetLogSink, load_distillation_records
+from common_ai.synthetic_data import generate_feedback
+
+CALLS = 100_000
+
+
+def measure(sink, records):
+    """逐条记录，返回每次 log() 的耗时(秒)"""
+    costs = []
+    for i in range(CALLS):
+        record = records[i % len(records)]
+        start = time.perf_counter()
+        sink.log("sentiment", record["feedback"], {"sentiment": record["sentiment"], "confidence": 0.9})
+        costs.append(time.perf_counter() - start)
+    return costs
+
+
+def report(name, costs, sink):
+    costs.sort()
+    print(f"{name}: 平均 {sum(costs) / len(costs) * 1e6:.2f}µs p99 {costs[int(len(costs) * 0.99)] * 1e6:.2f}µs "
+          f"最大 {costs[-1] * 1e6:.0f}µs 统计={sink.stats()}")
+
+
+if __name__ == '__main__':
+    records = generate_feedback(1000)
+    root = tempfile.mkdtemp(prefix="distill_")
+    try:
+        # 1. 正常容量：全部写出
+        sink = ParquetLogSink(root, flush_interval=0.5)
+        costs = measure(sink, records)
+        sink.close()
+        report("正常队列", costs, sink)
+
+        # 2. 队列很小：写盘跟不上时直接丢弃
+        sink = ParquetLogSink(root, flush_interval=0.5, max_queue=1000)
+        costs = measure(sink, records)
+        sink.close()
+        report("小队列(丢弃)", costs, sink)
+
+        # 3. 同时记录分类结果，读回合并
+        sink = ParquetLogSink(root)
+        for record in records:
+            sink.log("categories", record["feedback"], {"categories": record["categories"]})
+        sink.close()
+        merged = load_distillation_records(root)
+        print(f"读回合并后的训练记录: {len(merged)} 条，示例: {merged[0]}")
+
+        # 4. 无法序列化的记录、写盘失败之后，后台线程仍要继续写出
+        bad_root = os.path.join(root, "bad")
+        sink = ParquetLogSink(bad_root, flush_interval=0.1)
+        circular = {}
+        circular["self"] = circular
+        sink.log("categories", "包装破损", {"categories": {"包装"}})
+        sink.log("categories", "循环引用", circular)
+        sink.log("categories", "正常记录", {"categories": ["物流"]})
+        time.sleep(0.5)
+        # 任务目录的位置被一个普通文件占用，写文件失败
+        blocked = os.path.join(bad_root, f"dt={time.strftime('%Y-%m-%d')}", "task=urgency")
+        open(blocked, "w").close()
+        sink.log("urgency", "目录被占用", {"urgency": "高"})
+        time.sleep(0.5)
+        os.remove(blocked)
+        sink.log("urgency", "恢复之后", {"urgency": "低"})
+        sink.close()
+        stats = sink.stats()
+        print(f"写出出错后: 统计={stats}")
+        assert stats["written"] == 3 and stats["failed"] == 2 and stats["errors"] == 2, stats
+        assert stats["last_error"].startswith(("FileExistsError", "NotADirectoryError")), stats
+        table = pq.read_table(os.path.join(os.path.dirname(blocked), "task=categories"))
+        rows = {feedback: json.loads(output) for feedback, output in zip(table["feedback"].to_pylist(),
+                                                                         table["output"].to_pylist())}
+        assert rows == {"包装破损": {"categories": ["包装"]}, "正常记录": {"categories": ["物流"]}}, rows
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,77 @@
+"""
+多进程工作池扩展性基准测试
+用一个 CPU 密集的假模型代替真实模型，链条结构与客户反馈处理系统相同：
+提示词渲染 -> 模型 -> JSON 解析 -> 字典重组
+分别用 1、2、4...N 个进程处理同一批工单，对比吞吐量
+"""
+import hashlib
+import json
+import os
+import time
+
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from common_ai.fake_models import FakeChatModel
+from common_ai.synthetic_data import generate_feedback
+from common_ai.worker_pool import ChainWorkerPool, SharedRateLimiter
+
+TICKETS = 400
+
+
+def cpu_bound_responder(messages):
+    """CPU 密集的假模型：做一段哈希计算后返回 JSON"""
+    digest = messages[-1].content.encode("utf-8")
+    for _ in range(3000):
+        digest = hashlib.sha256(digest).digest()
+    return json.dumps({"sentiment": "NEGATIVE", "confidence": digest[0] / 255, "categories": ["物流问题"]})
+
+
+def build_chain():
+    """在每个工作进程中调用一次，构建链"""
+    prompt = ChatPromptTemplate.from_template("请分析以下客户反馈的情感倾向和问题类型：「{user_input}」")
+    model = FakeChatModel(responder=cpu_bound_responder)
+    return (
+        prompt
+        | model
+        | JsonOutputParser()
+        | RunnableLambda(lambda x: {"sentiment": x.get("sentiment", "NEUTRAL"),
+                                    "confidence": x.get("confidence", 0.8),
+                                    "categories": x["categories"]})
+    )
+
+
+def run(workers, inputs):
+    with ChainWorkerPool(build_chain, workers=workers) as pool:
+        # 预热：确保所有进程都已经构建好链
+        pool.map(inputs[:workers * 2])
+        start = time.perf_counter()
+        pool.map(inputs)
+        return len(inputs) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    inputs = [{"user_input": record["feedback"]} for record in generate_feedback(TICKETS)]
+    cpus = os.cpu_count() or 1
+    print(f"CPU 核数: {cpus}")
+
+    single = build_chain()
+    start = time.perf_counter()
+    for payload in inputs:
+        single.invoke(payload)
+    baseline = len(inputs) / (time.perf_counter() - start)
+    print(f"单进程直接调用: {baseline:.1f} 工单/秒")
+
+    workers = 1
+    while workers <= cpus:
+        throughput = run(workers, inputs)
+        print(f"{workers} 个进程: {throughput:.1f} 工单/秒，加速比 {throughput / baseline:.2f}x")
+        workers *= 2
+
+    # 共享限流器：所有进程加起来每秒最多 50 个请求
+    limiter = SharedRateLimiter(rate=50, burst=5)
+    with ChainWorkerPool(build_chain, workers=min(4, cpus), rate_limiter=limiter) as pool:
+        start = time.perf_counter()
+        pool.map(inputs[:100])
+        print(f"共享限流 50 次/秒，100 个工单耗时 {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,82 @@
+"""
+工作池的故障处理
+工作进程中出现以下情况时，对应任务的 Future 以异常结束，其他任务不受影响，不会有 Future 一直等待:
+1. 异常无法在主进程重建（如 openai.RateLimitError 需要关键字参数 response、body）
+2. 结果无法 pickle（如 lambda）
+3. 工作进程崩溃：正在处理的任务失败；所有进程都退出后，排队中的任务和之后的 submit 也失败
+检查不通过时以非零状态退出
+"""
+import os
+import sys
+
+from langchain_core.runnables import RunnableLambda
+
+from common_ai.worker_pool import ChainWorkerPool, WorkerError
+
+
+class KeywordOnlyError(Exception):
+    """与 openai.APIStatusError 一样需要关键字参数，pickle 后无法重建"""
+
+    def __init__(self, message, *, response):
+        super().__init__(message)
+        self.response = response
+
+
+def handle(payload):
+    if payload == "keyword-only":
+        raise KeywordOnlyError("rate limited", response=429)
+    if payload == "unpicklable":
+        return lambda: None
+    if payload == "value-error":
+        raise ValueError("bad input")
+    if payload == "crash":
+        os._exit(3)
+    return payload * 2
+
+
+def build_chain():
+    return RunnableLambda(handle)
+
+
+def outcome(future):
+    try:
+        return "result", future.result(timeout=30)
+    except WorkerError as e:
+        return "WorkerError", e.type_name
+    except Exception as e:
+        return "error", type(e).__name__
+
+
+def main():
+    failures = 0
+    expected = {
+        "keyword-only": ("WorkerError", "KeywordOnlyError"),
+        "unpicklable": ("WorkerError", "AttributeError"),
+        "value-error": ("error", "ValueError"),
+        3: ("result", 6),
+        "crash": ("WorkerError", "WorkerDied"),
+        4: ("result", 8),
+    }
+    with ChainWorkerPool(build_chain, workers=2) as pool:
+        for payload, want in expected.items():
+            got = outcome(pool.submit(payload))
+            ok = got == want
+            failures += not ok
+            print(f"  {'OK ' if ok else '失败'} {payload!r:<16} -> {got}")
+
+    pool = ChainWorkerPool(build_chain, workers=1)
+    got = [outcome(future) for future in [pool.submit(payload) for payload in ("crash", 1, 2)]]
+    try:
+        pool.submit(3)
+        rejected = False
+    except WorkerError:
+        rejected = True
+    pool.shutdown(timeout=1)
+    ok = all(item == ("WorkerError", "WorkerDied") for item in got) and rejected
+    failures += not ok
+    print(f"  {'OK ' if ok else '失败'} 唯一的工作进程崩溃后排队中的任务失败、新任务被拒绝: {got}")
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)
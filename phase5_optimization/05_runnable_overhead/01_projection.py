@@ -0,0 +1,85 @@
+"""
+字段投影基准测试
+对比客户反馈处理系统中 analysis_chain 之后的两种字典重组方式的单工单开销：
+1. 原写法：九个 lambda 组成的字典（自动转换为 RunnableParallel，每个 lambda 是一个独立节点，经线程池分发）
+2. RunnableProjection：字段路径编译成一个函数，一次调用完成
+分别在关闭追踪和开启追踪（挂一个空回调处理器，模拟 LangSmith 等追踪）两种情况下测量
+"""
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableParallel
+
+from common_ai.projection import RunnableProjection
+
+ROUNDS = 2000
+
+ANALYSIS = {
+    "analysis": {
+        "original_feedback": {"user_input": "订单号：ORD1234567890，物流为什么这么慢，这都10天了？"},
+        "order_id": {"order_id": "ORD1234567890"},
+        "sentiment": {"sentiment": "NEGATIVE", "confidence": 0.92, "key_phrases": ["物流慢", "10天"]},
+        "categories": {"categories": ["物流问题"]},
+        "urgency": {"urgency": "MEDIUM", "sla_hours": 12, "reason": "表达不满"},
+    }
+}
+
+lambda_mapping = RunnableParallel({
+    "original_feedback": lambda x: x["analysis"]["original_feedback"],
+    "order_id": lambda x: x["analysis"]["order_id"]["order_id"],
+    "sentiment": lambda x: x["analysis"]["sentiment"].get("sentiment", "NEUTRAL"),
+    "confidence": lambda x: x["analysis"]["sentiment"].get("confidence", 0.8),
+    "key_phrases": lambda x: x["analysis"]["sentiment"].get("key_phrases", []),
+    "categories": lambda x: x["analysis"]["categories"]["categories"],
+    "urgency": lambda x: x["analysis"]["urgency"]["urgency"],
+    "sla_hours": lambda x: x["analysis"]["urgency"]["sla_hours"],
+    "urgency_reason": lambda x: x["analysis"]["urgency"].get("reason", "")
+})
+
+projection = RunnableProjection({
+    "original_feedback": "analysis.original_feedback",
+    "order_id": "analysis.order_id.order_id",
+    "sentiment": ("analysis.sentiment.sentiment", "NEUTRAL"),
+    "confidence": ("analysis.sentiment.confidence", 0.8),
+    "key_phrases": ("analysis.sentiment.key_phrases", []),
+    "categories": "analysis.categories.categories",
+    "urgency": "analysis.urgency.urgency",
+    "sla_hours": "analysis.urgency.sla_hours",
+    "urgency_reason": ("analysis.urgency.reason", "")
+})
+
+
+class CountingTracer(BaseCallbackHandler):
+    """空的追踪回调，只统计产生了多少个 run"""
+
+    def __init__(self):
+        self.runs = 0
+
+    def on_chain_start(self, serialized, inputs, **kwargs):
+        self.runs += 1
+
+
+def measure(runnable, config=None):
+    runnable.invoke(ANALYSIS, config)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        runnable.invoke(ANALYSIS, config)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+if __name__ == '__main__':
+    assert lambda_mapping.invoke(ANALYSIS) == projection.invoke(ANALYSIS), "两种写法结果必须一致"
+    print("生成的提取函数：")
+    print(projection.source)
+    print()
+
+    for name, tracing in [("关闭追踪", False), ("开启追踪", True)]:
+        results = []
+        for runnable in (lambda_mapping, projection):
+            tracer = CountingTracer()
+            cost = measure(runnable, {"callbacks": [tracer]} if tracing else None)
+            results.append((cost, tracer.runs // (ROUNDS + 1)))
+        (before, before_runs), (after, after_runs) = results
+        runs = f"，每工单 run 数 {before_runs} -> {after_runs}" if tracing else ""
+        print(f"{name}: lambda 字典 {before * 1e6:.0f}µs/工单 -> 投影 {after * 1e6:.1f}µs/工单 "
+              f"({before / after:.0f}x){runs}")
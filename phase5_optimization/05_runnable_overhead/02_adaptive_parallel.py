@@ -0,0 +1,66 @@
+"""
+自适应并行基准测试
+用 02_runnable_parallel.py、03_runnable_passthrough.py 中的函数分别构建 RunnableParallel 和 AdaptiveParallel，
+对比每次 invoke 的开销，并换算成 100 万次调用的总耗时；
+另外检查 io_bound 中声明的分支在计时阶段（第一次调用）就并行执行
+
+用法:
+    python 02_adaptive_parallel.py                 # 每个场景测量 20000 次后换算
+    python 02_adaptive_parallel.py --rounds 1000000
+"""
+import argparse
+import time
+
+from langchain_core.runnables import RunnableParallel, RunnablePassthrough
+
+from common_ai.adaptive_parallel import AdaptiveParallel
+from common_ai.script_loader import load_script
+
+parallel_demo = load_script("phase1_basic/03_langchain_lamdba/02_runnable_parallel.py")
+
+SCENARIOS = {
+    "基础示例 add_one/two/three": (
+        dict(a=parallel_demo.add_one, b=parallel_demo.add_two, c=parallel_demo.add_three), 1),
+    "lambda 平方/立方": (
+        dict(original=lambda x: x, squared=lambda x: x ** 2, cubed=lambda x: x ** 3, doubled=lambda x: x * 2), 3),
+    "数据分析 mean/sum/count/max": (
+        dict(average=parallel_demo.calculate_mean, total=parallel_demo.calculate_sum,
+             count=parallel_demo.calculate_count, maximum=parallel_demo.calculate_max), list(range(1, 11))),
+    "passthrough 保留原始输入": (
+        dict(original=RunnablePassthrough(), doubled=lambda x: x * 2, tripled=lambda x: x * 3), 5),
+}
+
+
+def measure(runnable, value, rounds):
+    for _ in range(5):
+        runnable.invoke(value)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        runnable.invoke(value)
+    return (time.perf_counter() - start) / rounds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, (steps, value) in SCENARIOS.items():
+        parallel = RunnableParallel(steps)
+        adaptive = AdaptiveParallel(steps)
+        assert parallel.invoke(value) == adaptive.invoke(value)
+        before = measure(parallel, value, args.rounds)
+        after = measure(adaptive, value, args.rounds)
+        print(f"{name}: RunnableParallel {before * 1e6:.1f}µs -> AdaptiveParallel {after * 1e6:.1f}µs "
+              f"({before / after:.1f}x)，100 万次约 {before * 1e6:.0f}s -> {after * 1e6:.0f}s，"
+              f"线程池分支: {sorted(adaptive.offloaded_keys)}")
+
+    # 两个声明为 io_bound 的慢分支（模拟模型调用），第一次调用就应并行：耗时接近一个分支而不是两个之和
+    delay = 0.1
+    slow = lambda x: time.sleep(delay) or x
+    adaptive = AdaptiveParallel(a=slow, b=slow, c=parallel_demo.add_one, io_bound={"a", "b"})
+    start = time.perf_counter()
+    adaptive.invoke(1)
+    first = time.perf_counter() - start
+    print(f"io_bound 分支计时阶段的第一次调用: {first * 1000:.0f}ms（单个分支 {delay * 1000:.0f}ms）")
+    assert adaptive.profiling and first < delay * 1.8, "io_bound 分支在计时阶段也必须放到线程池"
@@ -0,0 +1,83 @@
+"""
+向量化批处理基准测试
+1. RunnableMap lambda 示例中的平方、立方：100 万个标量输入
+2. data_analysis_chain 中的 mean/sum/count/max：100 万组 10 个数字
+逐个处理的路径（RunnableLambda.batch）太慢，只测量一部分输入后按比例换算
+
+用法:
+    python 03_vectorized_batch.py --size 1000000 --sample 5000
+"""
+import argparse
+import time
+
+import numpy as np
+from langchain_core.runnables import RunnableLambda
+
+from common_ai.vectorized import RunnableVectorized, vectorized
+
+
+def square_and_cube(x):
+    """原写法：逐个标量计算"""
+    return {"squared": x ** 2, "cubed": x ** 3}
+
+
+@vectorized
+def square_and_cube_vec(x):
+    """向量化写法：x 是一维数组"""
+    return {"squared": x ** 2, "cubed": x ** 3}
+
+
+def analyze(numbers):
+    """原写法：对应 data_analysis_chain 的四个指标"""
+    return {"average": sum(numbers) / len(numbers), "total": sum(numbers),
+            "count": len(numbers), "maximum": max(numbers)}
+
+
+def analyze_vec(numbers: np.ndarray):
+    """向量化写法：numbers 的形状是 (批次, 10)，通过参数类型标注声明可以向量化"""
+    return {"average": numbers.mean(axis=1), "total": numbers.sum(axis=1),
+            "count": np.full(len(numbers), numbers.shape[1]), "maximum": numbers.max(axis=1)}
+
+
+def compare(name, per_item, vectorized_runnable, inputs, sample):
+    expected = per_item.batch(inputs[:10])
+    assert vectorized_runnable.batch(inputs[:10]) == expected, "两种写法结果必须一致"
+
+    start = time.perf_counter()
+    per_item.batch(inputs[:sample])
+    per_item_total = (time.perf_counter() - start) / sample * len(inputs)
+
+    start = time.perf_counter()
+    vectorized_runnable.batch(inputs)
+    vectorized_total = time.perf_counter() - start
+    print(f"{name}: {len(inputs)} 个输入，逐个处理约 {per_item_total:.1f}s（按 {sample} 个换算）"
+          f" -> 向量化 {vectorized_total:.2f}s ({per_item_total / vectorized_total:.0f}x)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--sample", type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    scalars = rng.integers(0, 100, args.size).tolist()
+    compare("平方/立方", RunnableLambda(square_and_cube), RunnableVectorized(square_and_cube_vec),
+            scalars, args.sample)
+
+    rows = rng.integers(1, 100, (args.size, 10)).tolist()
+    compare("mean/sum/count/max", RunnableLambda(analyze), RunnableVectorized(analyze_vec),
+            rows, args.sample)
+
+    # 输入长短不一时无法堆叠，退回逐个调用：每个输入作为长度为 1 的批次，函数看到的仍是 (1, n) 的数组
+    ragged = RunnableVectorized(analyze_vec).batch([[1, 2, 3], [4, 5]])
+    assert ragged == RunnableLambda(analyze).batch([[1, 2, 3], [4, 5]]), "退回逐个调用的结果必须一致"
+    print("长短不一的输入（退回逐个调用）:", ragged)
+
+    # 返回的字段不是每个输入一行（例如误写成标量）时报错，而不是拆出错位的结果
+    try:
+        RunnableVectorized(vectorized(lambda numbers: {"total": numbers.sum()})).batch([1, 2, 3])
+    except ValueError as e:
+        print("字段形状不对时报错:", e)
+    else:
+        raise AssertionError("字段为标量时必须报错")
@@ -0,0 +1,105 @@
+"""
+进程池 RunnableLambda 基准测试
+CPU 密集的预处理：文本规范化 + 隐私信息(手机号、邮箱、订单号)扫描，
+对比 RunnableLambda.batch（线程池，受 GIL 限制）和 RunnableProcessLambda.batch（进程池，分块提交）
+
+用法:
+    python 04_process_lambda.py --texts 20000 --workers 4
+"""
+import argparse
+import os
+import re
+import time
+import unicodedata
+
+import numpy as np
+from langchain_core.runnables import RunnableLambda
+
+from common_ai import process_lambda
+from common_ai.process_lambda import RunnableProcessLambda
+from common_ai.synthetic_data import generate_feedback
+
+PII_PATTERNS = [
+    re.compile(r'(\+86)?1[3-9]\d{9}'),
+    re.compile(r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+'),
+    re.compile(r'ORD\d{10}'),
+]
+
+
+def normalize_and_scan(text):
+    """模拟较重的预处理：多轮规范化 + 正则扫描，返回脱敏文本和命中数"""
+    hits = 0
+    for _ in range(20):
+        text = unicodedata.normalize("NFKC", text).strip()
+        for pattern in PII_PATTERNS:
+            hits += len(pattern.findall(text))
+    for pattern in PII_PATTERNS:
+        text = pattern.sub("[MASK]", text)
+    return {"text": text, "pii_hits": hits}
+
+
+def column_stats(matrix):
+    """大数组输入：通过共享内存传给子进程"""
+    return float(matrix.mean()), float(matrix.std())
+
+
+def head_rows(matrix):
+    """返回值中带着共享内存上的视图，需要复制出来后子进程才能释放共享内存"""
+    return {"head": matrix[:2], "shape": matrix.shape}
+
+
+def payload_type(data):
+    """大 bytes 输入：子进程中拿到的仍是 bytes"""
+    return type(data).__name__, len(data)
+
+
+def fail_on_array(matrix):
+    raise ValueError(f"坏数据 {matrix.shape}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    texts = [record["feedback"] + " 联系电话13812345678 邮箱test@example.com" * 3
+             for record in generate_feedback(args.texts)]
+    print(f"CPU 核数: {os.cpu_count()}，进程数: {args.workers}")
+
+    start = time.perf_counter()
+    expected = RunnableLambda(normalize_and_scan).batch(texts)
+    threads = time.perf_counter() - start
+    print(f"RunnableLambda.batch（线程池）: {threads:.2f}s")
+
+    processes = RunnableProcessLambda(normalize_and_scan, max_workers=args.workers)
+    processes.batch(texts[:100])  # 预热：启动进程
+    start = time.perf_counter()
+    result = processes.batch(texts)
+    elapsed = time.perf_counter() - start
+    assert result == expected
+    print(f"RunnableProcessLambda.batch（进程池）: {elapsed:.2f}s，加速比 {threads / elapsed:.2f}x")
+
+    unchunked = RunnableProcessLambda(normalize_and_scan, chunk_size=1)
+    start = time.perf_counter()
+    unchunked.batch(texts[:2000])
+    print(f"不分块（每个输入一次进程间通信），2000 条: {time.perf_counter() - start:.2f}s")
+
+    matrix = np.random.default_rng(0).random((2000, 2000))
+    start = time.perf_counter()
+    print("共享内存传递 32MB 数组:", RunnableProcessLambda(column_stats).invoke(matrix),
+          f"{(time.perf_counter() - start) * 1000:.0f}ms")
+
+    head = RunnableProcessLambda(head_rows).invoke(matrix)
+    assert np.array_equal(head["head"], matrix[:2]) and head["shape"] == matrix.shape
+    data = os.urandom(1 << 20)
+    assert RunnableProcessLambda(payload_type).invoke(data) == ("bytes", len(data))
+    try:
+        RunnableProcessLambda(fail_on_array).invoke(matrix)
+    except ValueError as e:
+        assert "坏数据" in str(e)
+    else:
+        raise AssertionError("子进程中的异常没有传回")
+    assert RunnableProcessLambda(column_stats).invoke(matrix) == (float(matrix.mean()), float(matrix.std()))
+    print("共享内存: 返回视图、bytes 输入、函数抛出异常后都能正常释放")
+    process_lambda.shutdown_process_pool()
@@ -0,0 +1,95 @@
+"""
+链静态优化基准测试
+用 03_runnable_passthrough.py 中的链和 01_runnable_lambda.py 中的 itemgetter | RunnableLambda 分支，
+先检查优化前后结果一致，再对比每次 invoke 的开销；
+另外检查开启 hoist_constants 时只有字面量分支被提前计算，优化过程不调用用户函数
+
+用法:
+    python 05_chain_optimizer.py --rounds 20000
+"""
+import argparse
+import time
+import uuid
+from operator import itemgetter
+
+from langchain_core.runnables import RunnableLambda, RunnableParallel, chain
+
+from common_ai.chain_optimizer import ChainOptimizer
+from common_ai.script_loader import load_script
+
+passthrough_demo = load_script("phase1_basic/03_langchain_lamdba/03_runnable_passthrough.py")
+
+
+def length_function(text):
+    return len(text)
+
+
+@chain
+def multiple_length_function(inputs):
+    return len(inputs["text1"]) * len(inputs["text2"])
+
+
+# 01_runnable_lambda.py 中 prompt 之前的部分（prompt | model 之后的节点不参与优化）
+lambda_demo_inputs = {
+    "a": itemgetter("k1") | RunnableLambda(length_function),
+    "b": {"text1": itemgetter("k1"), "text2": itemgetter("k2")} | multiple_length_function,
+}
+
+SCENARIOS = {
+    "组合链 lambda | passthrough | lambda": (passthrough_demo.combined_chain, "test"),
+    "passthrough | lambda": (passthrough_demo.lambda_chain, "Hello "),
+    "passthrough | itemgetter": (passthrough_demo.getter_chain, {"name": "Alice", "age": 30, "city": "Beijing"}),
+    "assign 示例 1": (passthrough_demo.chain_simple, {"k1": "hello world"}),
+    "RunnableParallel 嵌套 assign": (passthrough_demo.chain, {"k1": "hello world"}),
+    "RunnableParallel 保留原始输入": (passthrough_demo.parallel_chain, 5),
+    "itemgetter | length_function": (RunnableParallel(lambda_demo_inputs), {"k1": "123", "k2": "4567"}),
+    "含常量分支": (RunnableParallel(version=lambda _: {"model": "qwen-plus", "temperature": 0.7},
+                                 length=itemgetter("k1") | RunnableLambda(length_function)), {"k1": "hello"}),
+}
+# 这些场景开启 hoist_constants（默认关闭）
+HOIST = {"含常量分支"}
+
+
+def check_hoisting():
+    """不使用输入但每次结果不同、有副作用的分支不能被提前计算，优化时也不能被调用"""
+    calls = []
+    side_effect = lambda _: calls.append(1) or len(calls)
+    original = RunnableParallel(ts=lambda _: time.time(), rid=lambda _: str(uuid.uuid4()), n=side_effect,
+                                version=lambda _: ("qwen-plus", 0.7))
+    optimizer = ChainOptimizer(hoist_constants=True)
+    optimized = optimizer.optimize(original)
+    assert not calls, "优化过程不能调用用户函数"
+    first, second = optimized.invoke(None), optimized.invoke(None)
+    assert first["rid"] != second["rid"] and first["n"] != second["n"], "每次结果不同的分支不能被提前计算"
+    hoisted = [change for change in optimizer.changes if change.startswith("常量分支")]
+    assert hoisted == ["常量分支 'version' 提前计算"], hoisted
+    print("hoist_constants: 只有字面量分支 'version' 被提前计算，time.time()、uuid4()、有副作用的分支每次调用都重新计算")
+
+
+def measure(runnable, value, rounds):
+    for _ in range(5):
+        runnable.invoke(value)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        runnable.invoke(value)
+    return (time.perf_counter() - start) / rounds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, (original, value) in SCENARIOS.items():
+        optimizer = ChainOptimizer(hoist_constants=name in HOIST)
+        optimized = optimizer.optimize(original)
+        # 等价性检查：单次调用、batch 的结果都必须一致
+        assert optimized.invoke(value) == original.invoke(value), name
+        assert optimized.batch([value] * 3) == original.batch([value] * 3), name
+
+        before = measure(original, value, args.rounds)
+        after = measure(optimized, value, args.rounds)
+        print(f"{name}: {before * 1e6:.0f}µs -> {after * 1e6:.0f}µs ({before / after:.1f}x)")
+        for change in optimizer.changes:
+            print(f"    - {change}")
+    check_hoisting()
@@ -0,0 +1,120 @@
+"""
+带缓存的 RunnableLambda 基准测试
+1. 客户反馈处理系统：提取链和分析链都引用 extract_order_id，工单中有重复反馈，
+   对比 不缓存 / LRU 缓存 / LRU + 请求级去重 三种方式下 extract_order_id 的实际执行次数和耗时
+2. 纯函数节点（length_function、pass_through、本地情感分析）在重复输入下的单次调用开销和命中率
+
+用法:
+    python 06_memoized_lambda.py --tickets 600 --unique 120
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from langchain_core.runnables import RunnableLambda, RunnableParallel
+
+from common_ai.fake_models import FakeChatModel
+from common_ai.local_analyzers import local_sentiment
+from common_ai.memo import MemoizedLambda, RequestScoped
+from common_ai.script_loader import load_script
+from common_ai.synthetic_data import generate_feedback
+
+demo = load_script("phase1_basic/05_project_demo/01_project_demo1.py")
+injector = load_script("phase5_optimization/01_tail_latency/02_circuit_breaker.py").FaultInjector()
+demo.model_special = FakeChatModel(responder=injector)
+passthrough_demo = load_script("phase1_basic/03_langchain_lamdba/03_runnable_passthrough.py")
+
+
+def length_function(text):
+    """01_runnable_lambda.py 中的 length_function"""
+    return len(text)
+
+
+class CountingFunc:
+    """统计函数实际执行次数"""
+
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = func.__name__
+        self.calls = 0
+
+    def __call__(self, x):
+        self.calls += 1
+        return self.func(x)
+
+
+def build_chain(order_id_step):
+    """与示例中的 extract_chain、analysis_chain 结构相同，两条链同时执行"""
+    extract_chain = RunnableParallel(order_id=order_id_step, original_feedback=lambda x: x)
+    analysis_chain = RunnableParallel(
+        original_feedback=lambda x: x,
+        order_id=order_id_step,
+        sentiment=demo.analyze_sentiment,
+        categories=demo.classify_issue,
+        urgency=demo.assess_priority,
+    )
+    return RunnableParallel(extract=extract_chain, analysis=analysis_chain)
+
+
+def run_demo(tickets):
+    variants = {
+        "不缓存": lambda f: RunnableLambda(f),
+        "LRU 缓存": lambda f: MemoizedLambda(f, maxsize=4096),
+        "只做请求级去重": lambda f: MemoizedLambda(f, maxsize=0),
+        "LRU + 请求级去重": lambda f: MemoizedLambda(f, maxsize=4096),
+    }
+    for name, wrap in variants.items():
+        counting = CountingFunc(demo.extract_order_id)
+        step = wrap(counting)
+        chain = build_chain(step)
+        if "请求级" in name:
+            chain = RequestScoped(chain)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for ticket in tickets:
+                chain.invoke({"user_input": ticket})
+        cost = time.perf_counter() - start
+        hit_rate = f"，命中率 {step.stats()['hit_rate']:.0%}" if isinstance(step, MemoizedLambda) else ""
+        print(f"{name}: extract_order_id 执行 {counting.calls} 次 / 引用 {len(tickets) * 2} 次，"
+              f"总耗时 {cost:.2f}s{hit_rate}")
+
+
+def measure(runnable, inputs, rounds):
+    for item in inputs[:5]:
+        runnable.invoke(item)
+    start = time.perf_counter()
+    for i in range(rounds):
+        runnable.invoke(inputs[i % len(inputs)])
+    return (time.perf_counter() - start) / rounds
+
+
+def run_pure(texts, rounds):
+    functions = {
+        "length_function": length_function,
+        "pass_through": passthrough_demo.pass_through,
+        "local_sentiment": local_sentiment,
+    }
+    for name, func in functions.items():
+        plain = measure(RunnableLambda(func), texts, rounds)
+        memo = MemoizedLambda(func)
+        cached = measure(memo, texts, rounds)
+        print(f"{name}: {plain * 1e6:.0f}µs -> {cached * 1e6:.0f}µs，命中率 {memo.stats()['hit_rate']:.0%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=600)
+    parser.add_argument("--unique", type=int, default=120)
+    parser.add_argument("--rounds", type=int, default=5000)
+    args = parser.parse_args()
+
+    pool = [record["feedback"] for record in generate_feedback(args.unique, seed=7)]
+    rng = random.Random(0)
+    tickets = [rng.choice(pool) for _ in range(args.tickets)]
+
+    print(f"=== 1. 客户反馈处理：{args.tickets} 个工单，{len(set(tickets))} 条不同反馈 ===")
+    run_demo(tickets)
+    print("\n=== 2. 纯函数节点单次调用开销 ===")
+    run_pure(pool, args.rounds)
@@ -0,0 +1,87 @@
+"""
+快速模式基准测试 - 框架开销
+用 01_runnableSequence.py 中的 prompt | model | out，模型替换为零延迟的假模型，
+这样测到的时间全部是框架和节点本身的开销：
+1. 每个节点：invoke() 与节点核心逻辑的耗时差，即每个节点的框架开销
+2. 整条链：原链 invoke 与 FastChain 快速路径
+3. 传入回调时 FastChain 退回原链，回调照常触发；嵌套在带回调的外层链中时也一样
+
+用法:
+    python 07_fast_path.py --rounds 20000
+"""
+import argparse
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from common_ai.fake_models import FakeChatModel
+from common_ai.fast_path import FastChain, callbacks_active, compile_step
+
+prompt = PromptTemplate(input_variables=["topic"], template="用5句话来介绍{topic}")
+model = FakeChatModel()
+out = StrOutputParser()
+chain = prompt | model | out
+
+
+class CountingHandler(BaseCallbackHandler):
+    def __init__(self):
+        self.events = 0
+
+    def on_chain_start(self, *args, **kwargs):
+        self.events += 1
+
+    def on_chat_model_start(self, *args, **kwargs):
+        self.events += 1
+
+
+def measure(func, value, rounds):
+    for _ in range(20):
+        func(value)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(value)
+    return (time.perf_counter() - start) / rounds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    print("=== 1. 每个节点的框架开销 ===")
+    value = {"topic": "人工智能"}
+    for step in chain.steps:
+        core = compile_step(step)
+        invoke_cost = measure(step.invoke, value, args.rounds)
+        core_cost = measure(core, value, args.rounds)
+        print(f"{step.get_name():>16}: invoke {invoke_cost * 1e6:6.1f}µs，核心逻辑 {core_cost * 1e6:6.1f}µs，"
+              f"框架开销 {(invoke_cost - core_cost) * 1e6:6.1f}µs")
+        value = core(value)
+
+    print("\n=== 2. 整条链 ===")
+    fast = FastChain(chain)
+    value = {"topic": "大数据"}
+    assert fast.invoke(value) == chain.invoke(value)
+    normal_cost = measure(chain.invoke, value, args.rounds)
+    fast_cost = measure(fast.invoke, value, args.rounds)
+    check_cost = measure(callbacks_active, None, args.rounds)
+    print(f"原链 invoke: {normal_cost * 1e6:.1f}µs")
+    print(f"FastChain:   {fast_cost * 1e6:.1f}µs（其中回调检测 {check_cost * 1e6:.1f}µs），"
+          f"{normal_cost / fast_cost:.1f}x")
+    print(f"100 万次调用节省 {(normal_cost - fast_cost) * 1e6:.0f}s")
+
+    print("\n=== 3. 有回调时退回原链 ===")
+    handler = CountingHandler()
+    result = fast.invoke(value, config={"callbacks": [handler]})
+    print(f"结果一致: {result == chain.invoke(value)}，回调事件数: {handler.events}")
+    assert handler.events > 0, "传入回调时必须触发回调"
+
+    # 外层 RunnableLambda 带回调，FastChain 在其中调用：回调从上下文继承，子链的 run 不能丢
+    nested = CountingHandler()
+    outer = RunnableLambda(lambda x: fast.invoke(x))
+    outer.invoke(value, config={"callbacks": [nested]})
+    print(f"嵌套在带回调的外层链中: 回调事件数 {nested.events}（外层 1 个 + 子链的 run）")
+    assert nested.events > 1, "嵌套调用时 FastChain 必须退回原链，子链的 run 要出现在外层的回调中"
@@ -0,0 +1,416 @@
+"""
+框架开销基准套件
+把 phase1_basic、phase2_core 中各种形态的链（顺序链、batch、stream、并行、assign、消息历史、项目示例、
+带工具的智能体、带记忆的智能体、中间件）接到确定性的假模型上，分别统计：
+1. 框架开销：零延迟假模型下每次调用的耗时，以及平均到每个 run（节点）的开销
+2. 内存分配：tracemalloc 统计每次调用的峰值分配和调用结束后仍然保留的内存
+3. 端到端：按配置的模型延迟和生成速度执行，统计吞吐量和 p50/p99
+结果保存为 JSON，可以与上一次的结果对比
+
+用法:
+    python 01_overhead_suite.py                                  # 全部场景，结果写入 results/
+    python 01_overhead_suite.py --only agent --rounds 100
+    python 01_overhead_suite.py --latency 0.05 --tokens-per-second 40
+    python 01_overhead_suite.py --compare results/overhead-20261018-120000.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime
+from operator import itemgetter
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import langchain_core
+from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
+from langchain_core.runnables import RunnableLambda, RunnableParallel, RunnableWithMessageHistory
+
+from common_ai.fake_models import FakeChatModel, heavy_tail_latency
+from common_ai.script_loader import load_script
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+class ModelSettings:
+    """所有场景共用的假模型配置，零延迟模式用于测量框架开销"""
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: Optional[float] = None, tail: bool = False):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.tail = tail
+
+    @property
+    def simulated(self) -> bool:
+        """是否模拟模型耗时（首 token 延迟或生成速度任一项），否则端到端测试直接复用零延迟的场景"""
+        return self.latency > 0 or bool(self.tokens_per_second)
+
+    def make(self, responder=None) -> FakeChatModel:
+        if self.latency <= 0:
+            latency = None
+        elif self.tail:
+            # 固定种子，每次运行的延迟序列相同
+            latency = heavy_tail_latency(self.latency, rng=random.Random(0))
+        else:
+            latency = lambda: self.latency
+        return FakeChatModel(responder=responder, latency=latency, tokens_per_second=self.tokens_per_second)
+
+
+class RunCounter(BaseCallbackHandler):
+    """统计一次调用产生的 run 数（链、模型、工具）"""
+
+    def __init__(self):
+        self.runs = 0
+
+    def on_chain_start(self, *args, **kwargs):
+        self.runs += 1
+
+    def on_chat_model_start(self, *args, **kwargs):
+        self.runs += 1
+
+    def on_tool_start(self, *args, **kwargs):
+        self.runs += 1
+
+
+# ---------------------------------------------------------------------------
+# 场景：每个函数返回 run(i, config)，执行一次完整请求
+# ---------------------------------------------------------------------------
+
+def reply_text(messages):
+    return "这是一个用于基准测试的固定回复，长度大约三十个字左右。"
+
+
+def tool_responder(messages):
+    """第一轮调用工具，拿到工具结果后给出最终回复"""
+    if isinstance(messages[-1], ToolMessage):
+        return "根据查询结果：" + messages[-1].content
+    return AIMessage(content="", tool_calls=[{"name": "get_weather", "args": {"input": "北京"}, "id": "call_1"}])
+
+
+def sequence_scenario(settings):
+    """02_langchain_basic/01_runnableSequence.py: prompt | model | out"""
+    prompt = PromptTemplate(input_variables=["topic"], template="用5句话来介绍{topic}")
+    chain = prompt | settings.make(reply_text) | StrOutputParser()
+    return lambda i, config: chain.invoke({"topic": "人工智能"}, config)
+
+
+def chat_prompt_scenario(settings):
+    """04_message_history/01_no_memory.py: 系统 + 用户 + AI 消息模板"""
+    prompt = ChatPromptTemplate.from_messages([("system", "你是一个工具"), ("human", "{text}"), ("ai", "测试问题")])
+    chain = prompt | settings.make(reply_text) | StrOutputParser()
+    return lambda i, config: chain.invoke({"text": "我是嘟嘟嘟猫，请记住"}, config)
+
+
+def batch_scenario(settings):
+    """02_langchain_basic/04_batch.py: 一次 batch 4 个主题"""
+    chain = ChatPromptTemplate.from_template("请用一句话概括{topic}") | settings.make(reply_text) | StrOutputParser()
+    inputs = [{"topic": topic} for topic in ["人工智能", "区块链", "量子计算", "基因编辑"]]
+    return lambda i, config: chain.batch(inputs, config)
+
+
+def stream_scenario(settings):
+    """02_langchain_basic/03_stream.py: 逐块消费输出"""
+    chain = ChatPromptTemplate.from_template("讲一个关于{topic}的故事") | settings.make(reply_text) | StrOutputParser()
+
+    def run(i, config):
+        for _ in chain.stream({"topic": "程序员"}, config):
+            pass
+
+    return run
+
+
+def parallel_scenario(settings):
+    """03_langchain_lamdba/02_runnable_parallel.py: 纯函数并行分支"""
+    demo = load_script("phase1_basic/03_langchain_lamdba/02_runnable_parallel.py")
+    chain = RunnableParallel(a=demo.add_one, b=demo.add_two, c=demo.add_three)
+    return lambda i, config: chain.invoke(1, config)
+
+
+def passthrough_assign_scenario(settings):
+    """03_langchain_lamdba/03_runnable_passthrough.py: assign 与嵌套并行"""
+    demo = load_script("phase1_basic/03_langchain_lamdba/03_runnable_passthrough.py")
+    return lambda i, config: demo.chain.invoke({"k1": "hello world"}, config)
+
+
+def lambda_prompt_scenario(settings):
+    """03_langchain_lamdba/01_runnable_lambda.py: itemgetter | RunnableLambda 分支 -> prompt | model | out"""
+    prompt = ChatPromptTemplate.from_template("{a} + {b} = ? 计算结果是多少？")
+    chain = (
+            {"a": itemgetter("k1") | RunnableLambda(len), "b": itemgetter("k2") | RunnableLambda(len)}
+            | prompt | settings.make(reply_text) | StrOutputParser()
+    )
+    return lambda i, config: chain.invoke({"k1": "123", "k2": "456"}, config)
+
+
+def message_history_scenario(settings):
+    """04_message_history/03_runnable_with_message_history.py: 10 个会话轮流对话，历史超过 20 条时清空"""
+    store: Dict[str, ChatMessageHistory] = {}
+
+    def get_session_history(session_id):
+        history = store.setdefault(session_id, ChatMessageHistory())
+        if len(history.messages) >= 20:
+            history.clear()
+        return history
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "你是一个工具"), MessagesPlaceholder(variable_name="history"), ("human", "{text}")])
+    chain = RunnableWithMessageHistory(
+        prompt | settings.make(reply_text) | StrOutputParser(), get_session_history,
+        input_messages_key="text", history_messages_key="history")
+
+    def run(i, config):
+        config = {**(config or {}), "configurable": {"session_id": f"s{i % 10}"}}
+        return chain.invoke({"text": "我是谁"}, config)
+
+    return run
+
+
+def project_demo_scenario(settings):
+    """05_project_demo/01_project_demo1.py: 客户反馈处理系统完整链条"""
+    demo = load_script("phase1_basic/05_project_demo/01_project_demo1.py")
+    injector = load_script("phase5_optimization/01_tail_latency/02_circuit_breaker.py").FaultInjector()
+    demo.model_special = settings.make(injector)
+    demo.pre_classifier = None
+    ticket = {"user_input": "订单号：ORD1234567890，物流为什么这么慢，这都10天了？"}
+
+    def run(i, config):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return demo.processing_chain.invoke(ticket, config)
+
+    return run
+
+
+def _weather_tool():
+    from langchain_core.tools import tool
+
+    @tool
+    def get_weather(input: str = "") -> str:
+        """返回模拟天气信息"""
+        return "天气信息：晴转多云，温度23℃，风级3级。"
+
+    return get_weather
+
+
+def agent_tools_scenario(settings):
+    """phase2_core/01_agent_tools: 一次工具调用 + 最终回复"""
+    from langchain.agents import create_agent
+
+    agent = create_agent(model=settings.make(tool_responder), tools=[_weather_tool()],
+                         system_prompt="你是人工智能助手。需要帮助用户解决各种问题。")
+    return lambda i, config: agent.invoke({"messages": [{"role": "user", "content": "今天天气怎么样"}]}, config)
+
+
+def agent_memory_scenario(settings):
+    """phase2_core/02_agent_memory: InMemorySaver 短期记忆，10 个会话轮流对话"""
+    from langchain.agents import create_agent
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    agent = create_agent(model=settings.make(reply_text), tools=[], system_prompt="你是一个有帮助的助手。",
+                         checkpointer=InMemorySaver())
+
+    def run(i, config):
+        config = {**(config or {}), "configurable": {"thread_id": f"t{i % 10}"}}
+        return agent.invoke({"messages": [{"role": "user", "content": "我叫张三"}]}, config)
+
+    return run
+
+
+def middleware_scenario(settings):
+    """phase2_core/03_middleware_basics: 脱敏中间件 before_model/after_model + 工具调用"""
+    import re
+
+    from langchain.agents import create_agent
+    from langchain.agents.middleware import AgentMiddleware
+
+    class DesensitizeMiddleware(AgentMiddleware):
+        patterns = [(re.compile(r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+'), '[EMAIL]'),
+                    (re.compile(r'(\+86)?1[3-9]\d{9}'), '[PHONE]')]
+
+        def before_model(self, state, runtime=None):
+            for message in state.get("messages", []):
+                if isinstance(message.content, str):
+                    for pattern, replacement in self.patterns:
+                        message.content = pattern.sub(replacement, message.content)
+            return None
+
+        def after_model(self, state, runtime=None):
+            return None
+
+    agent = create_agent(model=settings.make(tool_responder), tools=[_weather_tool()],
+                         system_prompt="你是人工智能助手。", middleware=[DesensitizeMiddleware()])
+    message = {"role": "user", "content": "我的手机号13812345678，邮箱test@example.com，查一下天气"}
+    return lambda i, config: agent.invoke({"messages": [message]}, config)
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "sequence": sequence_scenario,
+    "chat_prompt": chat_prompt_scenario,
+    "batch": batch_scenario,
+    "stream": stream_scenario,
+    "parallel": parallel_scenario,
+    "passthrough_assign": passthrough_assign_scenario,
+    "lambda_prompt": lambda_prompt_scenario,
+    "message_history": message_history_scenario,
+    "project_demo": project_demo_scenario,
+    "agent_tools": agent_tools_scenario,
+    "agent_memory": agent_memory_scenario,
+    "middleware": middleware_scenario,
+}
+
+
+# ---------------------------------------------------------------------------
+# 测量
+# ---------------------------------------------------------------------------
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def measure_overhead(run, rounds):
+    """零延迟假模型：耗时全部是框架和节点自身的开销"""
+    for i in range(5):
+        run(i, None)
+    counter = RunCounter()
+    run(0, {"callbacks": [counter]})
+    samples = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        run(i, None)
+        samples.append(time.perf_counter() - start)
+    mean = statistics.fmean(samples)
+    return {
+        "runs": counter.runs,
+        "overhead_us": mean * 1e6,
+        "overhead_per_run_us": mean * 1e6 / max(1, counter.runs),
+        "overhead_p99_us": percentile(samples, 0.99) * 1e6,
+    }
+
+
+def measure_allocations(run, rounds):
+    tracemalloc.start()
+    try:
+        run(0, None)
+        peaks = []
+        baseline = tracemalloc.get_traced_memory()[0]
+        for i in range(rounds):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            run(i, None)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    return {"peak_alloc_kb": statistics.fmean(peaks) / 1024, "retained_kb_per_call": retained / rounds / 1024}
+
+
+def measure_end_to_end(run, rounds):
+    samples = []
+    start_all = time.perf_counter()
+    for i in range(rounds):
+        start = time.perf_counter()
+        run(i, None)
+        samples.append(time.perf_counter() - start)
+    total = time.perf_counter() - start_all
+    return {
+        "throughput_per_s": rounds / total,
+        "p50_ms": percentile(samples, 0.50) * 1e3,
+        "p99_ms": percentile(samples, 0.99) * 1e3,
+    }
+
+
+def run_suite(names, rounds, alloc_rounds, settings):
+    results = {}
+    zero_latency = ModelSettings()
+    for name in names:
+        try:
+            overhead_run = SCENARIOS[name](zero_latency)
+            e2e_run = SCENARIOS[name](settings) if settings.simulated else overhead_run
+        except ImportError as e:
+            print(f"{name:>20}: 跳过（依赖无法导入: {e}）")
+            results[name] = {"skipped": str(e)}
+            continue
+        result = measure_overhead(overhead_run, rounds)
+        result.update(measure_allocations(overhead_run, alloc_rounds))
+        result.update(measure_end_to_end(e2e_run, rounds))
+        results[name] = result
+        print(f"{name:>20}: {result['runs']:3d} runs，开销 {result['overhead_us']:8.0f}µs"
+              f"（每个 run {result['overhead_per_run_us']:5.0f}µs），峰值分配 {result['peak_alloc_kb']:7.1f}KB，"
+              f"保留 {result['retained_kb_per_call']:5.2f}KB/次，{result['throughput_per_s']:7.0f} 次/s，"
+              f"p50 {result['p50_ms']:6.2f}ms，p99 {result['p99_ms']:6.2f}ms")
+    return results
+
+
+def compare(current, meta, previous_path, tolerance):
+    """与上一次的结果对比，开销、分配或 p99 变差超过 tolerance 的场景标记为回归"""
+    previous_report = json.loads(Path(previous_path).read_text(encoding="utf-8"))
+    previous = previous_report["scenarios"]
+    metrics = ["overhead_us", "peak_alloc_kb", "p99_ms"]
+    model_keys = ("latency", "tokens_per_second", "tail")
+    if any(previous_report["meta"].get(key) != meta[key] for key in model_keys):
+        print("\n两次的模型延迟配置不同，只对比框架开销和内存分配")
+        metrics = metrics[:2]
+    regressions = []
+    print(f"\n与 {previous_path} 对比:")
+    for name, result in current.items():
+        old = previous.get(name)
+        if not old or "skipped" in old or "skipped" in result:
+            continue
+        for metric in metrics:
+            change = result[metric] / old[metric] - 1 if old[metric] else 0.0
+            flag = ""
+            if change > tolerance:
+                flag = "  <-- 回归"
+                regressions.append((name, metric))
+            print(f"{name:>20} {metric:>14}: {old[metric]:10.1f} -> {result[metric]:10.1f} ({change:+.1%}){flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", default="", help="只运行名称包含该字符串的场景")
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--alloc-rounds", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="端到端测试中每次模型调用的延迟(秒)")
+    parser.add_argument("--tokens-per-second", type=float, default=None,
+                        help="端到端测试中模型的生成速度，单独设置时也会模拟（没有首 token 延迟）")
+    parser.add_argument("--tail", action="store_true", help="模型延迟使用固定种子的重尾分布")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="上一次的结果文件")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    names = [name for name in SCENARIOS if args.only in name]
+    settings = ModelSettings(args.latency, args.tokens_per_second, args.tail)
+    scenarios = run_suite(names, args.rounds, args.alloc_rounds, settings)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "langchain_core": langchain_core.__version__,
+            "rounds": args.rounds,
+            "latency": args.latency,
+            "tokens_per_second": args.tokens_per_second,
+            "tail": args.tail,
+        },
+        "scenarios": scenarios,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"overhead-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n结果已保存到 {output}")
+
+    if args.compare:
+        regressions = compare(scenarios, report["meta"], args.compare, args.tolerance)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} 项指标回归")
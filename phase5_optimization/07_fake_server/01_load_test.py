@@ -0,0 +1,138 @@
+"""
+假模型服务压测
+1. 流式、工具调用、向量、排序接口各调用一次，并演示 429 注入
+2. 用 aiohttp 直接压测 /chat/completions，得到服务本身的上限
+3. 用 OpenAI 异步客户端压测，统计每秒请求数和延迟分位数
+4. prompt | ChatOpenAI | out 链条通过 abatch 压测，对比客户端和链条自身的开销
+
+服务默认在当前进程的后台线程中启动；压测客户端和服务抢同一个 CPU 时数值偏低，
+可以先在另一个终端启动服务，再用 --base-url 指定:
+    python -m common_ai.fake_server --port 8000
+    python 01_load_test.py --base-url http://127.0.0.1:8000/v1
+
+用法:
+    python 01_load_test.py --requests 5000 --concurrency 200
+"""
+import argparse
+import asyncio
+import contextlib
+import time
+
+import aiohttp
+import httpx
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import tool
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from openai import AsyncOpenAI, RateLimitError
+
+from common_ai.ai_variable import ALI_TONGYI_MAX_MODEL
+from common_ai.fake_server import FakeLLMServer
+
+
+@tool
+def get_weather(city: str = "") -> str:
+    """返回模拟天气信息"""
+    return "天气信息：晴转多云，温度23℃，风级3级。"
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report(name, samples, elapsed):
+    print(f"{name}: {len(samples)} 个请求，{len(samples) / elapsed:.0f} 次/s，"
+          f"p50 {percentile(samples, 0.5) * 1000:.1f}ms，p99 {percentile(samples, 0.99) * 1000:.1f}ms")
+
+
+async def load_server(base_url, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+    body = {"model": ALI_TONGYI_MAX_MODEL, "messages": [{"role": "user", "content": "你好"}]}
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.post(f"{base_url}/chat/completions", json=body) as response:
+                    await response.read()
+                samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+    report("aiohttp 直连（服务上限）", samples, time.perf_counter() - start)
+
+
+async def load_raw(base_url, requests, concurrency):
+    client = AsyncOpenAI(api_key="fake-key", base_url=base_url, max_retries=0)
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await client.chat.completions.create(
+                model=ALI_TONGYI_MAX_MODEL, messages=[{"role": "user", "content": f"第{i}个请求"}])
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    report("OpenAI 客户端直连", samples, time.perf_counter() - start)
+    await client.close()
+
+
+async def load_chain(base_url, requests, concurrency):
+    model = ChatOpenAI(model=ALI_TONGYI_MAX_MODEL, api_key="fake-key", base_url=base_url, max_retries=0)
+    chain = ChatPromptTemplate.from_template("用一句话介绍{topic}") | model | StrOutputParser()
+    inputs = [{"topic": f"主题{i}"} for i in range(requests)]
+    start = time.perf_counter()
+    await chain.abatch(inputs, config={"max_concurrency": concurrency})
+    elapsed = time.perf_counter() - start
+    print(f"prompt | ChatOpenAI | out: {requests} 个请求，{requests / elapsed:.0f} 次/s")
+
+
+def features(server, base_url):
+    model = ChatOpenAI(model=ALI_TONGYI_MAX_MODEL, api_key="fake-key", base_url=base_url, max_retries=0)
+    print("非流式:", model.invoke("你好").content)
+    print("流式:", "|".join(chunk.content for chunk in model.stream("你好") if chunk.content)[:40])
+    print("工具调用:", model.bind_tools([get_weather]).invoke("北京天气怎么样").tool_calls)
+    embeddings = OpenAIEmbeddings(model="text-embedding-v3", api_key="fake-key", base_url=base_url,
+                                  check_embedding_ctx_length=False)
+    print("向量维度:", len(embeddings.embed_query("物流太慢了")))
+    rerank = httpx.post(f"{base_url}/rerank", json={
+        "query": "物流太慢", "documents": ["物流太慢了，十天还没到", "商品质量很好"], "top_n": 2}).json()
+    print("排序:", rerank["results"])
+    # OpenAI SDK 之外的客户端常把未设置的可选字段显式传成 null
+    response = httpx.post(f"{base_url}/chat/completions", json={
+        "model": ALI_TONGYI_MAX_MODEL, "messages": [{"role": "user", "content": "你好"}],
+        "stream": True, "stream_options": None})
+    assert response.status_code == 200 and "data: [DONE]" in response.text, response.text[:200]
+    print("stream_options 为 null 的流式请求:", response.status_code)
+    if server is not None:
+        server.fail_next(1, status=429)
+        try:
+            model.invoke("你好")
+        except RateLimitError as e:
+            print("429 注入:", e.status_code)
+        print("请求记录:", server.stats())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--base-url", default=None, help="外部启动的假模型服务地址")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        server = None
+        base_url = args.base_url
+        if base_url is None:
+            server = stack.enter_context(FakeLLMServer(seed=0))
+            base_url = server.base_url
+        print(f"假模型服务: {base_url}\n")
+        features(server, base_url)
+        print()
+        asyncio.run(load_server(base_url, args.requests, args.concurrency))
+        asyncio.run(load_raw(base_url, args.requests, args.concurrency))
+        asyncio.run(load_chain(base_url, args.requests, args.concurrency))
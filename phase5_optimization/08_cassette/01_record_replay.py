@@ -0,0 +1,134 @@
+"""
+录制/回放演示
+1. 录制：客户反馈处理链条（05_project_demo/01_project_demo1.py）接到带延迟的假模型上，录制所有模型调用
+2. 回放：从 cassette 文件回放，不调用模型，输出与录制时逐字一致，分别按原始节奏、加速和不等待回放；
+   回放时只传 cassette（不知道模型名）也能匹配，示例中的 LazyChatModel 可以直接作为 inner
+3. 流式：经过本地假模型服务（ChatOpenAI）录制流式调用，回放时保持 chunk 之间的时间间隔
+4. 查找性能：10 万次回放调用的平均耗时
+5. 找不到匹配请求时的处理策略：报错或调用真实模型
+
+用法:
+    python 01_record_replay.py --lookups 100000
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+
+from common_ai.ai_variable import ALI_TONGYI_MAX_MODEL
+from common_ai.cassette import Cassette, CassetteChatModel, CassetteMissError
+from common_ai.fake_models import FakeChatModel
+from common_ai.fake_server import FakeLLMServer
+from common_ai.script_loader import load_script
+
+TICKETS = [
+    {"user_input": "订单号：ORD1234567890，物流为什么这么慢，这都10天了？"},
+    {"user_input": "订单ORD2233445566的耳机音质很好，包装也很用心，五星好评"},
+    {"user_input": "收到的衣服有破洞，订单号ORD9988776655，要求退货退款"},
+]
+
+
+def run_demo(model):
+    """把链条中的 model_special 换成 model，依次处理所有工单，返回回复和耗时"""
+    demo = load_script("phase1_basic/05_project_demo/01_project_demo1.py")
+    demo.model_special = model
+    demo.pre_classifier = None
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        replies = [demo.processing_chain.invoke(ticket) for ticket in TICKETS]
+    return replies, time.perf_counter() - start
+
+
+def record_and_replay(path):
+    injector = load_script("phase5_optimization/01_tail_latency/02_circuit_breaker.py").FaultInjector()
+    inner = FakeChatModel(responder=injector, latency=lambda: 0.05, tokens_per_second=2000)
+    with Cassette(path) as cassette:
+        recorded, elapsed = run_demo(CassetteChatModel(inner=inner, cassette=cassette, mode="record",
+                                                       model_id=ALI_TONGYI_MAX_MODEL))
+    print(f"录制: {len(TICKETS)} 个工单，{len(cassette)} 次模型调用，耗时 {elapsed:.2f}s，"
+          f"文件 {os.path.getsize(path)} 字节")
+
+    for speed in (1.0, 10.0, None):
+        # 文档中的用法：只传 cassette，不指定模型名
+        model = CassetteChatModel(cassette=Cassette(path), mode="replay", speed=speed)
+        replies, elapsed = run_demo(model)
+        label = "不等待" if speed is None else f"{speed:g} 倍速"
+        print(f"回放（{label}）: 耗时 {elapsed:.2f}s，输出一致: {replies == recorded}")
+        assert replies == recorded, "回放输出必须与录制时一致"
+
+    # 示例中的模型是 LazyChatModel（Runnable 而不是 BaseChatModel），可以直接作为 inner，读取模型名不会创建模型
+    lazy = load_script("phase1_basic/05_project_demo/01_project_demo1.py").model_special
+    model = CassetteChatModel(inner=lazy, cassette=Cassette(path), mode="replay")
+    assert model._model_id() == "qwen-max" and not lazy.loaded
+    print(f"inner=LazyChatModel: 按模型名 {model._model_id()} 匹配，模型未创建")
+
+
+def stream_timing(path):
+    with FakeLLMServer(tokens_per_second=50, seed=0) as server:
+        inner = ChatOpenAI(model=ALI_TONGYI_MAX_MODEL, api_key="fake-key", base_url=server.base_url, max_retries=0)
+        with Cassette(path) as cassette:
+            model = CassetteChatModel(inner=inner, cassette=cassette, mode="record")
+            start = time.perf_counter()
+            recorded = [(time.perf_counter() - start, chunk.content) for chunk in model.stream("介绍一下退货流程")]
+
+    model = CassetteChatModel(cassette=Cassette(path), mode="replay", speed=1.0)
+    start = time.perf_counter()
+    replayed = [(time.perf_counter() - start, chunk.content) for chunk in model.stream("介绍一下退货流程")]
+    print(f"录制: {len(recorded)} 个 chunk，最后一个在 {recorded[-1][0] * 1000:.0f}ms")
+    print(f"回放: {len(replayed)} 个 chunk，最后一个在 {replayed[-1][0] * 1000:.0f}ms，"
+          f"内容一致: {[c for _, c in recorded] == [c for _, c in replayed]}")
+
+
+def lookup_speed(path, lookups):
+    inner = FakeChatModel()
+    with Cassette(path) as cassette:
+        model = CassetteChatModel(inner=inner, cassette=cassette, mode="record")
+        for i in range(1000):
+            model.invoke(f"第{i}条反馈")
+    start = time.perf_counter()
+    cassette = Cassette(path)
+    load_cost = time.perf_counter() - start
+    model = CassetteChatModel(cassette=cassette, mode="replay")
+    start = time.perf_counter()
+    for i in range(lookups):
+        model.invoke(f"第{i % 1000}条反馈")
+    elapsed = time.perf_counter() - start
+    print(f"加载 {len(cassette)} 条记录: {load_cost * 1000:.1f}ms，文件 {os.path.getsize(path)} 字节")
+    print(f"回放 {lookups} 次调用: {elapsed:.2f}s，每次 {elapsed / lookups * 1e6:.0f}µs（含 invoke 框架开销）")
+    keys = [cassette.key(model._request([HumanMessage(f"第{i}条反馈")], None, {})) for i in range(1000)]
+    start = time.perf_counter()
+    for i in range(lookups):
+        cassette.lookup(keys[i % 1000])
+    elapsed = time.perf_counter() - start
+    print(f"其中哈希查找: 每次 {elapsed / lookups * 1e6:.2f}µs，命中 {cassette.hits}，未命中 {cassette.misses}")
+
+
+def miss_policy(path):
+    model = CassetteChatModel(cassette=Cassette(path), mode="replay")
+    try:
+        model.invoke("没有录制过的请求")
+    except CassetteMissError as e:
+        print("on_missing=error:", e)
+    model = CassetteChatModel(inner=FakeChatModel(), cassette=Cassette(path), mode="replay", on_missing="passthrough")
+    print("on_missing=passthrough:", model.invoke("没有录制过的请求").content)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("=== 1/2. 录制与回放客户反馈链条 ===")
+        record_and_replay(os.path.join(tmp, "feedback.cassette.zst"))
+        print("\n=== 3. 流式调用的时间间隔 ===")
+        stream_timing(os.path.join(tmp, "stream.cassette.zst"))
+        print("\n=== 4. 查找性能 ===")
+        lookup_speed(os.path.join(tmp, "lookup.cassette.zst"), args.lookups)
+        print("\n=== 5. 找不到匹配请求 ===")
+        miss_policy(os.path.join(tmp, "lookup.cassette.zst"))
@@ -0,0 +1,165 @@
+"""
+流式输出合并基准测试
+03_stream.py 对每个 chunk 执行 print(..., flush=True)，Web 服务中每个 chunk 也是一次 write。
+链条用逐字输出的假模型（1 个字符约 1 个 token），对比逐 chunk 写出与 CoalescingStream 合并写出：
+1. 终端/文件：write 系统调用次数（/proc/self/io 的 syscw）和 CPU 时间，按每 1000 个 token 统计
+2. SSE / WebSocket：aiohttp 服务向本地客户端推送，统计 transport.write 次数（每次对应一次 send 系统调用）、
+   CPU 时间和客户端收到首个事件的延迟
+3. 背压：上游不限速、消费者很慢时，队列积压不超过 max_pending，积压的 chunk 合并成大块写出
+
+用法:
+    python 01_coalesce.py --tokens 1000 --tokens-per-second 2000 --max-delay 0.02
+"""
+import argparse
+import asyncio
+import os
+import time
+from asyncio import selector_events
+
+import aiohttp
+from aiohttp import web
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from common_ai.fake_models import FakeChatModel
+from common_ai.streaming import CoalescingStream, sse_event, stream_sse, stream_websocket
+
+prompt = PromptTemplate(input_variables=["topic"], template="请用5句介绍{topic}")
+
+
+def make_chain(tokens, tokens_per_second):
+    text = ("大数据是指规模巨大、类型多样、增长迅速的数据集合。" * (tokens // 24 + 1))[:tokens]
+    model = FakeChatModel(responder=lambda messages: text, stream_chunk_chars=1, tokens_per_second=tokens_per_second)
+    return prompt | model | StrOutputParser()
+
+
+def write_syscalls():
+    with open("/proc/self/io") as f:
+        return int(next(line for line in f if line.startswith("syscw")).split()[1])
+
+
+# 统计 transport.write 次数：asyncio 在发送缓冲区为空时直接调用一次 send
+transport_writes = 0
+_original_write = selector_events._SelectorSocketTransport.write
+
+
+def _counting_write(self, data):
+    global transport_writes
+    transport_writes += 1
+    return _original_write(self, data)
+
+
+selector_events._SelectorSocketTransport.write = _counting_write
+
+
+def report(name, tokens, writes, cpu, wall, extra=""):
+    scale = 1000 / tokens
+    print(f"{name:>14}: 每 1k token {writes * scale:6.0f} 次写，CPU {cpu * scale * 1000:6.1f}ms，"
+          f"总耗时 {wall:.2f}s{extra}")
+
+
+def terminal(args):
+    chain = make_chain(args.tokens, args.tokens_per_second)
+    value = {"topic": "大数据"}
+    with open(os.devnull, "w") as out:
+        syscalls, cpu, wall = write_syscalls(), time.process_time(), time.perf_counter()
+        for chunk in chain.stream(value):
+            print(chunk, end="", flush=True, file=out)
+        report("逐 chunk flush", args.tokens, write_syscalls() - syscalls, time.process_time() - cpu,
+               time.perf_counter() - wall)
+
+        stream = CoalescingStream(chain.stream(value), max_chars=args.max_chars, max_delay=args.max_delay)
+        syscalls, cpu, wall = write_syscalls(), time.process_time(), time.perf_counter()
+        for text in stream:
+            print(text, end="", flush=True, file=out)
+        stats = stream.stats()
+        report("合并 flush", args.tokens, write_syscalls() - syscalls, time.process_time() - cpu,
+               time.perf_counter() - wall, f"，平均每次合并 {stats['chunks_per_flush']:.1f} 个 chunk")
+
+
+async def web_sinks(args):
+    chain = make_chain(args.tokens, args.tokens_per_second)
+    value = {"topic": "大数据"}
+    options = {"max_chars": args.max_chars, "max_delay": args.max_delay}
+
+    async def raw(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        async for chunk in chain.astream(value):
+            await response.write(sse_event(chunk))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def coalesced(request):
+        return await stream_sse(request, chain.astream(value), **options)
+
+    async def websocket(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await stream_websocket(ws, chain.astream(value), **options)
+        await ws.close()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/raw", raw)
+    app.router.add_get("/coalesced", coalesced)
+    app.router.add_get("/ws", websocket)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async with aiohttp.ClientSession() as session:
+        for name, path in (("SSE 逐 chunk", "/raw"), ("SSE 合并", "/coalesced")):
+            writes, cpu, wall = transport_writes, time.process_time(), time.perf_counter()
+            events, first = 0, None
+            async with session.get(base_url + path) as response:
+                async for line in response.content:
+                    if line.startswith(b"data:"):
+                        events += 1
+                        first = first or time.perf_counter() - wall
+            report(name, args.tokens, transport_writes - writes, time.process_time() - cpu,
+                   time.perf_counter() - wall, f"，{events} 个事件，首个事件 {first * 1000:.1f}ms")
+
+        writes, cpu, wall = transport_writes, time.process_time(), time.perf_counter()
+        messages = 0
+        async with session.ws_connect(base_url + "/ws") as ws:
+            async for _ in ws:
+                messages += 1
+        report("WebSocket 合并", args.tokens, transport_writes - writes, time.process_time() - cpu,
+               time.perf_counter() - wall, f"，{messages} 条消息")
+    await runner.cleanup()
+
+
+def backpressure(args):
+    chain = make_chain(args.tokens * 20, None)
+    stream = CoalescingStream(chain.stream({"topic": "大数据"}), max_chars=args.max_chars,
+                              max_delay=args.max_delay, max_pending=64)
+    received = 0
+    start = time.perf_counter()
+    for text in stream:
+        received += len(text)
+        time.sleep(0.005)  # 慢消费者：每次写出耗时 5ms
+    stats = stream.stats()
+    print(f"上游 {stats['chunks']} 个 chunk 不限速，消费者每次写出 5ms：写出 {stats['flushes']} 次，"
+          f"平均每次 {stats['chunks_per_flush']:.0f} 个 chunk，耗时 {time.perf_counter() - start:.2f}s")
+    print(f"队列峰值 {stats['peak_pending']}/{stats['max_pending']}，生产者因背压等待 {stats['backpressure_waits']} 次，"
+          f"收到 {received} 个字符")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--tokens-per-second", type=float, default=2000)
+    parser.add_argument("--max-chars", type=int, default=256)
+    parser.add_argument("--max-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    print("=== 1. 终端/文件 ===")
+    terminal(args)
+    print("\n=== 2. SSE / WebSocket ===")
+    asyncio.run(web_sinks(args))
+    print("\n=== 3. 背压 ===")
+    backpressure(args)
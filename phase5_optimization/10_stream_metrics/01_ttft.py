@@ -0,0 +1,111 @@
+"""
+首 token 延迟(TTFT)与 token 间隔统计
+1. 链条：prompt | 流式假模型 | out，两个模型（正常、偶发卡顿）各流式调用若干次，输出每个模型的汇总
+2. 智能体：create_agent 中的模型调用同样被统计（需要可用的 langgraph）
+3. 导出：Prometheus 文本格式
+4. 开销：零延迟逐字输出的假模型，对比挂与不挂回调时每个 token 的耗时
+
+用法:
+    python 01_ttft.py --calls 20 --tokens-per-second 200
+"""
+import argparse
+import random
+import time
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from common_ai.fake_models import FakeChatModel, heavy_tail_latency
+from common_ai.stream_metrics import StreamLatencyCallback
+
+prompt = PromptTemplate(input_variables=["topic"], template="请用5句介绍{topic}")
+REPLY = "大数据是指规模巨大、类型多样、增长迅速的数据集合，需要新的处理方式才能发挥价值。" * 3
+
+
+class StallingModel(FakeChatModel):
+    """每隔 stall_every 个 chunk 停顿 stall 秒，模拟上游推理卡顿"""
+
+    stall_every: int = 50
+    stall: float = 0.6
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for i, chunk in enumerate(super()._stream(messages, stop, run_manager, **kwargs)):
+            if i and i % self.stall_every == 0:
+                time.sleep(self.stall)
+            yield chunk
+
+
+def chains(args, metrics):
+    rng = random.Random(0)
+    normal = FakeChatModel(responder=lambda messages: REPLY, latency=heavy_tail_latency(0.3, rng=rng),
+                           tokens_per_second=args.tokens_per_second, stream_chunk_chars=1)
+    stalling = StallingModel(responder=lambda messages: REPLY, latency=lambda: 0.3,
+                             tokens_per_second=args.tokens_per_second, stream_chunk_chars=1)
+    for name, model in (("qwen-max", normal), ("qwen-plus", stalling)):
+        chain = prompt | model.with_config(metadata={"ls_model_name": name}) | StrOutputParser()
+        for _ in range(args.calls):
+            for _ in chain.stream({"topic": "大数据"}, config={"callbacks": [metrics]}):
+                pass
+    for model, summary in metrics.summary().items():
+        print(f"{model}: {summary['requests']} 次调用，TTFT p50 ≤{summary['ttft_p50'] * 1000:.0f}ms "
+              f"p99 ≤{summary['ttft_p99'] * 1000:.0f}ms，token 间隔 p99 ≤{summary['inter_token_p99'] * 1000:.0f}ms，"
+              f"平均 {summary['tokens_per_second_avg']:.0f} token/s，卡顿 {summary['stalls']} 次")
+    timing = metrics.calls[-1]
+    print(f"最近一次调用: TTFT {timing.ttft * 1000:.0f}ms，{len(timing.chunks)} 个 chunk，"
+          f"最大间隔 {max(timing.gaps) * 1000:.0f}ms，总耗时 {(timing.end - timing.start) * 1000:.0f}ms")
+
+
+def agent(args, metrics):
+    try:
+        from langchain.agents import create_agent
+
+        model = FakeChatModel(responder=lambda messages: REPLY, tokens_per_second=args.tokens_per_second,
+                              stream_chunk_chars=1)
+        agent = create_agent(model=model, tools=[], system_prompt="你是一个有帮助的助手。")
+    except ImportError as e:
+        print("跳过（langgraph 不可用）:", e)
+        return
+    for _ in agent.stream({"messages": [{"role": "user", "content": "介绍一下大数据"}]},
+                          config={"callbacks": [metrics]}, stream_mode="messages"):
+        pass
+    print(metrics.summary())
+
+
+def overhead(rounds):
+    model = FakeChatModel(responder=lambda messages: REPLY, stream_chunk_chars=1)
+    chain = prompt | model | StrOutputParser()
+    value = {"topic": "大数据"}
+
+    def measure(config):
+        for _ in range(5):
+            for _ in chain.stream(value, config=config):
+                pass
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for _ in chain.stream(value, config=config):
+                pass
+        return (time.perf_counter() - start) / rounds / len(REPLY)
+
+    baseline = measure(None)
+    instrumented = measure({"callbacks": [StreamLatencyCallback()]})
+    print(f"不挂回调: 每个 token {baseline * 1e6:.1f}µs")
+    print(f"挂回调:   每个 token {instrumented * 1e6:.1f}µs，额外 {(instrumented - baseline) * 1e6:.1f}µs")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    metrics = StreamLatencyCallback(stall_threshold=0.5, keep_calls=100)
+    print("=== 1. 链条 ===")
+    chains(args, metrics)
+    print("\n=== 2. 智能体 ===")
+    agent(args, StreamLatencyCallback())
+    print("\n=== 3. Prometheus 导出（节选） ===")
+    print("\n".join(line for line in metrics.to_prometheus().splitlines()
+                    if "time_to_first_token" in line or "stalls_total" in line))
+    print("\n=== 4. 开销 ===")
+    overhead(args.rounds)
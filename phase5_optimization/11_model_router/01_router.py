@@ -0,0 +1,139 @@
+"""
+多后端模型门面 ModelRouter
+三个本地假模型服务模拟速度不同的后端（qwen-max-latest 快、deepseek-v3 中等、qwen-plus 慢且有长尾），
+prompt | ModelRouter | out 分别使用三种策略：
+1. race：同时请求，延迟接近最快的后端
+2. balanced：按观测延迟加权，流量自动向快的后端倾斜
+3. failover：主后端故障时切到下一个，失败次数达到阈值后熔断，之后的请求直接跳过
+4. 熔断恢复：半开状态下并发请求只有一个探测请求打到主后端；路由的熔断器与 get_breaker 按模型名共享的熔断器互不影响
+5. 异步竞速（abatch）和流式调用
+
+用法:
+    python 01_router.py --requests 60
+"""
+import argparse
+import asyncio
+import contextlib
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+
+from common_ai.ai_variable import ALI_TONGYI_DEEPSEEK_V3, ALI_TONGYI_MAX_MODEL
+from common_ai.circuit_breaker import HALF_OPEN, get_breaker, reset_breakers
+from common_ai.fake_models import heavy_tail_latency
+from common_ai.fake_server import FakeLLMServer
+from common_ai.model_router import ModelRouter
+
+prompt = ChatPromptTemplate.from_template("用一句话介绍{topic}")
+BACKENDS = [
+    (ALI_TONGYI_MAX_MODEL, 0.03),
+    (ALI_TONGYI_DEEPSEEK_V3, 0.08),
+    ("qwen-plus", 0.2),
+]
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def make_router(servers, policy, **kwargs):
+    backends = {
+        name: ChatOpenAI(model=name, api_key="fake-key", base_url=server.base_url, max_retries=0, timeout=5)
+        for (name, _), server in zip(BACKENDS, servers)
+    }
+    return ModelRouter(backends=backends, policy=policy, **kwargs)
+
+
+def run(router, requests, label):
+    chain = prompt | router | StrOutputParser()
+    samples = []
+    for i in range(requests):
+        start = time.perf_counter()
+        reply = chain.invoke({"topic": f"主题{i}"})
+        samples.append(time.perf_counter() - start)
+        assert f"主题{i}" in reply
+    calls = "，".join(f"{name} {stats['calls']}" for name, stats in router.stats().items())
+    print(f"{label:>10}: p50 {percentile(samples, 0.5) * 1000:5.0f}ms  p99 {percentile(samples, 0.99) * 1000:5.0f}ms"
+          f"  调用数: {calls}")
+    return router.stats()
+
+
+def failover(servers, requests):
+    router = make_router(servers, "failover")
+    run(router, requests // 3, "failover")
+    servers[0].error_rate = 1.0
+    stats = run(router, requests // 3, "主后端故障")
+    primary = stats[ALI_TONGYI_MAX_MODEL]
+    print(f"{'':>10}  {ALI_TONGYI_MAX_MODEL}: 失败 {primary['failures']} 次后熔断，状态 {primary['state']}")
+    servers[0].error_rate = 0.0
+
+
+def half_open(servers, concurrency=8, recovery=0.2):
+    router = make_router(servers, "failover", breaker_options={"min_calls": 2, "recovery_timeout": recovery})
+    chain = prompt | router | StrOutputParser()
+    primary, latency = servers[0], servers[0].latency
+    # 按模型名共享的熔断器打开不影响路由
+    reset_breakers(ALI_TONGYI_MAX_MODEL)
+    shared = get_breaker(ALI_TONGYI_MAX_MODEL, min_calls=1)
+    shared.record_failure()
+    chain.invoke({"topic": "熔断"})
+    assert router.stats()[ALI_TONGYI_MAX_MODEL]["calls"] == 1, "get_breaker 的熔断不应影响路由"
+    reset_breakers(ALI_TONGYI_MAX_MODEL)
+
+    primary.error_rate = 1.0
+    for i in range(4):
+        chain.invoke({"topic": f"熔断{i}"})
+    time.sleep(recovery * 1.5)
+    state = router.stats()[ALI_TONGYI_MAX_MODEL]["state"]
+    # 主后端恢复但变慢：探测请求进行中，其余并发请求不能再打到主后端
+    primary.error_rate, primary.latency = 0.0, lambda: 0.3
+    before = len(primary.requests)
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda i: chain.invoke({"topic": f"探测{i}"}), range(concurrency)))
+    probes = len(primary.requests) - before
+    primary.latency = latency
+    print(f"{'半开':>10}: {state}，{concurrency} 个并发请求中 {probes} 个打到主后端，"
+          f"之后状态 {router.stats()[ALI_TONGYI_MAX_MODEL]['state']}")
+    assert state == HALF_OPEN and probes == 1, "半开状态只能放行一个探测请求"
+
+
+async def async_race(servers, requests):
+    chain = prompt | make_router(servers, "race") | StrOutputParser()
+    start = time.perf_counter()
+    replies = await chain.abatch([{"topic": f"主题{i}"} for i in range(requests)], config={"max_concurrency": 20})
+    assert all(f"主题{i}" in reply for i, reply in enumerate(replies))
+    print(f"{'race 异步':>10}: {requests} 个请求 {time.perf_counter() - start:.2f}s（慢后端的请求被取消）")
+
+
+def streaming(servers):
+    chain = prompt | make_router(servers, "balanced") | StrOutputParser()
+    chunks = list(chain.stream({"topic": "大数据"}))
+    print(f"{'流式':>10}: {len(chunks)} 个 chunk，内容: {''.join(chunks)[:30]}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=60)
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        servers = [
+            stack.enter_context(FakeLLMServer(latency=heavy_tail_latency(base, rng=random.Random(i)), seed=i))
+            for i, (_, base) in enumerate(BACKENDS)
+        ]
+        for (name, base), server in zip(BACKENDS, servers):
+            print(f"后端 {name}: {server.base_url}，中位延迟约 {base * 1000:.0f}ms")
+        print()
+        single = ModelRouter(backends={BACKENDS[0][0]: make_router(servers, "failover").backends[BACKENDS[0][0]]})
+        run(single, args.requests, "单后端")
+        run(make_router(servers, "race"), args.requests, "race")
+        run(make_router(servers, "balanced"), args.requests, "balanced")
+        failover(servers, args.requests)
+        half_open(servers)
+        asyncio.run(async_race(servers, args.requests))
+        streaming(servers)
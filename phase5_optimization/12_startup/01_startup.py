@@ -0,0 +1,52 @@
+"""
+启动耗时与模块加载检查
+1. 用 common_ai.import_profile 统计 `import common_ai`、`common_ai.model_router` 和 05_project_demo/01_project_demo1.py 的导入耗时
+2. 检查导入后加载了哪些模块：提供方 SDK、aiohttp、pyarrow 等只在用到时加载
+3. LazyChatModel 第一次调用后才加载提供方模块
+检查不通过时以非零状态退出，可以放进 CI
+
+用法:
+    python 01_startup.py
+    python 01_startup.py --runs 5
+"""
+import argparse
+import sys
+
+from common_ai.import_profile import loaded_modules, profile_imports, total_us
+
+DEMO = "phase1_basic/05_project_demo/01_project_demo1.py"
+
+# 目标 -> 导入后不应该出现的顶层包
+CHECKS = {
+    "common_ai": ["langchain_core", "langsmith", "aiohttp", "numpy", "pyarrow", "zstandard", "pydantic"],
+    "common_ai.providers": ["langchain_community", "dashscope", "langchain_openai", "openai"],
+    DEMO: ["langchain_community", "dashscope", "langchain_openai", "openai", "langgraph", "aiohttp", "pyarrow"],
+}
+
+# LazyChatModel 第一次调用之后才加载提供方模块
+FIRST_USE = ("common_ai.providers; import sys; from common_ai.providers import LazyChatModel; "
+             "model = LazyChatModel('fake'); assert 'common_ai.fake_models' not in sys.modules; "
+             "model.invoke('hi'); assert 'common_ai.fake_models' in sys.modules")
+
+
+def check(target, forbidden, label=None):
+    packages = {name.split(".")[0] for name in loaded_modules(target)}
+    unexpected = sorted(packages & set(forbidden))
+    status = "OK" if not unexpected else "失败，加载了 " + ", ".join(unexpected)
+    print(f"  {label or target:<52} {len(packages):4d} 个顶层包  {status}")
+    return not unexpected
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    print("导入耗时（-X importtime，取最快的一次）:")
+    for target in ["common_ai", "common_ai.providers", "common_ai.model_router", DEMO]:
+        print(f"  {target:<52} {total_us(profile_imports(target, args.runs)) / 1000:6.0f}ms")
+
+    print("\n模块加载检查:")
+    ok = all([check(target, forbidden) for target, forbidden in CHECKS.items()])
+    ok = check(FIRST_USE, [], label="LazyChatModel 第一次调用") and ok
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,179 @@
+"""
+模型配置的校验与热更新
+1. 校验：错误的配置（负数超时、拼错的字段、超范围的 temperature 等）在加载时就报错；配置对象不可修改
+2. 读取开销：每次请求调用 get_settings().profile(name) 的耗时
+3. 压力下热更新：多个线程持续读取配置，同时反复改写配置文件（中间夹一份校验不通过的配置和一份 YAML 语法错误的文件），检查
+   - 每次读到的都是完整的一份配置（同一份配置中 timeout 与 max_concurrency 始终相等）
+   - 每个线程读到的版本只增不减，错误的配置不会生效，之后的改写仍然能生效
+   - 从写入文件到新配置生效的延迟
+检查不通过时以非零状态退出
+
+用法:
+    python 01_settings.py --readers 4 --writes 40
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from common_ai.ai_variable import ALI_TONGYI_MAX_MODEL
+from common_ai.settings import get_settings, load_settings, on_settings_change, watch_settings
+
+HERE = Path(__file__).parent
+
+# (说明, 配置文件内容, 是否应该报错)
+CASES = [
+    ("示例配置", (HERE / "ai_settings.yaml").read_text(encoding="utf-8"), False),
+    ("空文件", "", False),
+    ("负数超时", "defaults: {timeout: -1}", True),
+    ("拼错的字段", "models: {deepseek-v3: {time_out: 10}}", True),
+    ("temperature 超出范围", "models: {deepseek-v3: {temperature: 3}}", True),
+    ("rpm 为 0", "models: {qwen-max-latest: {rpm: 0}}", True),
+    ("缓存配置中未知的字段", "defaults: {cache: {ttl: 10}}", True),
+    ("并发数不是整数", "defaults: {max_concurrency: many}", True),
+    ("顶层不是映射", "- qwen-max-latest", True),
+    ("YAML 语法错误", "models: {deepseek-v3: {timeout: 10}", True),
+    ("defaults 不是映射", "defaults: [1]", True),
+    ("模型配置不是映射", "models: {deepseek-v3: 5}", True),
+]
+
+# 热更新时写入的错误配置：校验不通过、YAML 语法错误（都不能让监听线程退出）
+INVALID = ["defaults: {timeout: -1, max_concurrency: -1}\n", "defaults: {timeout: 1\n"]
+
+
+def check_validation(tmp):
+    failures = 0
+    path = tmp / "case.yaml"
+    for label, text, should_fail in CASES:
+        path.write_text(text, encoding="utf-8")
+        try:
+            load_settings(path)
+            error = None
+        except (ValidationError, ValueError) as e:
+            error = e
+        ok = (error is not None) == should_fail
+        failures += not ok
+        detail = f"报错: {str(error).splitlines()[0]}" if error else "通过"
+        print(f"  {'OK ' if ok else '失败'} {label:<20} {detail}")
+
+    profile = load_settings(HERE / "ai_settings.yaml").profile(ALI_TONGYI_MAX_MODEL)
+    try:
+        profile.timeout = 1
+        failures += 1
+        print("  失败 配置对象可以被修改")
+    except ValidationError:
+        print("  OK  配置对象不可修改")
+    return failures
+
+
+def read_cost(rounds=200_000):
+    get_settings().profile(ALI_TONGYI_MAX_MODEL)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        get_settings().profile(ALI_TONGYI_MAX_MODEL).max_concurrency
+    cost = (time.perf_counter() - start) / rounds
+    print(f"  get_settings().profile(name).max_concurrency: {cost * 1e9:.0f}ns/次")
+
+
+def render(value):
+    # timeout 与 max_concurrency 同时改写，读到的配置中两者不相等说明读到了拼凑的配置
+    return (f"defaults: {{timeout: {value}, max_concurrency: {value}}}\n"
+            f"models:\n  {ALI_TONGYI_MAX_MODEL}: {{timeout: {value}, max_concurrency: {value}, rpm: {value * 60}}}\n")
+
+
+def write(path, text, atomic):
+    if atomic:
+        # 先写临时文件再改名，读取方不会看到写了一半的文件
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+    else:
+        path.write_text(text, encoding="utf-8")
+
+
+def reload_under_load(tmp, readers, writes, interval):
+    path = tmp / "ai_settings.yaml"
+    write(path, render(1), atomic=True)
+    applied = {}  # 配置值 -> 生效时间
+    on_settings_change(lambda old, new: applied.setdefault(int(new.profile(ALI_TONGYI_MAX_MODEL).timeout),
+                                                           time.perf_counter()))
+    watcher = watch_settings(path, debounce=0.02)
+    stop = threading.Event()
+    problems = []
+    reads = [0] * readers
+
+    def reader(index):
+        last = 0
+        while not stop.is_set():
+            profile = get_settings().profile(ALI_TONGYI_MAX_MODEL)
+            if profile.timeout != profile.max_concurrency or profile.rpm != profile.max_concurrency * 60:
+                problems.append(f"读到不一致的配置: {profile}")
+            if profile.max_concurrency < last:
+                problems.append(f"版本回退: {last} -> {profile.max_concurrency}")
+            if profile.timeout <= 0:
+                problems.append("错误的配置生效了")
+            last = profile.max_concurrency
+            reads[index] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for thread in threads:
+        thread.start()
+
+    written = {}
+    invalid_at = writes // 2
+    start = time.perf_counter()
+    for value in range(2, writes + 2):
+        if value == invalid_at:
+            for errors, text in enumerate(INVALID, 1):
+                write(path, text, atomic=True)
+                # 等到错误的配置被加载并拒绝，避免它和下一次改写合并成一次加载
+                deadline = time.time() + 5
+                while watcher.errors < errors and time.time() < deadline:
+                    time.sleep(0.01)
+        written[value] = time.perf_counter()
+        # 大部分用改名方式写入，每 5 次直接覆盖写一次
+        write(path, render(value), atomic=value % 5 != 0)
+        time.sleep(interval)
+    deadline = time.time() + 5
+    while get_settings().profile(ALI_TONGYI_MAX_MODEL).max_concurrency != writes + 1 and time.time() < deadline:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+    watcher.stop()
+
+    final = get_settings().profile(ALI_TONGYI_MAX_MODEL).max_concurrency
+    delays = sorted(applied[value] - written[value] for value in written if value in applied)
+    print(f"  {readers} 个读取线程 {elapsed:.1f}s 内读取 {sum(reads)} 次，{writes} 次改写 + {len(INVALID)} 次错误配置")
+    print(f"  重新加载 {watcher.reloads} 次，失败 {watcher.errors} 次（{type(watcher.last_error).__name__}），"
+          f"跳过空文件 {watcher.skipped} 次，"
+          f"最终配置 {final}（期望 {writes + 1}）")
+    if delays:
+        print(f"  写入到生效: p50 {delays[len(delays) // 2] * 1000:.0f}ms，最大 {delays[-1] * 1000:.0f}ms"
+              f"（含 {watcher.debounce * 1000:.0f}ms 去抖）")
+    for problem in problems[:5]:
+        print(f"  失败 {problem}")
+    return len(problems) + (final != writes + 1) + (watcher.errors < len(INVALID))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=40)
+    parser.add_argument("--interval", type=float, default=0.05, help="两次改写之间的间隔(秒)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("校验:")
+        failures = check_validation(Path(tmp))
+        print("\n读取开销:")
+        read_cost()
+        print("\n压力下热更新:")
+        failures += reload_under_load(Path(tmp), args.readers, args.writes, args.interval)
+    sys.exit(1 if failures else 0)
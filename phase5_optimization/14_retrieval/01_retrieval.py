@@ -0,0 +1,131 @@
+"""
+检索吞吐量基准
+合成客服知识库（common_ai.synthetic_data.generate_knowledge_base），向量模型用确定性的 FakeEmbeddings 代替 text-embedding-v3:
+1. 写入：进程内向量化写入内存映射的 float32 / float16 存储，统计每秒文档数；
+   再通过本地假模型服务（HTTP，每次调用固定延迟）对比不同批大小、并发数的写入速度
+2. 查询：全量扫描与 IVF 索引（不同 nprobe）在 float32 / float16 下的每秒查询数，以及相对全量扫描的 recall@k
+3. 重排序：候选文档经假模型服务的 DashScope 文本排序接口重排，对比分批并发与单次请求
+
+用法:
+    python 01_retrieval.py --docs 100000 --queries 200
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+
+from common_ai.ai_variable import ALI_TONGYI_EMBEDDING_MODEL
+from common_ai.fake_models import FakeEmbeddings
+from common_ai.fake_server import FakeLLMServer
+from common_ai.retrieval import Reranker, Retriever, VectorStore, embed_batches
+from common_ai.synthetic_data import generate_feedback, generate_knowledge_base
+
+DIM = 256
+
+
+def ingest(store, kb, batch_size):
+    retriever = Retriever(embeddings=FakeEmbeddings(DIM), store=store, batch_size=batch_size, max_concurrency=1)
+    start = time.perf_counter()
+    retriever.add_texts((doc["text"] for doc in kb), ({"category": doc["category"]} for doc in kb),
+                        (doc["id"] for doc in kb))
+    store.flush()
+    return time.perf_counter() - start
+
+
+def ingest_http(base_url, texts):
+    embeddings = OpenAIEmbeddings(model=ALI_TONGYI_EMBEDDING_MODEL, api_key="fake-key", base_url=base_url,
+                                  check_embedding_ctx_length=False, dimensions=DIM, max_retries=0)
+    print(f"  经 HTTP 向量化 {len(texts)} 条（服务每次调用延迟 20ms）:")
+    for batch_size, concurrency in [(1, 1), (10, 1), (10, 8), (50, 8)]:
+        embeddings.chunk_size = batch_size
+        start = time.perf_counter()
+        rows = sum(len(batch) for batch in embed_batches(embeddings, texts, batch_size, concurrency))
+        elapsed = time.perf_counter() - start
+        print(f"    批大小 {batch_size:>3}，并发 {concurrency}: {rows / elapsed:7.0f} 条/s")
+
+
+def measure(search, queries, batch):
+    start = time.perf_counter()
+    rows = [search(queries[i:i + batch]) for i in range(0, len(queries), batch)]
+    elapsed = time.perf_counter() - start
+    return len(queries) / elapsed, np.concatenate(rows)
+
+
+def recall(found, queries, exact_vectors, threshold):
+    # 模板生成的条目中有很多分数完全相同，按行号比较会把同分的不同条目算成漏检；
+    # 这里按精确分数判断：找到的条目分数不低于精确结果第 k 名（扣除 float16 误差）即算命中
+    queries, threshold = queries[:len(found)], threshold[:len(found)]
+    scores = np.einsum("qkd,qd->qk", exact_vectors[np.maximum(found, 0)], queries)
+    return np.mean((scores >= threshold[:, None] - 2e-3) & (found >= 0))
+
+
+def query_benchmark(stores, queries, k, single=50):
+    vectors = np.array(FakeEmbeddings(DIM).embed_documents(queries), dtype=np.float32)
+    f32, f16 = stores
+    exact_vectors = np.asarray(f32.vectors(), dtype=np.float32)
+    truth, _ = f32.search(vectors, k, exact=True)
+    threshold = truth[:, -1]
+    print(f"  {len(queries)} 个查询，top-{k}（逐个查询时只取前 {single} 个）:")
+    for label, store in [("float32", f32), ("float16", f16)]:
+        for batch in (1, 64):
+            qps, rows = measure(lambda q: store.search(q, k, exact=True)[1], vectors[:single] if batch == 1 else vectors,
+                                batch)
+            print(f"    全量扫描 {label} 批量 {batch:>2}: {qps:8.0f} 查询/s  "
+                  f"recall {recall(rows, vectors, exact_vectors, threshold):.3f}")
+    for label, store in [("float32", f32), ("float16", f16)]:
+        start = time.perf_counter()
+        index = store.build_index()
+        print(f"    训练 IVF 索引（{label}，nlist={index.nlist}）: {time.perf_counter() - start:.1f}s")
+        for nprobe in (4, 8, 16, 32):
+            qps, rows = measure(lambda q: store.search(q, k, nprobe=nprobe)[1], vectors, 1)
+            print(f"    IVF {label} nprobe {nprobe:>2}:       {qps:8.0f} 查询/s  "
+                  f"recall {recall(rows, vectors, exact_vectors, threshold):.3f}")
+
+
+def rerank_benchmark(server, store, queries, fetch_k):
+    url = server.base_url.replace("/v1", "/api/v1/services/rerank/text-rerank/text-rerank")
+    print(f"  重排序 {len(queries)} 个查询，每个 {fetch_k} 个候选（服务每次调用延迟 20ms）:")
+    for batch_size, concurrency in [(fetch_k, 1), (fetch_k // 4, 1), (fetch_k // 4, 4)]:
+        reranker = Reranker(url=url, api_key="fake-key", batch_size=batch_size, max_concurrency=concurrency)
+        retriever = Retriever(embeddings=FakeEmbeddings(DIM), store=store, reranker=reranker, k=5,
+                              fetch_k=fetch_k)
+        start = time.perf_counter()
+        results = [retriever.invoke(query) for query in queries]
+        elapsed = time.perf_counter() - start
+        assert all(len(docs) == 5 and "rerank_score" in docs[0].metadata for docs in results)
+        print(f"    批大小 {batch_size:>3}，并发 {concurrency}: 每个查询 {elapsed / len(queries) * 1000:5.1f}ms，"
+              f"请求 {reranker.calls} 次")
+        reranker.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    kb = generate_knowledge_base(args.docs)
+    queries = [record["feedback"] for record in generate_feedback(args.queries, seed=1)]
+    with tempfile.TemporaryDirectory() as tmp, FakeLLMServer(latency=lambda: 0.02) as server:
+        print("写入:")
+        stores = []
+        for dtype in ("float32", "float16"):
+            store = VectorStore(Path(tmp) / dtype, dim=DIM, dtype=dtype)
+            elapsed = ingest(store, kb, batch_size=256)
+            size = (Path(tmp) / dtype / "vectors.npy").stat().st_size / 2 ** 20
+            print(f"  {dtype}: {args.docs} 条 {elapsed:.1f}s，{args.docs / elapsed:7.0f} 条/s，"
+                  f"向量文件 {size:.0f}MB（容量按 2 倍增长）")
+            stores.append(store)
+        ingest_http(server.base_url, [doc["text"] for doc in kb[:1000]])
+
+        print("\n查询:")
+        query_benchmark(stores, queries, args.k)
+
+        print("\n重排序:")
+        rerank_benchmark(server, stores[1], queries[:50], fetch_k=40)
+        for store in stores:
+            store.close()
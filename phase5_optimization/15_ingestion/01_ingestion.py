@@ -0,0 +1,154 @@
+"""
+增量写入基准
+合成客服知识库按类别写成多个文本文件（每个文件 100 条，条目之间空一行），向量模型用带固定延迟的 FakeEmbeddings 模拟远程接口:
+1. 第一次全量写入，统计耗时和向量化的片段数
+2. 没有变化时再次写入：只比较文件大小和修改时间
+3. 修改 1% 的文件（大部分改写其中一条，少数删除文件、新增文件）后增量写入，与清空后全量重写对比
+4. 检查：增量写入后的向量存储与对修改后的语料全量写入的结果包含相同的片段，已删除的片段检索不到
+5. 内存：用 tracemalloc 统计重新读取切分全部文件（rescan）时的峰值，以及单个大文件按块读取切分时的峰值
+检查不通过时以非零状态退出
+
+用法:
+    python 01_ingestion.py --docs 100000 --latency 0.02
+"""
+import argparse
+import random
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from common_ai.fake_models import FakeEmbeddings
+from common_ai.ingestion import DocumentIngestor
+from common_ai.retrieval import Retriever, VectorStore
+from common_ai.synthetic_data import generate_knowledge_base
+
+DIM = 256
+PER_FILE = 100
+
+
+def write_corpus(root, kb):
+    for start in range(0, len(kb), PER_FILE):
+        docs = kb[start:start + PER_FILE]
+        path = root / docs[0]["category"] / f"kb_{start // PER_FILE:05d}.txt"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("\n\n".join(doc["text"] for doc in docs) + "\n", encoding="utf-8")
+
+
+def modify_corpus(root, ratio, seed=7):
+    """改写 ratio 比例的文件：80% 改写其中一条，10% 删除，10% 新增一个文件"""
+    rng = random.Random(seed)
+    paths = sorted(root.rglob("*.txt"))
+    chosen = rng.sample(paths, max(1, int(len(paths) * ratio)))
+    extra = iter(generate_knowledge_base(len(chosen) * PER_FILE, seed=seed + 1))
+    edited = removed = added = 0
+    for i, path in enumerate(chosen):
+        if i % 10 == 8:
+            path.unlink()
+            removed += 1
+        elif i % 10 == 9:
+            new = path.with_name(path.stem + "_new.txt")
+            new.write_text("\n\n".join(next(extra)["text"] for _ in range(PER_FILE)) + "\n", encoding="utf-8")
+            added += 1
+        else:
+            entries = path.read_text(encoding="utf-8").split("\n\n")
+            entries[rng.randrange(len(entries))] = next(extra)["text"]
+            path.write_text("\n\n".join(entries), encoding="utf-8")
+            edited += 1
+    return edited, removed, added
+
+
+def ingestor(store_path, root, latency):
+    embeddings = FakeEmbeddings(DIM, latency=(lambda: latency) if latency else None)
+    retriever = Retriever(embeddings=embeddings, store=VectorStore(store_path, dim=DIM), batch_size=10,
+                          max_concurrency=8)
+    return DocumentIngestor(retriever, root), embeddings
+
+
+def report(label, stats, embeddings):
+    print(f"  {label:<14} {stats.seconds:6.2f}s  文件 {stats.files}（变化 {stats.changed}，删除 {stats.removed}）  "
+          f"片段 {stats.chunks}：向量化 {stats.embedded}，复用 {stats.reused}，删除向量 {stats.deleted}  "
+          f"接口调用 {embeddings.calls}")
+
+
+def memory_peak(run):
+    tracemalloc.start()
+    run()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak
+
+
+def main(args):
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        root = tmp / "corpus"
+        kb = generate_knowledge_base(args.docs)
+        write_corpus(root, kb)
+        size = sum(path.stat().st_size for path in root.rglob("*.txt")) / 2 ** 20
+        print(f"语料: {args.docs} 条，{len(kb) // PER_FILE} 个文件，{size:.1f}MB；"
+              f"向量化每次 10 条、8 个并发、每次调用延迟 {args.latency * 1000:.0f}ms\n")
+
+        incremental, embeddings = ingestor(tmp / "incremental", root, args.latency)
+        report("全量写入", incremental.ingest(), embeddings)
+        embeddings.calls = 0
+        report("没有变化", incremental.ingest(), embeddings)
+
+        edited, removed, added = modify_corpus(root, args.ratio)
+        print(f"\n修改 {args.ratio:.0%} 的文件：改写 {edited} 个，删除 {removed} 个，新增 {added} 个")
+        # 重新打开，从磁盘上的清单和向量存储继续
+        incremental.retriever.store.close()
+        incremental, embeddings = ingestor(tmp / "incremental", root, args.latency)
+        stats = incremental.ingest()
+        report("增量写入", stats, embeddings)
+        full, full_embeddings = ingestor(tmp / "full", root, args.latency)
+        full_stats = full.ingest()
+        report("清空后全量重写", full_stats, full_embeddings)
+        print(f"  增量写入耗时为全量的 {stats.seconds / full_stats.seconds:.1%}，"
+              f"接口调用为全量的 {embeddings.calls / full_embeddings.calls:.1%}")
+
+        print("\n检查:")
+        store, expected = incremental.retriever.store, full.retriever.store
+        live = set(store._rows)
+        ok = live == set(expected._rows)
+        failures += not ok
+        print(f"  {'OK ' if ok else '失败'} 增量写入后的片段与全量写入一致（{len(live)} 个，"
+              f"多 {len(live - set(expected._rows))} 个，少 {len(set(expected._rows) - live)} 个）")
+        sources = {doc["metadata"]["source"] for doc in map(store.get, store._rows.values())}
+        ok = all((root / source).exists() for source in sources)
+        failures += not ok
+        print(f"  {'OK ' if ok else '失败'} 检索结果不会出现已删除文件中的片段")
+        store.compact()
+        ok = store.count == len(store)
+        failures += not ok
+        print(f"  {'OK ' if ok else '失败'} compact() 后回收已删除片段的空间（{store.count} 行）")
+
+        print("\n内存（tracemalloc）:")
+        embeddings.calls = 0
+        current, peak = memory_peak(lambda: incremental.ingest(rescan=True))
+        print(f"  重新读取切分全部文件（{size:.1f}MB）：峰值 {peak / 2 ** 20:.1f}MB，结束时 {current / 2 ** 20:.1f}MB，"
+              f"接口调用 {embeddings.calls} 次")
+        big = tmp / "big"
+        big.mkdir()
+        with open(big / "big.txt", "w", encoding="utf-8") as f:
+            for round in range(args.big_repeat):
+                f.write("\n\n".join(f"{doc['text']}（第 {round} 轮）" for doc in kb[:20_000]) + "\n\n")
+        big_size = (big / "big.txt").stat().st_size / 2 ** 20
+        single, _ = ingestor(None, big, 0)
+        chunks = []
+        current, peak = memory_peak(lambda: chunks.append(sum(1 for _ in single.split(big / "big.txt"))))
+        print(f"  单个 {big_size:.0f}MB 的文件按 1M 字符分块读取切分（{chunks[0]} 个片段）："
+              f"峰值 {peak / 2 ** 20:.1f}MB，结束时 {current / 2 ** 20:.1f}MB")
+        for store in (incremental.retriever.store, full.retriever.store):
+            store.close()
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--ratio", type=float, default=0.01, help="修改的文件比例")
+    parser.add_argument("--latency", type=float, default=0.02, help="每次向量化调用的延迟(秒)")
+    parser.add_argument("--big-repeat", type=int, default=10, help="大文件中重复写入知识库的轮数")
+    sys.exit(1 if main(parser.parse_args()) else 0)
@@ -0,0 +1,134 @@
+"""
+共享向量化服务的吞吐量与调用次数
+本地假模型服务（HTTP /embeddings，每次调用固定延迟）上，多个线程并发地逐条向量化文本:
+- 文本按 Zipf 分布从一个文本池中抽取，模拟反复出现的工单模板、FAQ 示例
+- 对比：每条文本直接调用一次接口；经 EmbeddingService 攒批、去重（内存缓存）；
+  磁盘缓存冷启动；重新打开磁盘缓存后再跑一遍（热缓存）；以及全部是不同文本时只靠攒批的效果
+- 统计吞吐量、单次请求延迟 p50/p99、接口调用次数和平均批大小
+- 检查：服务返回的向量与直接调用的结果按 float16 取整后一致；热缓存不再调用接口；调用次数明显减少
+检查不通过时以非零状态退出
+
+用法:
+    python 01_embedding_service.py --threads 32 --requests 4000 --pool 1000
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+
+from common_ai.ai_variable import ALI_TONGYI_EMBEDDING_MODEL
+from common_ai.embedding_service import EmbeddingCache, EmbeddingService
+from common_ai.fake_server import FakeLLMServer
+from common_ai.synthetic_data import generate_feedback, generate_knowledge_base
+
+DIM = 256
+
+
+def inner_embeddings(base_url):
+    return OpenAIEmbeddings(model=ALI_TONGYI_EMBEDDING_MODEL, api_key="fake-key", base_url=base_url,
+                            check_embedding_ctx_length=False, dimensions=DIM, max_retries=0, chunk_size=10)
+
+
+def workload(pool_size, requests, seed=0):
+    pool = [doc["text"] for doc in generate_knowledge_base(pool_size // 2, seed=seed)]
+    pool += [record["feedback"] for record in generate_feedback(pool_size - len(pool), seed=seed)]
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, len(pool) + 1) ** 1.1
+    picks = rng.choice(len(pool), size=requests, p=weights / weights.sum())
+    return [pool[i] for i in picks]
+
+
+def run(embeddings, texts, threads):
+    """threads 个线程分摊 texts，逐条调用 embed_query，返回 (耗时, 每次请求的延迟, 向量)"""
+    latencies = [0.0] * len(texts)
+    vectors = [None] * len(texts)
+
+    def worker(offset):
+        for i in range(offset, len(texts), threads):
+            start = time.perf_counter()
+            vectors[i] = embeddings.embed_query(texts[i])
+            latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start, np.array(latencies), np.array(vectors, dtype=np.float32)
+
+
+def report(label, server, texts, result, service=None):
+    elapsed, latencies, _ = result
+    calls = server.stats()["requests"]
+    server.requests.clear()
+    line = (f"  {label:<16} {len(texts) / elapsed:7.0f} 条/s  p50 {np.percentile(latencies, 50) * 1000:5.1f}ms  "
+            f"p99 {np.percentile(latencies, 99) * 1000:5.1f}ms  接口调用 {calls:5d}")
+    if service is not None:
+        stats = service.stats()
+        line += (f"  （缓存命中 {stats['cache_hits']}，合并 {stats['shared']}，"
+                 f"向量化 {stats['embedded']}，平均每批 {stats['batch_size']:.1f} 条）")
+    print(line)
+    return calls
+
+
+def check(ok, label):
+    print(f"  {'OK ' if ok else '失败'} {label}")
+    return not ok
+
+
+def main(args):
+    texts = workload(args.pool, args.requests)
+    unique_texts = [doc["text"] for doc in generate_knowledge_base(args.requests, seed=1)]
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp, FakeLLMServer(latency=lambda: args.latency) as server:
+        cache_path = Path(tmp) / "embeddings.sqlite3"
+        print(f"{args.threads} 个线程，{len(texts)} 次请求，{len(set(texts))} 种不同文本，"
+              f"每次调用延迟 {args.latency * 1000:.0f}ms:")
+        direct = run(inner_embeddings(server.base_url), texts, args.threads)
+        direct_calls = report("直接调用", server, texts, direct)
+
+        with EmbeddingService(inner_embeddings(server.base_url), max_concurrency=args.concurrency) as service:
+            batched = run(service, texts, args.threads)
+            batched_calls = report("攒批 + 去重", server, texts, batched, service)
+
+        def disk_service():
+            inner = inner_embeddings(server.base_url)
+            cache = EmbeddingCache(cache_path, namespace=EmbeddingService._namespace(inner))
+            return EmbeddingService(inner, cache, max_concurrency=args.concurrency)
+
+        with disk_service() as service:
+            report("磁盘缓存（冷）", server, texts, run(service, texts, args.threads), service)
+        with disk_service() as service:
+            warm_calls = report("磁盘缓存（热）", server, texts, run(service, texts, args.threads), service)
+            cached = len(service.cache)
+
+        print(f"\n{len(unique_texts)} 条不同文本（只有攒批起作用）:")
+        report("直接调用", server, unique_texts, run(inner_embeddings(server.base_url), unique_texts, args.threads))
+        with EmbeddingService(inner_embeddings(server.base_url), max_concurrency=args.concurrency) as service:
+            unique_calls = report("攒批", server, unique_texts, run(service, unique_texts, args.threads), service)
+
+        print("\n检查:")
+        error = np.abs(batched[2] - direct[2].astype(np.float16).astype(np.float32)).max()
+        failures += check(error == 0, f"返回的向量与直接调用的结果按 float16 取整后一致（最大误差 {error:.1e}）")
+        failures += check(warm_calls == 0, f"热缓存不再调用接口（缓存 {cached} 条）")
+        failures += check(batched_calls * 5 < direct_calls,
+                          f"攒批 + 去重的调用次数为直接调用的 {batched_calls / direct_calls:.1%}")
+        failures += check(unique_calls * 5 < len(unique_texts),
+                          f"不同文本时攒批的调用次数为直接调用的 {unique_calls / len(unique_texts):.1%}")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--pool", type=int, default=1000, help="文本池大小")
+    parser.add_argument("--concurrency", type=int, default=4, help="服务同时进行的调用数")
+    parser.add_argument("--latency", type=float, default=0.02, help="每次调用的延迟(秒)")
+    sys.exit(1 if main(parser.parse_args()) else 0)
@@ -0,0 +1,199 @@
+"""
+BM25 关键词检索与混合检索基准
+1. BM25 索引：合成客服知识库与客户反馈各一半共 --docs 条（默认 100 万），统计构建速度、varint 压缩后的倒排表大小
+   （与 int32 文档号 + int32 词频的原始大小对比）、保存和加载耗时，以及三类查询的每秒查询数：
+   自然语言反馈、带订单号的询问、带商品编号的询问；抽查结果与逐词全量累加的 BM25 分数一致
+2. 混合检索：在 --hybrid-docs 条知识库上，向量模型用 FakeEmbeddings 代替 text-embedding-v3，
+   用顾客报商品编号的询问（"SKU524604 的电视..."、只报数字 "524604"）对比只用向量、只用 BM25、
+   RRF 融合三种方式的 hit@k，以及融合后经假模型服务的 DashScope 文本排序接口重排后的 hit@k 和延迟
+检查不通过时以非零状态退出
+
+用法:
+    python 01_hybrid_search.py --docs 1000000 --hybrid-docs 100000
+"""
+import argparse
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+from langchain_core.documents import Document
+
+from common_ai.bm25 import BM25Index
+from common_ai.fake_models import FakeEmbeddings
+from common_ai.fake_server import FakeLLMServer
+from common_ai.retrieval import HybridRetriever, Reranker, Retriever, VectorStore, reciprocal_rank_fusion
+from common_ai.synthetic_data import generate_feedback, generate_knowledge_base
+
+DIM = 256
+_SKU = re.compile(r"SKU(\d{6})")
+_ORDER = re.compile(r"ORD(\d{10})")
+
+
+def corpus(count, seed=0):
+    kb = generate_knowledge_base(count // 2, seed=seed)
+    feedback = generate_feedback(count - len(kb), seed=seed + 1)
+    return [(doc["id"], doc["text"]) for doc in kb] + \
+        [(f"TK{i:07d}", record["feedback"]) for i, record in enumerate(feedback)]
+
+
+def brute_force(index, query, k):
+    """逐个查询词累加整条倒排表的 BM25 分数，作为检查基准"""
+    scores = np.zeros(len(index), dtype=np.float32)
+    for term, weight in index.query_terms(query).items():
+        docs, tfs = index.posting(term)
+        scores[docs] += index._impact(docs, tfs, weight * (index.k1 + 1))
+    return np.sort(scores)[::-1][:k]
+
+
+def check(ok, label):
+    print(f"  {'OK ' if ok else '失败'} {label}")
+    return not ok
+
+
+def index_benchmark(args):
+    docs = corpus(args.docs)
+    raw = sum(len(text.encode("utf-8")) for _, text in docs) / 2 ** 20
+    start = time.perf_counter()
+    index = BM25Index.build(docs)
+    elapsed = time.perf_counter() - start
+    postings = len(index.tfs)
+    compressed = index.postings.nbytes + index.tfs.nbytes
+    print(f"构建: {len(docs)} 条（文本 {raw:.0f}MB）{elapsed:.1f}s，{len(docs) / elapsed:8.0f} 条/s")
+    print(f"  词表 {len(index.vocab)} 个词，{postings} 个倒排项；文档号间隔 varint {index.postings.nbytes / 2 ** 20:.1f}MB"
+          f" + 词频 {index.tfs.nbytes / 2 ** 20:.1f}MB = {compressed / 2 ** 20:.1f}MB，"
+          f"int32 文档号 + int32 词频为 {postings * 8 / 2 ** 20:.1f}MB（{compressed / (postings * 8):.1%}）")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bm25.npz"
+        start = time.perf_counter()
+        index.save(path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        index = BM25Index.load(path)
+        print(f"  保存 {saved:.1f}s，文件 {path.stat().st_size / 2 ** 20:.0f}MB，加载 {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(9)
+    with_order = [text for _, text in docs if "ORD" in text]
+    with_sku = [text for _, text in docs if "SKU" in text]
+    queries = {
+        "自然语言反馈": [record["feedback"] for record in generate_feedback(args.queries, seed=99)],
+        "订单号询问": [f"我的订单{_ORDER.search(text).group(1)}怎么还没到"
+                    for text in rng.sample(with_order, args.queries)],
+        "商品编号询问": [f"{_SKU.search(text).group(0)}的{text[1:5]}政策是什么"
+                     for text in rng.sample(with_sku, args.queries)],
+    }
+    print(f"\n查询（top-{args.k}，{args.queries} 个/类）:")
+    failures = 0
+    for label, batch in queries.items():
+        start = time.perf_counter()
+        results = [index.search(query, args.k) for query in batch]
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<8} {len(batch) / elapsed:7.1f} 查询/s  平均 {elapsed / len(batch) * 1000:5.1f}ms")
+        mismatched = sum(not np.allclose(scores, brute_force(index, query, args.k)[:len(scores)], atol=1e-4)
+                         for query, (scores, _) in zip(batch[:args.verify], results))
+        failures += mismatched > 0
+    failures += check(not failures, f"每类前 {args.verify} 个查询的 top-{args.k} 分数与全量累加的 BM25 一致")
+    # 编号的权重乘以 id_boost，"怎么""还没到"这类常见二元组凑在一起也不能排在订单号精确命中的文档前面
+    ranks = []
+    for query in queries["订单号询问"]:
+        code = re.search(r"\d{10}", query).group(0)
+        rows = index.search(query, args.k)[1]
+        ranks.append(next((rank for rank, row in enumerate(rows) if code in docs[row][1]), None))
+    hit1 = np.mean([rank == 0 for rank in ranks])
+    hit_k = np.mean([rank is not None for rank in ranks])
+    failures += check(hit1 == 1.0, f"订单号询问 hit@1 {hit1:.3f}（hit@{args.k} {hit_k:.3f}）")
+    return failures
+
+
+def identifier_queries(kb, count, seed=5):
+    """顾客报商品编号的询问：(查询, 包含该编号的文档 id 集合)"""
+    owners = defaultdict(set)
+    for doc in kb:
+        owners[_SKU.search(doc["text"]).group(1)].add(doc["id"])
+    rng = random.Random(seed)
+    queries = []
+    for i, doc in enumerate(rng.sample(kb, count)):
+        code = _SKU.search(doc["text"]).group(1)
+        product = next((p for p in ("电视", "冰箱", "洗衣机", "空调", "手机", "耳机") if p in doc["text"]), "商品")
+        query = f"SKU{code} 的{product}怎么处理？" if i % 2 == 0 else f"我买的{product}编号是{code}，按什么政策处理"
+        queries.append((query, owners[code]))
+    return queries
+
+
+def hit_rate(results, queries):
+    return np.mean([bool({doc.metadata["id"] for doc in docs} & owners) for docs, (_, owners) in zip(results, queries)])
+
+
+def hybrid_benchmark(args):
+    kb = generate_knowledge_base(args.hybrid_docs, seed=11)
+    queries = identifier_queries(kb, args.queries)
+    texts = [query for query, _ in queries]
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp, FakeLLMServer(latency=lambda: 0.02) as server:
+        store = VectorStore(Path(tmp) / "vectors", dim=DIM)
+        retriever = Retriever(embeddings=FakeEmbeddings(DIM), store=store, k=args.k, batch_size=256,
+                              max_concurrency=1)
+        retriever.add_texts((doc["text"] for doc in kb), ({"category": doc["category"]} for doc in kb),
+                            (doc["id"] for doc in kb))
+        index = BM25Index.build((doc["id"], doc["text"]) for doc in kb)
+        hybrid = HybridRetriever(retriever=retriever, index=index, k=args.k, fetch_k=args.fetch_k)
+        print(f"\n混合检索: {len(kb)} 条知识库，{len(queries)} 个报商品编号的询问，hit@{args.k}"
+              f"（前 {args.k} 个结果中有包含该编号的条目）:")
+
+        def timed(label, search):
+            start = time.perf_counter()
+            results = search()
+            elapsed = time.perf_counter() - start
+            rate = hit_rate(results, queries)
+            print(f"  {label:<14} hit@{args.k} {rate:.3f}  每个查询 {elapsed / len(queries) * 1000:6.1f}ms")
+            return rate, results
+
+        vector_rate, _ = timed("只用向量", lambda: retriever.search_batch(texts))
+
+        bm25_rate, _ = timed("只用 BM25", lambda: [
+            [Document(page_content="", metadata={"id": index.ids[row]}) for row in index.search(query, args.k)[1]]
+            for query in texts])
+        hybrid_rate, _ = timed("RRF 融合", lambda: hybrid.search_batch(texts))
+
+        url = server.base_url.replace("/v1", "/api/v1/services/rerank/text-rerank/text-rerank")
+        retriever.reranker = Reranker(url=url, api_key="fake-key", batch_size=args.fetch_k, max_concurrency=1)
+        rerank_rate, reranked = timed("融合 + 重排序", lambda: hybrid.search_batch(texts))
+        retriever.reranker.close()
+        store.close()
+
+    print("\n检查:")
+    failures += check(hybrid_rate >= bm25_rate,
+                      f"RRF 融合的 hit@{args.k} 不低于只用 BM25（{hybrid_rate:.3f} / {bm25_rate:.3f}）")
+    failures += check(hybrid_rate > vector_rate,
+                      f"RRF 融合的 hit@{args.k} 高于只用向量（{hybrid_rate:.3f} / {vector_rate:.3f}）")
+    failures += check(rerank_rate >= bm25_rate,
+                      f"融合 + 重排序的 hit@{args.k} 不低于只用 BM25（{rerank_rate:.3f} / {bm25_rate:.3f}）")
+    docs = reranked[0]
+    failures += check(all({"rrf_score", "exact_match", "vector_rank", "bm25_rank", "rerank_score"} <= set(doc.metadata)
+                          for doc in docs),
+                      "结果的 metadata 带有 rrf_score、exact_match、vector_rank、bm25_rank、rerank_score")
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+    failures += check([id for id, _ in fused] == ["a", "c", "b"], "reciprocal_rank_fusion 按名次倒数之和排序")
+    return failures
+
+
+def main(args):
+    failures = index_benchmark(args) if args.docs else 0
+    if args.hybrid_docs:
+        failures += hybrid_benchmark(args)
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=1_000_000, help="BM25 索引基准的文档数，0 表示跳过")
+    parser.add_argument("--hybrid-docs", type=int, default=100_000, help="混合检索基准的知识库条数，0 表示跳过")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--verify", type=int, default=20, help="每类查询中与全量累加结果对比的个数")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--fetch-k", type=int, default=40, help="每一路的候选数，也是交给重排序的候选数")
+    sys.exit(1 if main(parser.parse_args()) else 0)
@@ -0,0 +1,172 @@
+"""
+检索增强回复与联网搜索回复的对比
+客户反馈处理系统（phase1_basic/05_project_demo/01_project_demo1.py）的模型换成假模型，知识库用合成数据:
+- 现状：generate_reply 调用开启 enable_search 的 qwen-max。假模型按参数模拟联网搜索：
+  多等 --search-latency 秒，搜索结果占用 --search-tokens 个输入 token
+- 检索增强：设置 policy_snippets 后，按问题分类从本地向量存储取片段，token 预算内的前几条放进提示词，
+  调用关闭联网搜索的 model_reply。查询向量化用带固定延迟的 FakeEmbeddings 模拟 text-embedding-v3
+- 两个模型的首 token 延迟、输入处理速度、生成速度相同，回复长度相同；分析步骤（情感、分类、紧急程度）不加延迟，
+  分类结果取合成工单自带的分类，差别只来自回复这一步
+- 统计每个工单端到端的延迟 p50/p99、回复调用的输入/输出 token（按字符数估算）、检索耗时、片段分类的准确率
+检查不通过时以非零状态退出
+
+用法:
+    python 01_rag_reply.py --tickets 64 --kb 20000 --max-tokens 300
+"""
+import argparse
+import contextlib
+import io
+import json
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from common_ai.fake_models import FakeChatModel, FakeEmbeddings
+from common_ai.rag import PolicySnippets, estimate_tokens, snippet_category
+from common_ai.retrieval import Retriever, VectorStore
+from common_ai.script_loader import load_script
+from common_ai.synthetic_data import generate_feedback, generate_knowledge_base
+
+DIM = 256
+REPLY_MARK = "资深电商客服专家"
+
+
+class StubQwen:
+    """
+    假的 qwen-max：分析类提示词立即返回 JSON，回复提示词按参数模拟耗时并记录 token
+    耗时 = 首 token 延迟 (+ 联网搜索延迟) + 输入 token / 输入处理速度 + 输出 token / 生成速度
+    """
+
+    def __init__(self, records, args, search):
+        self.categories = {record["feedback"]: record["categories"] for record in records}
+        self.analysis = load_script("phase5_optimization/01_tail_latency/02_circuit_breaker.py").FaultInjector()
+        self.args = args
+        self.search = search
+        self.replies = []  # (输入 token, 输出 token)
+        self._lock = threading.Lock()
+
+    def __call__(self, messages):
+        prompt = messages[-1].content
+        if REPLY_MARK in prompt:
+            return self.reply(prompt)
+        if "分类选项" in prompt:
+            feedback = re.search(r"「(.*?)」", prompt, re.S).group(1)
+            return json.dumps({"categories": self.categories.get(feedback, ["其他"])}, ensure_ascii=False)
+        return self.analysis(messages)
+
+    def reply(self, prompt):
+        args = self.args
+        input_tokens = estimate_tokens(prompt) + (args.search_tokens if self.search else 0)
+        text = "您好，非常抱歉给您带来不便。" * (args.reply_chars // 14 + 1)
+        text = text[:args.reply_chars]
+        time.sleep(args.first_token + (args.search_latency if self.search else 0)
+                   + input_tokens / args.prefill + len(text) / args.decode)
+        with self._lock:
+            self.replies.append((input_tokens, estimate_tokens(text)))
+        return text
+
+
+def build_store(path, kb, embeddings):
+    store = VectorStore(path, dim=DIM)
+    Retriever(embeddings=FakeEmbeddings(DIM), store=store, batch_size=256, max_concurrency=1).add_texts(
+        (doc["text"] for doc in kb), ({"category": doc["category"]} for doc in kb), (doc["id"] for doc in kb))
+    store.flush()
+    return Retriever(embeddings=embeddings, store=store)
+
+
+def run(demo, tickets, concurrency):
+    """并发处理工单，返回每个工单的端到端延迟"""
+    def process(ticket):
+        start = time.perf_counter()
+        demo.processing_chain.invoke({"user_input": ticket})
+        return time.perf_counter() - start
+
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(concurrency) as pool:
+        return np.array(list(pool.map(process, tickets)))
+
+
+def report(label, latencies, model):
+    inputs, outputs = np.array(model.replies).T
+    print(f"  {label:<10} p50 {np.percentile(latencies, 50):5.2f}s  p99 {np.percentile(latencies, 99):5.2f}s  "
+          f"回复调用 {len(model.replies):3d} 次，输入 {inputs.mean():6.0f} token/次，输出 {outputs.mean():4.0f} token/次")
+    return np.percentile(latencies, 50), inputs.mean()
+
+
+def check(ok, label):
+    print(f"  {'OK ' if ok else '失败'} {label}")
+    return not ok
+
+
+def main(args):
+    records = generate_feedback(args.tickets, seed=2)
+    tickets = [record["feedback"] for record in records]
+    kb = generate_knowledge_base(args.kb)
+    demo = load_script("phase1_basic/05_project_demo/01_project_demo1.py")
+    demo.pre_classifier = None
+    demo.distill_sink = None
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        embeddings = FakeEmbeddings(DIM, latency=lambda: args.embed_latency)
+        retriever = build_store(Path(tmp) / "kb", kb, embeddings)
+        snippets = PolicySnippets(retriever, max_tokens=args.max_tokens, max_snippets=args.max_snippets)
+        print(f"{len(tickets)} 个工单，{args.concurrency} 个并发；知识库 {len(kb)} 条；"
+              f"联网搜索模拟为 +{args.search_latency:.1f}s、+{args.search_tokens} 输入 token；"
+              f"片段预算 {args.max_tokens} token、最多 {args.max_snippets} 条\n")
+
+        searching = StubQwen(records, args, search=True)
+        local = StubQwen(records, args, search=False)
+        demo.model_special = FakeChatModel(responder=searching)
+        demo.model_reply = FakeChatModel(responder=local)
+
+        demo.policy_snippets = None
+        base_p50, base_tokens = report("联网搜索", run(demo, tickets, args.concurrency), searching)
+        searching.replies.clear()
+        demo.policy_snippets = snippets
+        rag_p50, rag_tokens = report("检索增强", run(demo, tickets, args.concurrency), local)
+        search_replies = len(searching.replies)
+
+        start = time.perf_counter()
+        retrieved = [snippets.retrieve(record["feedback"], record["categories"]) for record in records]
+        elapsed = time.perf_counter() - start
+        sizes = [sum(estimate_tokens(doc.page_content) for doc in docs) for docs in retrieved]
+        matched = [snippet_category(doc.metadata) in record["categories"]
+                   for docs, record in zip(retrieved, records) for doc in docs]
+        print(f"\n  检索: 每个工单 {elapsed / len(records) * 1000:.1f}ms（其中查询向量化 {args.embed_latency * 1000:.0f}ms），"
+              f"平均 {np.mean([len(docs) for docs in retrieved]):.1f} 条片段、{np.mean(sizes):.0f} token")
+        print(f"  回复延迟 p50 降低 {1 - rag_p50 / base_p50:.0%}，回复调用的输入 token 减少 {1 - rag_tokens / base_tokens:.0%}")
+        example = retrieved[0]
+        print(f"\n  示例：{records[0]['feedback']}（{'、'.join(records[0]['categories'])}）")
+        for doc in example:
+            print(f"    - {doc.page_content}")
+        retriever.store.close()
+
+    print("\n检查:")
+    failures += check(search_replies == 0, "检索增强时回复不再调用联网搜索的模型")
+    failures += check(max(sizes) <= args.max_tokens, f"片段不超过 token 预算（最多 {max(sizes)} token）")
+    failures += check(all(retrieved), "每个工单都检索到片段")
+    failures += check(np.mean(matched) >= 0.95, f"片段的分类与工单分类相符（{np.mean(matched):.1%}）")
+    failures += check(rag_p50 < base_p50 and rag_tokens < base_tokens, "回复延迟和输入 token 都低于联网搜索")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--kb", type=int, default=20_000, help="知识库条数")
+    parser.add_argument("--max-tokens", type=int, default=300, help="片段的 token 预算")
+    parser.add_argument("--max-snippets", type=int, default=3)
+    parser.add_argument("--first-token", type=float, default=0.3, help="首 token 延迟(秒)")
+    parser.add_argument("--search-latency", type=float, default=1.0, help="联网搜索增加的延迟(秒)")
+    parser.add_argument("--search-tokens", type=int, default=2000, help="搜索结果占用的输入 token")
+    parser.add_argument("--prefill", type=float, default=5000, help="输入处理速度(token/s)")
+    parser.add_argument("--decode", type=float, default=60, help="生成速度(token/s)")
+    parser.add_argument("--reply-chars", type=int, default=130, help="回复长度（字符）")
+    parser.add_argument("--embed-latency", type=float, default=0.03, help="查询向量化的延迟(秒)")
+    sys.exit(1 if main(parser.parse_args()) else 0)